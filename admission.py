@@ -0,0 +1,211 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Deque, Dict, List
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from settings import settings
+from tracing import span
+
+# Priority classes, highest priority first
+PRIORITY_CLASSES: List[str] = ["redirect", "analytics", "bulk"]
+
+
+class AdmissionController:
+    """
+    Priority-aware concurrency limiter.
+
+    At most `capacity` requests run at once, and each priority class is further limited to its
+    own share. When a slot frees up it goes to the oldest waiter of the highest priority class
+    that may run. Waiters that cannot be admitted within their class deadline are shed.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        limits: Dict[str, int],
+        deadlines: Dict[str, float],
+    ) -> None:
+        self.capacity = capacity
+        self.limits = limits
+        self.deadlines = deadlines
+        self.total_in_flight = 0
+        self.in_flight: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {
+            name: deque() for name in PRIORITY_CLASSES
+        }
+        # Measurements exposed for monitoring
+        self.admitted: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.shed: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.queue_time_total: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+        self.queue_time_max: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+
+    def _can_run(self, priority_class: str) -> bool:
+        return (
+            self.total_in_flight < self.capacity
+            and self.in_flight[priority_class] < self.limits[priority_class]
+        )
+
+    def _grant(self, priority_class: str) -> None:
+        self.total_in_flight += 1
+        self.in_flight[priority_class] += 1
+
+    async def acquire(self, priority_class: str) -> bool:
+        """
+        Wait for a slot for a request of the given class.
+
+        Args:
+            priority_class (str): The priority class of the request.
+
+        Returns:
+            bool: True if the request was admitted, False if it was shed.
+        """
+        start = time.monotonic()
+        waiters = self.waiters[priority_class]
+
+        if not waiters and self._can_run(priority_class):
+            self._grant(priority_class)
+            admitted = True
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiters.append(future)
+            try:
+                await asyncio.wait_for(future, self.deadlines[priority_class])
+                admitted = True
+            except asyncio.TimeoutError:
+                # A release running while wait_for cancelled the future may have popped it already
+                with suppress(ValueError):
+                    waiters.remove(future)
+                admitted = False
+            except asyncio.CancelledError:
+                # Give back a slot granted just before the caller was cancelled
+                if future.done() and not future.cancelled():
+                    self.release(priority_class)
+                raise
+
+        waited = time.monotonic() - start
+        self.queue_time_total[priority_class] += waited
+        self.queue_time_max[priority_class] = max(
+            self.queue_time_max[priority_class], waited
+        )
+        if admitted:
+            self.admitted[priority_class] += 1
+        else:
+            self.shed[priority_class] += 1
+        return admitted
+
+    def release(self, priority_class: str) -> None:
+        """
+        Release the slot of a finished request and hand free slots to waiters by priority.
+
+        Args:
+            priority_class (str): The priority class of the finished request.
+        """
+        self.total_in_flight -= 1
+        self.in_flight[priority_class] -= 1
+
+        for name in PRIORITY_CLASSES:
+            waiters = self.waiters[name]
+            while waiters and self._can_run(name):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._grant(name)
+                future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Describe admission state and measurements for monitoring.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per-class in-flight, queued, admitted and shed counts and queue times in ms.
+        """
+        return {
+            name: {
+                "in_flight": self.in_flight[name],
+                "queued": len(self.waiters[name]),
+                "admitted": self.admitted[name],
+                "shed": self.shed[name],
+                "queue_time_avg_ms": (
+                    self.queue_time_total[name]
+                    / max(self.admitted[name] + self.shed[name], 1)
+                    * 1000
+                ),
+                "queue_time_max_ms": self.queue_time_max[name] * 1000,
+            }
+            for name in PRIORITY_CLASSES
+        }
+
+
+def classify(path: str) -> str:
+    """
+    Map a request path to its priority class.
+
+    Args:
+        path (str): The request path.
+
+    Returns:
+        str: "analytics" for metrics endpoints, "bulk" for the rest of the API and the docs,
+             and "redirect" for everything else, i.e. shortened URL keys.
+    """
+    if path.startswith(f"{settings.BASE_URL_PATH}/metrics"):
+        return "analytics"
+    if path.startswith(settings.BASE_URL_PATH) or path.startswith(("/docs", "/redoc", "/openapi")):
+        return "bulk"
+    return "redirect"
+
+
+# Shared admission controller for the application
+admission = AdmissionController(
+    capacity=settings.ADMISSION_CAPACITY,
+    limits=settings.ADMISSION_LIMITS,
+    deadlines={
+        name: deadline / 1000 for name, deadline in settings.ADMISSION_DEADLINES_MS.items()
+    },
+)
+
+
+class AdmissionControl:
+    """
+    ASGI middleware applying admission control and load shedding to HTTP requests.
+
+    Requests that cannot be admitted before their class deadline are answered with
+    503 Service Unavailable without reaching the application. The health endpoint is exempt,
+    so it stays observable under overload.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.exempt_paths = {f"{settings.BASE_URL_PATH}/info/health"}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        priority_class = classify(scope["path"])
+
+        with span("queue"):
+            admitted = await admission.acquire(priority_class)
+
+        if not admitted:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"text/plain; charset=utf-8"),
+                        (b"retry-after", b"1"),
+                        (b"content-length", b"19"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": b"Service Unavailable"})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(priority_class)
@@ -0,0 +1,275 @@
+"""
+Columnar archive of click data.
+
+Closed days of the metrics table are streamed into zstd-compressed Parquet files, one
+directory per day in the Hive layout (``day=YYYY-MM-DD/clicks.parquet``), and can then be
+deleted from PostgreSQL. Rows are written in key order, so the row group statistics let
+readers skip everything but the requested keys.
+
+    python archive.py                       # archive days older than ARCHIVE_AFTER_DAYS
+    python archive.py --delete              # ... and delete them from the database
+    python archive.py --before 2026-01-01   # archive days before a given date
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from logger import logger
+from settings import settings
+
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("key", pa.string()),
+        ("owner_id", pa.string()),
+        ("client_ip", pa.string()),
+        ("response_time", pa.int32()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("country", pa.int16()),
+        ("region_id", pa.int32()),
+        ("city_id", pa.int32()),
+        ("sample_rate", pa.int32()),
+    ]
+)
+
+# Rows per Parquet row group; smaller groups make key filters more selective
+ROW_GROUP_SIZE = 128 * 1024
+
+
+def partition_path(day: date) -> str:
+    """
+    Build the path of the archive file of a day.
+
+    Args:
+        day (date): The archived day.
+
+    Returns:
+        str: The path of the Parquet file.
+    """
+    return os.path.join(settings.ARCHIVE_DIR, f"day={day.isoformat()}", "clicks.parquet")
+
+
+def _record_batch(records: Sequence) -> pa.RecordBatch:
+    """
+    Convert a batch of database records into an Arrow record batch.
+
+    Args:
+        records (Sequence): The click records.
+
+    Returns:
+        pa.RecordBatch: The batch, following ARCHIVE_SCHEMA.
+    """
+    columns = list(zip(*records))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, ARCHIVE_SCHEMA)],
+        schema=ARCHIVE_SCHEMA,
+    )
+
+
+async def archive_day(day: date, delete: bool = False) -> int:
+    """
+    Archive the clicks of one day, then optionally delete them from the database.
+
+    The file is written under a temporary name and renamed once complete, so a partition that
+    exists is always whole. Days that already have a partition are not archived again, but
+    their clicks are still deleted if requested.
+
+    Args:
+        day (date): The day to archive.
+        delete (bool, optional): Whether to delete the archived clicks. Defaults to False.
+
+    Returns:
+        int: The number of clicks archived.
+    """
+    from dal import delete_metrics, stream_metrics
+
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    end = start + timedelta(days=1)
+    path = partition_path(day)
+
+    archived = 0
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Files starting with an underscore are ignored by dataset readers
+        temporary_path = os.path.join(os.path.dirname(path), "_clicks.parquet.tmp")
+
+        with pq.ParquetWriter(
+            temporary_path,
+            ARCHIVE_SCHEMA,
+            compression="zstd",
+            use_dictionary=["key", "owner_id"],
+        ) as writer:
+            async for records in stream_metrics(start, end, settings.ARCHIVE_BATCH_SIZE):
+                writer.write_batch(_record_batch(records), row_group_size=ROW_GROUP_SIZE)
+                archived += len(records)
+
+        if archived:
+            os.replace(temporary_path, path)
+        else:
+            os.remove(temporary_path)
+            os.rmdir(os.path.dirname(path))
+
+    if delete and os.path.exists(path):
+        deleted = await delete_metrics(start, end, settings.ARCHIVE_BATCH_SIZE)
+        logger.info(f"Deleted {deleted} archived clicks of {day}")
+
+    return archived
+
+
+async def archive(before: date, delete: bool = False) -> int:
+    """
+    Archive every closed day with clicks before a given date.
+
+    Args:
+        before (date): The first day that is not archived; it is clamped to today.
+        delete (bool, optional): Whether to delete the archived clicks. Defaults to False.
+
+    Returns:
+        int: The number of clicks archived.
+    """
+    from dal import oldest_metric_time
+    from database import pool
+
+    # Only closed days are archived, so partitions never change once written
+    before = min(before, datetime.now(timezone.utc).date())
+
+    await pool.connect()
+    try:
+        oldest = await oldest_metric_time()
+        if oldest is None:
+            return 0
+
+        total = 0
+        day = oldest.astimezone(timezone.utc).date()
+        while day < before:
+            archived = await archive_day(day, delete=delete)
+            if archived:
+                logger.info(f"Archived {archived} clicks of {day}")
+            total += archived
+            day += timedelta(days=1)
+        return total
+    finally:
+        await pool.disconnect()
+
+
+def read_clicks(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: Optional[List[str]] = None,
+    key: Optional[str] = None,
+    owner_id: Optional[str] = None,
+) -> pa.Table:
+    """
+    Read archived clicks, loading only the requested columns, days and links.
+
+    Day bounds prune whole partitions, and key and owner filters are pushed down to the Parquet
+    reader, which skips row groups whose statistics exclude them.
+
+    Args:
+        start (Optional[date]): The first day to read. Defaults to the oldest archived day.
+        end (Optional[date]): The last day to read. Defaults to the newest archived day.
+        columns (Optional[List[str]]): The columns to read. Defaults to all columns.
+        key (Optional[str]): Only read the clicks of this shortened URL key.
+        owner_id (Optional[str]): Only read the clicks of this owner's links.
+
+    Returns:
+        pa.Table: The matching clicks.
+    """
+    # The full schema is given, so partitions written before a column was added read it as null
+    dataset = ds.dataset(
+        settings.ARCHIVE_DIR,
+        schema=ARCHIVE_SCHEMA.append(pa.field("day", pa.date32())),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("day", pa.date32())]), flavor="hive"),
+    )
+
+    predicate = None
+    conditions = []
+    if start:
+        conditions.append(ds.field("day") >= start)
+    if end:
+        conditions.append(ds.field("day") <= end)
+    if key:
+        conditions.append(ds.field("key") == key)
+    if owner_id:
+        conditions.append(ds.field("owner_id") == owner_id)
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+
+    return dataset.to_table(columns=columns, filter=predicate)
+
+
+def daily_report(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    key: Optional[str] = None,
+    owner_id: Optional[str] = None,
+) -> List[dict]:
+    """
+    Summarize archived clicks per day.
+
+    Args:
+        start (Optional[date]): The first day of the report.
+        end (Optional[date]): The last day of the report.
+        key (Optional[str]): Only report the clicks of this shortened URL key.
+        owner_id (Optional[str]): Only report the clicks of this owner's links.
+
+    Returns:
+        List[dict]: One row per day with its hits, unique IPs and average resolution time.
+    """
+    clicks = read_clicks(
+        start=start,
+        end=end,
+        columns=["day", "client_ip", "response_time", "sample_rate"],
+        key=key,
+        owner_id=owner_id,
+    )
+
+    # Sampled clicks stand for sample_rate clicks; partitions older than sampling read as null
+    weights = pc.fill_null(clicks.column("sample_rate"), 1)
+    clicks = clicks.append_column("weight", weights).append_column(
+        "weighted_time", pc.multiply(pc.cast(clicks.column("response_time"), pa.float64()), weights)
+    )
+    report = clicks.group_by("day").aggregate(
+        [
+            ("weight", "sum"),
+            ("client_ip", "count_distinct"),
+            ("weighted_time", "sum"),
+        ]
+    )
+
+    return [
+        {
+            "day": row["day"],
+            "hits": row["weight_sum"],
+            "unique_ips": row["client_ip_count_distinct"],
+            "avg_resolution_time": (
+                row["weighted_time_sum"] / row["weight_sum"] if row["weight_sum"] else None
+            ),
+        }
+        for row in sorted(report.to_pylist(), key=lambda row: row["day"])
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed days of click data.")
+    parser.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        default=datetime.now(timezone.utc).date() - timedelta(days=settings.ARCHIVE_AFTER_DAYS),
+        help="Archive days before this date (YYYY-MM-DD).",
+    )
+    parser.add_argument(
+        "--delete", action="store_true", help="Delete archived clicks from the database."
+    )
+    args = parser.parse_args()
+
+    total = asyncio.run(archive(args.before, delete=args.delete))
+    print(f"Archived {total} clicks")
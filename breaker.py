@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from logger import logger
+from settings import settings
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding calls to a dependency.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls are skipped for
+    `reset_timeout` seconds. It then half-opens and lets calls through as probes: a success
+    closes it again, a failure reopens it for another cool-down.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        # Counters exposed for monitoring
+        self.total_failures = 0
+        self.total_skipped = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """
+        Check whether a call to the dependency should be attempted.
+
+        Returns:
+            bool: True if the call should be made, False if it should be skipped.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.total_skipped += 1
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.warning(f"Circuit breaker {self.name} closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+
+        if (
+            self.state == self.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker {self.name} opened")
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Describe the breaker state for monitoring.
+
+        Returns:
+            Dict[str, object]: The state and counters of the breaker.
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_skipped": self.total_skipped,
+            "times_opened": self.times_opened,
+        }
+
+
+class StaleCache:
+    """
+    Bounded in-process LRU of recently resolved links.
+
+    Used as a last resort when neither the cache nor the database can answer. Entries keep the
+    expiry time of their link, so expired links are never served.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, Optional[datetime]]]" = OrderedDict()
+
+    def put(self, key: str, original_url: str, expires_at: Optional[datetime]) -> None:
+        self._entries[key] = (original_url, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        original_url, expires_at = entry
+        if expires_at is not None and expires_at <= datetime.now(timezone.utc):
+            del self._entries[key]
+            return None
+        return original_url
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+# Breakers around the cache and the database tiers
+cache_breaker = CircuitBreaker(
+    "cache",
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.BREAKER_RESET_SECONDS,
+)
+db_breaker = CircuitBreaker(
+    "database",
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.BREAKER_RESET_SECONDS,
+)
+
+# Local tier used to serve stale links during outages
+stale_cache = StaleCache(settings.STALE_CACHE_SIZE)
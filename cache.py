@@ -1,8 +1,21 @@
-from pydantic import HttpUrl
+import zlib
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
 import redis.asyncio as redis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+from redis.asyncio.sentinel import Sentinel
+from redis.crc import key_slot
 
 from settings import settings
 
+# Marker byte for compressed values; stored URLs never start with a NUL byte
+COMPRESSED_PREFIX = b"\x00"
+
+# Value of an idempotency record while its request is being processed
+IDEMPOTENCY_PENDING = b"pending"
+
 
 class RedisClient:
     def __init__(self, **kwargs) -> None:
@@ -12,29 +25,453 @@ class RedisClient:
         self.host: str = kwargs.get("host")
         self.port: int = kwargs.get("port")
         self.db: str = kwargs.get("db")
+        # Deployment mode: "standalone", "sentinel" or "cluster"
+        self.mode: str = kwargs.get("mode", "standalone")
+        # Cluster startup nodes or sentinels; defaults to host:port
+        self.nodes: List[Tuple[str, int]] = kwargs.get("nodes") or [
+            (self.host, self.port)
+        ]
+        self.sentinel_service: str = kwargs.get("sentinel_service")
+        # Storage layout of the key->URL map: "string" (one key per link) or "hash" (bucketed)
+        self.storage_mode: str = kwargs.get("storage_mode", "string")
+        self.hash_buckets: int = kwargs.get("hash_buckets", 1)
+        # URLs at least this long are zlib-compressed; 0 disables compression
+        self.compress_min_length: int = kwargs.get("compress_min_length", 0)
         self.redis = None
 
+    @property
+    def is_cluster(self) -> bool:
+        return self.mode == "cluster"
+
     async def connect(self) -> None:
-        # self.redis = await redis.from_url(
-        #     self.redis_url, encoding="utf-8", decode_responses=True
-        # )
-        self.redis = await redis.Redis(
-            host=self.host,
-            port=self.port,
-            password=self.password,
-            username=self.username,
-            db=self.db,
-        )
-
-    async def set_value(self, key: str, value: str) -> None:
-        await self.redis.set(key, value)
-
-    async def get_value(self, key: str) -> str:
+        # The client owns a connection pool, so it is created once and shared by all requests
+        if self.redis is not None:
+            return
+
+        if self.mode == "cluster":
+            # The cluster client routes commands by slot and follows MOVED/ASK redirections
+            self.redis = RedisCluster(
+                startup_nodes=[ClusterNode(host, port) for host, port in self.nodes],
+                password=self.password,
+                username=self.username,
+            )
+            await self.redis.initialize()
+        elif self.mode == "sentinel":
+            # The master is looked up through the sentinels and rediscovered after a failover
+            sentinel = Sentinel(
+                self.nodes,
+                sentinel_kwargs={"password": self.password, "username": self.username},
+                password=self.password,
+                username=self.username,
+                db=self.db,
+            )
+            self.redis = sentinel.master_for(self.sentinel_service)
+        else:
+            # self.redis = await redis.from_url(
+            #     self.redis_url, encoding="utf-8", decode_responses=True
+            # )
+            self.redis = await redis.Redis(
+                host=self.host,
+                port=self.port,
+                password=self.password,
+                username=self.username,
+                db=self.db,
+            )
+
+    def bucket_name(self, key: str) -> str:
+        """
+        Build the name of the hash bucket holding a short key in "hash" storage mode.
+
+        Short keys are derived from the URL prefix and are heavily skewed, so buckets are chosen
+        by a hash of the key instead of its prefix. The bucket number is a cluster hash tag.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            str: The Redis key of the bucket.
+        """
+        bucket = zlib.crc32(key.encode("utf-8")) % self.hash_buckets
+        return f"u:{{{bucket:x}}}"
+
+    def expiring_name(self, key: str) -> str:
+        """
+        Build the name of the string entry used for expiring links in "hash" storage mode.
+
+        Hash fields cannot carry their own TTL, so links with an expiry are kept as strings
+        sharing the hash tag of their bucket, which keeps both reads in one slot.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            str: The Redis key of the entry.
+        """
+        return f"{self.bucket_name(key)}:{key}"
+
+    def encode(self, value: str) -> bytes:
+        """
+        Encode a URL for storage, compressing long values when enabled.
+
+        Args:
+            value (str): The URL to store.
+
+        Returns:
+            bytes: The stored representation.
+        """
+        raw = value.encode("utf-8")
+        if self.compress_min_length and len(raw) >= self.compress_min_length:
+            compressed = COMPRESSED_PREFIX + zlib.compress(raw)
+            if len(compressed) < len(raw):
+                return compressed
+        return raw
+
+    @staticmethod
+    def decode(raw: Optional[bytes]) -> Optional[bytes]:
+        """
+        Decode a stored URL back into its raw bytes.
+
+        Args:
+            raw (Optional[bytes]): The stored representation, if any.
+
+        Returns:
+            Optional[bytes]: The URL bytes, or None if nothing was stored.
+        """
+        if raw and raw[:1] == COMPRESSED_PREFIX:
+            return zlib.decompress(raw[1:])
+        return raw
+
+    async def set_value(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        encoded = self.encode(value)
+
+        if self.storage_mode == "hash":
+            if ttl is None:
+                await self.redis.hset(self.bucket_name(key), key, encoded)
+            else:
+                await self.redis.set(self.expiring_name(key), encoded, ex=ttl)
+            return
+
+        # Entries for expiring links live no longer than the link itself
+        await self.redis.set(key, encoded, ex=ttl)
+
+    async def extend_ttl(self, key: str, ttl: int) -> None:
+        # Only string entries can expire; links in hash buckets have no TTL to extend
+        name = self.expiring_name(key) if self.storage_mode == "hash" else key
+        await self.redis.expire(name, ttl)
+
+    async def delete_value(self, key: str) -> None:
+        if self.storage_mode == "hash":
+            # The link may be in its bucket or in its expiring entry, which share a slot
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hdel(self.bucket_name(key), key)
+                pipe.delete(self.expiring_name(key))
+                await pipe.execute()
+            return
+
+        await self.redis.delete(key)
+
+    async def delete_values(self, keys: Sequence[str]) -> None:
+        """
+        Delete several values in one pipelined round trip per Redis node.
+
+        Args:
+            keys (Sequence[str]): The keys.
+        """
+        if not keys:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                if self.storage_mode == "hash":
+                    pipe.hdel(self.bucket_name(key), key)
+                    pipe.delete(self.expiring_name(key))
+                else:
+                    pipe.delete(key)
+            await pipe.execute()
+
+    async def set_values(self, entries: Dict[str, Tuple[str, Optional[int]]]) -> None:
+        """
+        Store several values in one pipelined round trip per Redis node.
+
+        Args:
+            entries (Dict[str, Tuple[str, Optional[int]]]): The values and optional TTLs in seconds, by key.
+        """
+        if not entries:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, (value, ttl) in entries.items():
+                encoded = self.encode(value)
+                if self.storage_mode == "hash" and ttl is None:
+                    pipe.hset(self.bucket_name(key), key, encoded)
+                elif self.storage_mode == "hash":
+                    pipe.set(self.expiring_name(key), encoded, ex=ttl)
+                else:
+                    pipe.set(key, encoded, ex=ttl)
+            await pipe.execute()
+
+    async def get_value(self, key: str) -> Optional[bytes]:
+        # Values are validated before they are stored, so the raw bytes are returned as-is
+        if self.storage_mode == "hash":
+            # Both locations share a slot, so they are read in a single round trip
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hget(self.bucket_name(key), key)
+                pipe.get(self.expiring_name(key))
+                bucketed, expiring = await pipe.execute()
+            return self.decode(bucketed or expiring)
+
         url = await self.redis.get(key)
-        return url
+        return self.decode(url)
+
+    async def get_values(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        """
+        Fetch several values in one round trip per Redis node.
+
+        In cluster mode keys are grouped by hash slot into one MGET per slot, and the MGETs are
+        pipelined so the client sends a single batch to each node. In "hash" storage mode keys are
+        grouped by bucket into one HMGET (plus one MGET of expiring entries) per bucket.
+
+        Args:
+            keys (Sequence[str]): The keys to fetch.
+
+        Returns:
+            List[Optional[bytes]]: The values, in the order of `keys`.
+        """
+        if not keys:
+            return []
+
+        values: Dict[str, Optional[bytes]] = {}
+
+        if self.storage_mode == "hash":
+            buckets: Dict[str, List[str]] = defaultdict(list)
+            for key in keys:
+                buckets[self.bucket_name(key)].append(key)
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for bucket, bucket_keys in buckets.items():
+                    pipe.hmget(bucket, bucket_keys)
+                    pipe.mget([f"{bucket}:{key}" for key in bucket_keys])
+                replies = await pipe.execute()
+
+            for index, bucket_keys in enumerate(buckets.values()):
+                bucketed, expiring = replies[2 * index], replies[2 * index + 1]
+                for key, first, second in zip(bucket_keys, bucketed, expiring):
+                    values[key] = self.decode(first or second)
+            return [values[key] for key in keys]
+
+        if not self.is_cluster:
+            return [self.decode(value) for value in await self.redis.mget(keys)]
+
+        slots: Dict[int, List[str]] = defaultdict(list)
+        for key in keys:
+            slots[key_slot(key.encode("utf-8"))].append(key)
+
+        async with self.redis.pipeline() as pipe:
+            for slot_keys in slots.values():
+                pipe.mget(slot_keys)
+            replies = await pipe.execute()
+
+        for slot_keys, reply in zip(slots.values(), replies):
+            values.update(zip(slot_keys, map(self.decode, reply)))
+        return [values[key] for key in keys]
+
+    @staticmethod
+    def visitor_sketch_key(scope: str, scope_id: str, day: date) -> str:
+        """
+        Build the name of a per-day HyperLogLog sketch of visitor IPs.
+
+        The scope and ID form the hash tag, so every day of one series lives in the same
+        cluster slot and can be merged by a single PFCOUNT.
+
+        Args:
+            scope (str): The sketch scope, either "key" or "owner".
+            scope_id (str): The shortened URL key or the owner ID.
+            day (date): The day covered by the sketch.
+
+        Returns:
+            str: The Redis key of the sketch.
+        """
+        return f"hll:{{{scope}:{scope_id}}}:{day:%Y%m%d}"
+
+    @staticmethod
+    def latency_sketch_key(scope: str, scope_id: str, day: date) -> str:
+        """
+        Build the name of a per-day latency sketch, a hash of bin counters.
+
+        Args:
+            scope (str): The sketch scope, either "key" or "owner".
+            scope_id (str): The shortened URL key or the owner ID.
+            day (date): The day covered by the sketch.
+
+        Returns:
+            str: The Redis key of the sketch.
+        """
+        return f"lat:{{{scope}:{scope_id}}}:{day:%Y%m%d}"
+
+    @staticmethod
+    def sketch_origin_key(kind: str) -> str:
+        """
+        Build the name of the entry holding the first day sketches of a kind were written.
+
+        Args:
+            kind (str): The sketch kind, "hll" for visitors or "lat" for latencies.
+
+        Returns:
+            str: The Redis key of the entry.
+        """
+        return f"{kind}:origin"
+
+    async def sketch_origin(self, kind: str) -> Optional[date]:
+        """
+        Read the first day sketches of a kind were written.
+
+        Args:
+            kind (str): The sketch kind, "hll" for visitors or "lat" for latencies.
+
+        Returns:
+            Optional[date]: The day, or None if no sketch was written since the entry was lost.
+        """
+        origin = await self.redis.get(self.sketch_origin_key(kind))
+        return date.fromisoformat(origin.decode("utf-8")) if origin else None
+
+    async def add_click_sketches(self, key: str, owner_id: str, day: date, **kwargs) -> None:
+        """
+        Add a click to the per-day visitor and latency sketches of a shortened URL and of its owner.
+
+        Args:
+            key (str): The shortened URL key.
+            owner_id (str): The ID of the owner.
+            day (date): The day of the click.
+            **kwargs: 'client_ip' and 'visitor_ttl' for the visitor sketches; 'latency_bin',
+                'response_time' and 'latency_ttl' for the latency sketches.
+        """
+        client_ip = kwargs.get("client_ip")
+        latency_bin = kwargs.get("latency_bin")
+
+        # All sketches are updated in a single round trip
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # Readers only trust sketches for days after the first one written; an entry lost
+            # to eviction is set again later, which only makes readers more cautious
+            if client_ip:
+                pipe.set(self.sketch_origin_key("hll"), day.isoformat(), nx=True)
+            if latency_bin is not None:
+                pipe.set(self.sketch_origin_key("lat"), day.isoformat(), nx=True)
+            for scope, scope_id in (("key", key), ("owner", owner_id)):
+                if client_ip:
+                    visitor_sketch = self.visitor_sketch_key(scope, scope_id, day)
+                    pipe.pfadd(visitor_sketch, client_ip)
+                    pipe.expire(visitor_sketch, kwargs["visitor_ttl"])
+                if latency_bin is not None:
+                    latency_sketch = self.latency_sketch_key(scope, scope_id, day)
+                    pipe.hincrby(latency_sketch, latency_bin, 1)
+                    pipe.hincrbyfloat(latency_sketch, "sum", kwargs["response_time"])
+                    pipe.expire(latency_sketch, kwargs["latency_ttl"])
+            await pipe.execute()
+
+    async def delete_click_sketches(self, key: str, days: Iterable[date]) -> None:
+        """
+        Delete the per-day visitor and latency sketches of a shortened URL.
+
+        Args:
+            key (str): The shortened URL key.
+            days (Iterable[date]): The days whose sketches are deleted.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for day in days:
+                pipe.delete(self.visitor_sketch_key("key", key, day))
+                pipe.delete(self.latency_sketch_key("key", key, day))
+            await pipe.execute()
+
+    async def count_unique_visitors(self, sketch_keys: Iterable[str]) -> int:
+        """
+        Estimate the number of distinct visitors across several sketches.
+
+        PFCOUNT merges the sketches on the fly, so any range of days can be counted.
+
+        Args:
+            sketch_keys (Iterable[str]): The Redis keys of the sketches to merge.
+
+        Returns:
+            int: The estimated number of distinct visitors.
+        """
+        sketch_keys = list(sketch_keys)
+        if not sketch_keys:
+            return 0
+        return await self.redis.pfcount(*sketch_keys)
+
+    async def read_latency_sketches(self, sketch_keys: Iterable[str]) -> List[Dict[bytes, bytes]]:
+        """
+        Read several latency sketches in one round trip.
+
+        Args:
+            sketch_keys (Iterable[str]): The Redis keys of the sketches.
+
+        Returns:
+            List[Dict[bytes, bytes]]: The bin counters of each sketch; missing sketches are empty.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for sketch_key in sketch_keys:
+                pipe.hgetall(sketch_key)
+            return await pipe.execute()
+
+    @staticmethod
+    def idempotency_key(digest: str) -> str:
+        """
+        Build the name of the record of an idempotent request.
+
+        Args:
+            digest (str): The digest of the caller's credentials and idempotency key.
+
+        Returns:
+            str: The Redis key of the record.
+        """
+        return f"idem:{digest}"
+
+    async def reserve_idempotency_key(self, name: str, ttl: int) -> bool:
+        """
+        Mark an idempotent request as in progress, unless it already has a record.
+
+        Args:
+            name (str): The Redis key of the record.
+            ttl (int): How long the in-progress marker is kept, in seconds.
+
+        Returns:
+            bool: True if the marker was set, False if a marker or a response already exists.
+        """
+        return bool(await self.redis.set(name, IDEMPOTENCY_PENDING, nx=True, ex=ttl))
+
+    async def get_idempotency_record(self, name: str) -> Optional[bytes]:
+        return await self.redis.get(name)
+
+    async def store_idempotent_response(self, name: str, response: bytes, ttl: int) -> None:
+        await self.redis.set(name, response, ex=ttl)
+
+    async def release_idempotency_key(self, name: str) -> None:
+        await self.redis.delete(name)
 
     async def disconnect(self) -> None:
+        if self.redis is None:
+            return
+
         await self.redis.close()
+        self.redis = None
+
+
+def parse_nodes(nodes: str) -> List[Tuple[str, int]]:
+    """
+    Parse a comma-separated list of host:port pairs.
+
+    Args:
+        nodes (str): The node list, e.g. "redis-1:6379,redis-2:6379".
+
+    Returns:
+        List[Tuple[str, int]]: The parsed (host, port) pairs.
+    """
+    parsed = []
+    for node in filter(None, (node.strip() for node in nodes.split(","))):
+        host, _, port = node.rpartition(":")
+        parsed.append((host, int(port)))
+    return parsed
 
 
 cache = RedisClient(
@@ -43,4 +480,10 @@ cache = RedisClient(
     host=settings.CACHE_HOST,
     port=settings.CACHE_PORT,
     db=settings.CACHE_DB,
+    mode=settings.CACHE_MODE,
+    nodes=parse_nodes(settings.CACHE_NODES),
+    sentinel_service=settings.CACHE_SENTINEL_SERVICE,
+    storage_mode=settings.CACHE_STORAGE_MODE,
+    hash_buckets=settings.CACHE_HASH_BUCKETS,
+    compress_min_length=settings.CACHE_COMPRESS_MIN_LENGTH,
 )
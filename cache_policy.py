@@ -0,0 +1,220 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from settings import settings
+
+# Largest value of a frequency counter; counters saturate like TinyLFU's 4-bit counters
+MAX_COUNT = 15
+
+# Translation table halving every counter byte at once
+HALVE = bytes(count >> 1 for count in range(256))
+
+
+class FrequencySketch:
+    """
+    TinyLFU-style count-min sketch estimating how often each key was accessed recently.
+
+    Each key maps to one saturating counter in each of `depth` rows, and its frequency is the
+    smallest of them, so collisions can only overestimate it. After `10 * width` increments
+    every counter is halved, so the estimate follows recent popularity rather than all-time
+    totals. Memory is `depth * width` bytes regardless of the number of keys.
+
+    Args:
+        width (int): The number of counters per row, rounded up to a power of two.
+        depth (int, optional): The number of rows. Defaults to 4.
+    """
+
+    def __init__(self, width: int, depth: int = 4) -> None:
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.depth = depth
+        self.mask = self.width - 1
+        self.table = bytearray(self.width * depth)
+        self.additions = 0
+        self.reset_after = 10 * self.width
+
+    def _indexes(self, key: str):
+        # Rows are indexed by double hashing of the process-local string hash
+        hashed = hash(key) & 0xFFFFFFFFFFFFFFFF
+        first, second = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [
+            row * self.width + ((first + row * second) & self.mask)
+            for row in range(self.depth)
+        ]
+
+    def increment(self, key: str) -> int:
+        """
+        Count an access to a key.
+
+        Args:
+            key (str): The accessed key.
+
+        Returns:
+            int: The estimated frequency of the key, including this access.
+        """
+        indexes = self._indexes(key)
+        frequency = min(self.table[index] for index in indexes)
+
+        # Conservative update: only the counters at the minimum are raised
+        if frequency < MAX_COUNT:
+            frequency += 1
+            for index in indexes:
+                if self.table[index] < frequency:
+                    self.table[index] = frequency
+
+        self.additions += 1
+        if self.additions >= self.reset_after:
+            self.table = bytearray(self.table.translate(HALVE))
+            self.additions //= 2
+
+        return frequency
+
+    def frequency(self, key: str) -> int:
+        """
+        Estimate how often a key was accessed recently.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            int: The estimated frequency.
+        """
+        return min(self.table[index] for index in self._indexes(key))
+
+
+class CachePolicy:
+    """
+    Admission and TTL policy for links written to the cache after a miss.
+
+    Lookups are counted in a frequency sketch. A missed link is only written to the cache once
+    it has been looked up `min_frequency` times recently, so one-hit wonders do not push hot
+    links out of Redis. Admitted links get a TTL that doubles with each access beyond the
+    admission threshold, from `min_ttl` up to `max_ttl`, so cold links leave the cache quickly
+    and hot ones stay. Links cached without an expiry of their own keep growing their TTL on
+    cache hits: once a hit makes a link popular enough for a longer TTL than it was cached with,
+    `record_hit` returns that TTL to be applied. Each worker keeps its own sketch and counters,
+    and remembers the TTLs of up to `width` links it cached, forgetting the oldest first.
+
+    Args:
+        width (int): The number of counters per sketch row.
+        min_frequency (int): The number of recent lookups a link needs to be cached.
+        min_ttl (int): The TTL in seconds of a link at the admission threshold.
+        max_ttl (int): The longest TTL in seconds.
+    """
+
+    def __init__(self, width: int, min_frequency: int, min_ttl: int, max_ttl: int) -> None:
+        self.sketch = FrequencySketch(width)
+        self.min_frequency = min_frequency
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        # TTLs of the cached links without an expiry, in the order they were cached
+        self.cached_ttls: Dict[str, int] = {}
+        self.capacity = width
+        # Counters exposed for monitoring
+        self.extended = 0
+        self.hits = 0
+        self.misses = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def record_hit(self, key: str) -> Optional[int]:
+        """
+        Count a cache hit of a link.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[int]: The longer TTL in seconds the link has earned, or None to keep its TTL.
+        """
+        self.hits += 1
+        self.sketch.increment(key)
+
+        # Only links this worker cached without an expiry can safely live longer
+        cached_ttl = self.cached_ttls.get(key)
+        if cached_ttl is None:
+            return None
+        ttl = self.ttl(key)
+        if ttl <= cached_ttl:
+            return None
+
+        self.cached_ttls[key] = ttl
+        self.extended += 1
+        return ttl
+
+    def record_miss(self, key: str) -> None:
+        self.misses += 1
+        self.sketch.increment(key)
+
+    def admit(self, key: str) -> bool:
+        """
+        Decide whether a missed link is written to the cache.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            bool: True if the link has been looked up often enough to be cached.
+        """
+        if self.sketch.frequency(key) >= self.min_frequency:
+            self.admitted += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def ttl(self, key: str, expires_at: Optional[datetime] = None) -> int:
+        """
+        Compute the cache TTL of an admitted link from its popularity.
+
+        Args:
+            key (str): The shortened URL key.
+            expires_at (Optional[datetime]): The expiry time of the link, if any.
+
+        Returns:
+            int: The TTL in seconds, never outliving the link itself.
+        """
+        excess = max(self.sketch.frequency(key) - self.min_frequency, 0)
+        ttl = min(self.min_ttl << excess, self.max_ttl)
+
+        if expires_at is not None:
+            remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+            ttl = min(ttl, max(int(remaining), 1))
+        return ttl
+
+    def record_cached(self, key: str, ttl: int) -> None:
+        """
+        Remember the TTL a link without an expiry was cached with, so hits can extend it.
+
+        Args:
+            key (str): The shortened URL key.
+            ttl (int): The TTL in seconds.
+        """
+        self.cached_ttls.pop(key, None)
+        if len(self.cached_ttls) >= self.capacity:
+            del self.cached_ttls[next(iter(self.cached_ttls))]
+        self.cached_ttls[key] = ttl
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Describe the cache effectiveness of this worker for monitoring.
+
+        Returns:
+            Dict[str, object]: The lookup, admission and TTL extension counters and the hit ratio.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "extended": self.extended,
+        }
+
+
+# Admission policy of the links cached by this worker
+cache_policy = CachePolicy(
+    width=settings.CACHE_SKETCH_WIDTH,
+    min_frequency=settings.CACHE_ADMISSION_MIN_FREQUENCY,
+    min_ttl=settings.CACHE_TTL_MIN_SECONDS,
+    max_ttl=settings.CACHE_TTL_MAX_SECONDS,
+)
@@ -1,14 +1,243 @@
-from typing import Dict, Optional, Tuple, List
+import hashlib
+import io
+from collections import Counter, OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from time import monotonic
+from typing import AsyncIterator, Dict, Optional, Tuple, List
+import asyncpg
 from pydantic import HttpUrl
 from databases.interfaces import Record
 
-from database import database as db
-from schemas.url import APIReadResponse
+from database import database as db, pool
 from settings import settings
+from breaker import cache_breaker, db_breaker, stale_cache
 from cache import cache
+from cache_policy import cache_policy
+from geo import GEO_LEVELS, breakdown_row, clean_name, decode_country, encode_country
+from loader import BatchLoader
+from sketches import RESOLUTION_TIME_QUANTILES, latency_sketch
+from sampling import click_sampler
+from snapshot import snapshot
+from tracing import span
 from logger import logger
 
 
+# Links store their URL either inline or by reference to a content-addressed destination
+URLS_WITH_DESTINATIONS = (
+    "urls LEFT JOIN destinations ON destinations.digest = urls.destination_digest"
+)
+ORIGINAL_URL = "COALESCE(urls.original_url, destinations.url)"
+
+# Hot-path statements, run on the asyncpg pool with positional parameters
+RESOLVE_QUERY = f"""
+SELECT urls.key, {ORIGINAL_URL} AS original_url, urls.expires_at, urls.max_clicks
+FROM {URLS_WITH_DESTINATIONS}
+WHERE urls.key = ANY($1::varchar[]) AND urls.deleted_at IS NULL
+    AND (urls.expires_at IS NULL OR urls.expires_at > NOW())
+"""
+
+CLAIM_CLICK_QUERY = """
+UPDATE urls SET click_count = click_count + 1
+WHERE key = $1
+    AND deleted_at IS NULL
+    AND click_count < max_clicks
+    AND (expires_at IS NULL OR expires_at > NOW())
+RETURNING COALESCE(
+    original_url,
+    (SELECT url FROM destinations WHERE digest = urls.destination_digest)
+) AS original_url
+"""
+
+# Links that still resolve: neither expired nor out of clicks
+LIVE_LINK = """(urls.expires_at IS NULL OR urls.expires_at > NOW())
+        AND (urls.max_clicks IS NULL OR urls.click_count < urls.max_clicks)"""
+
+# A conflicting key is taken over when it holds a dead link of the same owner, so re-shortening
+# an expired or exhausted URL renews it, or a deleted link not purged yet, which is revived.
+# The clicks of a revived link from before its deletion are still purged, by its purge_before.
+RENEW_DEAD_LINK = """expires_at = EXCLUDED.expires_at, max_clicks = EXCLUDED.max_clicks,
+        owner_id = EXCLUDED.owner_id, click_count = 0, created_at = NOW(), deleted_at = NULL
+    WHERE urls.deleted_at IS NOT NULL OR (
+        urls.owner_id = EXCLUDED.owner_id
+        AND (urls.expires_at <= NOW() OR urls.click_count >= urls.max_clicks)
+    )"""
+
+# Clicks still counted by analytics: those of live links, without the clicks a revived link had
+# before its deletion. Clicks of deleted links stay out of every read until they are purged.
+COUNTED_CLICK = """EXISTS (
+        SELECT 1 FROM urls
+        WHERE urls.key = metrics.key AND urls.deleted_at IS NULL
+            AND (urls.purge_before IS NULL OR metrics.created_at >= urls.purge_before)
+    )"""
+
+# Same as COUNTED_CLICK for the daily geo rollup, from the day a revived link was deleted
+COUNTED_ROLLUP = """EXISTS (
+        SELECT 1 FROM urls
+        WHERE urls.key = geo_daily.key AND urls.deleted_at IS NULL
+            AND (
+                urls.purge_before IS NULL
+                OR geo_daily.day >= (urls.purge_before AT TIME ZONE 'UTC')::date
+            )
+    )"""
+
+# Returns the existing live key of the owner's URL, or inserts the new key, in a single round
+# trip, with the stored expiry policy, the destination the key referenced before, if any, and
+# whether the key held a deleted link that was revived
+CREATE_QUERY = f"""
+WITH existing AS (
+    SELECT key, expires_at, max_clicks FROM urls
+    WHERE original_url = $2::text AND owner_id = $3::varchar AND deleted_at IS NULL
+        AND {LIVE_LINK}
+), previous AS (
+    SELECT destination_digest, deleted_at IS NOT NULL AS deleted FROM urls WHERE key = $1::varchar
+), inserted AS (
+    INSERT INTO urls (key, original_url, owner_id, expires_at, max_clicks)
+    SELECT $1::varchar, $2::text, $3::varchar, $4::timestamptz, $5::integer
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+    ON CONFLICT (key) DO UPDATE SET
+        original_url = EXCLUDED.original_url, destination_digest = NULL,
+        {RENEW_DEAD_LINK}
+    RETURNING key, expires_at, max_clicks
+)
+SELECT
+    key, FALSE AS created, expires_at, max_clicks, NULL::bytea AS previous_digest,
+    FALSE AS revived
+FROM existing
+UNION ALL
+SELECT
+    key, TRUE AS created, expires_at, max_clicks, (SELECT destination_digest FROM previous),
+    COALESCE((SELECT deleted FROM previous), FALSE)
+FROM inserted
+LIMIT 1
+"""
+
+# Same as CREATE_QUERY, storing the URL once in destinations and deduplicating by its digest
+CREATE_CONTENT_ADDRESSED_QUERY = f"""
+WITH destination AS (
+    INSERT INTO destinations (digest, url) VALUES ($6::bytea, $2::text)
+    ON CONFLICT (digest) DO NOTHING
+), existing AS (
+    SELECT key, expires_at, max_clicks FROM urls
+    WHERE owner_id = $3::varchar AND deleted_at IS NULL
+        AND (destination_digest = $6::bytea OR original_url = $2::text)
+        AND {LIVE_LINK}
+), previous AS (
+    SELECT destination_digest, deleted_at IS NOT NULL AS deleted FROM urls WHERE key = $1::varchar
+), inserted AS (
+    INSERT INTO urls (key, destination_digest, owner_id, expires_at, max_clicks)
+    SELECT $1::varchar, $6::bytea, $3::varchar, $4::timestamptz, $5::integer
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+    ON CONFLICT (key) DO UPDATE SET
+        original_url = NULL, destination_digest = EXCLUDED.destination_digest,
+        {RENEW_DEAD_LINK}
+    RETURNING key, expires_at, max_clicks
+)
+SELECT
+    key, FALSE AS created, expires_at, max_clicks, NULL::bytea AS previous_digest,
+    FALSE AS revived
+FROM existing
+UNION ALL
+SELECT
+    key, TRUE AS created, expires_at, max_clicks, (SELECT destination_digest FROM previous),
+    COALESCE((SELECT deleted FROM previous), FALSE)
+FROM inserted
+LIMIT 1
+"""
+
+# Attempts of a content-addressed create racing the removal of its destination
+CREATE_ATTEMPTS = 3
+
+# Records a click and returns its owner and location ids, in a single round trip. Region and
+# city names without a known id ($8) are interned on the way: $5 and $6 are the known ids, and
+# $9 and $10 the names looked up when they are NULL.
+METRICS_INSERT_QUERY = """
+WITH input AS (
+    SELECT DISTINCT unnest($8::text[]) AS name
+), interned AS (
+    INSERT INTO geo_names (name) SELECT name FROM input
+    ON CONFLICT (name) DO NOTHING
+    RETURNING id, name
+), names AS (
+    SELECT id, name FROM interned
+    UNION ALL
+    SELECT geo_names.id, geo_names.name FROM geo_names JOIN input USING (name)
+), inserted AS (
+    INSERT INTO metrics (
+        key, owner_id, client_ip, response_time, country, region_id, city_id, sample_rate
+    )
+    SELECT
+        key, owner_id, $2::varchar, $3::integer, $4::smallint,
+        COALESCE($5::integer, (SELECT id FROM names WHERE name = $9::text)),
+        COALESCE($6::integer, (SELECT id FROM names WHERE name = $10::text)),
+        $7::integer
+    FROM urls WHERE key = $1 AND deleted_at IS NULL
+    RETURNING owner_id, region_id, city_id
+)
+SELECT owner_id, region_id, city_id FROM inserted
+"""
+
+# Adds buffered hits to the daily geo rollup in one statement. Rows are sorted by the caller, so
+# concurrent flushes lock them in the same order, and rows of purged links are left out.
+GEO_ROLLUP_FLUSH_QUERY = """
+INSERT INTO geo_daily (key, day, country, region_id, city_id, owner_id, hits)
+SELECT key, day, country, region_id, city_id, owner_id, hits
+FROM unnest(
+    $1::varchar[], $2::date[], $3::smallint[], $4::integer[], $5::integer[], $6::varchar[],
+    $7::bigint[]
+) WITH ORDINALITY AS buffered (key, day, country, region_id, city_id, owner_id, hits, position)
+WHERE EXISTS (SELECT 1 FROM urls WHERE urls.key = buffered.key)
+ORDER BY position
+ON CONFLICT (key, day, country, region_id, city_id)
+DO UPDATE SET hits = geo_daily.hits + EXCLUDED.hits
+"""
+
+# Number of interned name ids kept in process, so most clicks skip the lookup
+GEO_NAME_CACHE_SIZE = 100_000
+
+# Number of link owners kept in process, for the sketches of clicks left out by sampling
+LINK_OWNER_CACHE_SIZE = 100_000
+
+# Links that never change once created, exported to the resolver snapshots
+SNAPSHOT_EXPORT_QUERY = f"""
+SELECT urls.key, {ORIGINAL_URL} AS original_url
+FROM {URLS_WITH_DESTINATIONS}
+WHERE urls.expires_at IS NULL AND urls.max_clicks IS NULL AND urls.deleted_at IS NULL
+    AND urls.created_at > COALESCE($1::timestamptz, '-infinity')
+"""
+
+# Clicks of a closed time range, in key order so archive row groups can be pruned by key
+METRICS_ARCHIVE_QUERY = """
+SELECT
+    key, owner_id, client_ip, response_time, created_at, country, region_id, city_id, sample_rate
+FROM metrics
+WHERE created_at >= $1 AND created_at < $2
+ORDER BY key, created_at
+"""
+
+# Columns bulk-loaded by the batch recompute of statistics
+LINK_STATS_COLUMNS = [
+    "key", "owner_id", "hits", "unique_ips", "avg_resolution_time",
+    "p50", "p90", "p99", "period_start", "period_end",
+]
+OWNER_STATS_COLUMNS = [
+    "owner_id", "hits", "unique_ips", "avg_resolution_time",
+    "p50", "p90", "p99", "top_keys", "period_start", "period_end",
+]
+
+
+def url_digest(original_url: str) -> bytes:
+    """
+    Compute the content address of an original URL.
+
+    Args:
+        original_url (str): The original URL, as stored.
+
+    Returns:
+        bytes: The 16 byte digest used as the destinations key.
+    """
+    return hashlib.blake2b(original_url.encode("utf-8"), digest_size=16).digest()
+
+
 async def fetch_key(original_url: HttpUrl, owner_id: str) -> Optional[Record]:
     """
     Retrieve the key associated with a given original URL and owner ID.
@@ -20,8 +249,16 @@ async def fetch_key(original_url: HttpUrl, owner_id: str) -> Optional[Record]:
     Returns:
         Optional[Record]: The database record containing the key if found, None otherwise.
     """
-    _query = """SELECT key FROM urls WHERE original_url = :original_url AND owner_id = :owner_id"""
-    _values = {"original_url": str(original_url), "owner_id": owner_id}
+    _query = """
+    SELECT key FROM urls
+    WHERE owner_id = :owner_id AND deleted_at IS NULL
+        AND (original_url = :original_url OR destination_digest = :digest)
+    """
+    _values = {
+        "original_url": str(original_url),
+        "owner_id": owner_id,
+        "digest": url_digest(str(original_url)),
+    }
 
     try:
         result = await db.fetch_one(query=_query, values=_values)
@@ -31,50 +268,256 @@ async def fetch_key(original_url: HttpUrl, owner_id: str) -> Optional[Record]:
         return None
 
 
-async def fetch_original_url(key: str) -> Optional[HttpUrl]:
+def _cache_ttl(expires_at: Optional[datetime]) -> Optional[int]:
     """
-    Retrieve the original URL associated with a given key.
+    Compute the cache TTL that keeps a cached link from outliving its expiry.
+
+    Args:
+        expires_at (Optional[datetime]): The expiry time of the link, if any.
+
+    Returns:
+        Optional[int]: The TTL in seconds, or None if the link never expires.
+    """
+    if expires_at is None:
+        return None
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    return max(int(remaining), 1)
+
+
+def _admitted_ttl(key: str, expires_at: Optional[datetime]) -> Optional[int]:
+    """
+    Compute the cache TTL of a link admitted by the cache policy.
+
+    Hash fields cannot expire, so in "hash" storage mode links without an expiry stay in their
+    bucket without a TTL.
 
     Args:
         key (str): The shortened URL key.
+        expires_at (Optional[datetime]): The expiry time of the link, if any.
 
     Returns:
-        Optional[HttpUrl]: The original URL if found, None otherwise.
+        Optional[int]: The TTL in seconds, or None to cache the link without one.
     """
-    _query = """SELECT original_url FROM urls WHERE key = :key"""
-    _values = {"key": key}
+    if settings.CACHE_STORAGE_MODE == "hash":
+        return _cache_ttl(expires_at)
+
+    ttl = cache_policy.ttl(key, expires_at)
+    # Links without an expiry may have their TTL extended by later cache hits
+    if expires_at is None:
+        cache_policy.record_cached(key, ttl)
+    return ttl
+
+
+async def _record_cache_hit(key: str) -> None:
+    """
+    Count a cache hit, extending the cache TTL of a link that has become more popular.
+
+    Args:
+        key (str): The shortened URL key.
+    """
+    ttl = cache_policy.record_hit(key)
+    if ttl is None:
+        return
 
     try:
-        await cache.connect()
+        with span("cache"):
+            await cache.extend_ttl(key, ttl)
+    except Exception as e:
+        logger.error(f"An error occurred while extending the cache TTL: {e}")
+
+
+async def _claim_click(key: str) -> Optional[str]:
+    """
+    Atomically count a click against a click-limited link.
+
+    Args:
+        key (str): The shortened URL key.
+
+    Returns:
+        Optional[str]: The original URL if the link still had clicks left, None otherwise.
+    """
+    result = await pool.fetchrow(CLAIM_CLICK_QUERY, key)
+    return result["original_url"] if result else None
+
+
+async def fetch_original_urls(keys: List[str]) -> Dict[str, asyncpg.Record]:
+    """
+    Retrieve the unexpired links for several keys with one query, caching those admitted by the cache policy.
+
+    Args:
+        keys (List[str]): The shortened URL keys.
 
+    Returns:
+        Dict[str, asyncpg.Record]: The records containing the original URL, expiry time and click limit, by key.
+    """
+    records = await pool.fetch(RESOLVE_QUERY, keys)
+    results = {record["key"]: record for record in records}
+
+    # Click-limited links must be counted in the database on every resolve, so they are not cached,
+    # and links removed since they were read are not cached again
+    cacheable = {
+        key: record
+        for key, record in results.items()
+        if record["max_clicks"] is None and key not in pending_invalidations
+    }
+    for key, record in cacheable.items():
+        stale_cache.put(key, record["original_url"], record["expires_at"])
+
+    # Only links looked up repeatedly are written to the cache, with a TTL growing with their popularity
+    admitted = {key: record for key, record in cacheable.items() if cache_policy.admit(key)}
+
+    if admitted and cache_breaker.allow():
         try:
-            cached_result = await cache.get_value(key)
+            await cache.set_values(
+                {
+                    key: (record["original_url"], _admitted_ttl(key, record["expires_at"]))
+                    for key, record in admitted.items()
+                }
+            )
+            cache_breaker.record_success()
+        except Exception as e:
+            cache_breaker.record_failure()
+            logger.error(f"An error occurred while caching original URLs: {e}")
+
+    return results
+
+
+# Cache misses arriving together are resolved by one query and one pipelined cache write
+url_loader = BatchLoader(
+    fetch_original_urls,
+    window=settings.LOADER_WINDOW_MS / 1000,
+    max_batch=settings.LOADER_MAX_BATCH,
+)
+
+
+async def fetch_cached_url(key: str) -> Optional[bytes]:
+    """
+    Look up a link in the snapshot, then in the cache, without touching the database.
+
+    Args:
+        key (str): The shortened URL key.
+
+    Returns:
+        Optional[bytes]: The original URL, or None on a miss or while the cache is failing.
+    """
+    # Links in the mapped snapshot are answered without any network round trip
+    original_url = snapshot.get(key)
+
+    # While the cache is failing, or may still hold the link after its removal, lookups fall
+    # through to the database path
+    if original_url is None and key not in pending_invalidations and cache_breaker.allow():
+        try:
+            with span("cache"):
+                original_url = await cache.get_value(key)
+            cache_breaker.record_success()
+
+            # Misses are counted by fetch_original_url, which the resolve path runs next
+            if original_url:
+                await _record_cache_hit(key)
+        except Exception as e:
+            cache_breaker.record_failure()
+            logger.error(f"An error occurred while reading the cache: {e}")
+
+    return original_url or None
+
+
+async def fetch_original_url(key: str) -> Optional[str]:
+    """
+    Retrieve the original URL associated with a given key.
+
+    URLs are validated when they are stored, so they are returned as plain strings without
+    being parsed again. Expired links are rejected; links with an expiry time are cached no
+    longer than they live, and click-limited links are never cached. Cache misses are batched
+    with concurrent misses by `url_loader`, and are only written back to the cache once
+    `cache_policy` has seen the link looked up repeatedly.
+
+    Links that never change are first looked up in the local snapshot, if one is mapped. Each
+    other tier is guarded by a circuit breaker: while the cache is failing lookups go straight
+    to the database, and while the database is failing links recently resolved by this process
+    are served from the local stale tier.
+
+    Args:
+        key (str): The shortened URL key.
+
+    Returns:
+        Optional[str]: The original URL if found and not expired, None otherwise.
+    """
+    # Links in the mapped snapshot are resolved without any network round trip
+    snapshot_url = snapshot.get(key)
+    if snapshot_url is not None:
+        return snapshot_url.decode("utf-8")
+
+    # The cache may still hold a link removed by this worker until its entry is deleted again
+    if key not in pending_invalidations and cache_breaker.allow():
+        try:
+            with span("cache"):
+                cached_result = await cache.get_value(key)
+            cache_breaker.record_success()
+
             # If cache hit return fetch from cache
             if cached_result:
-                logger.info(f"Cache hit on key: {key}")
-                return HttpUrl(cached_result)
+                await _record_cache_hit(key)
+                logger.debug("Cache hit on key: %s", key, extra={"sampled": True})
+                return cached_result.decode("utf-8")
+            cache_policy.record_miss(key)
+        except Exception as e:
+            cache_breaker.record_failure()
+            logger.error(f"An error occurred while reading the cache: {e}")
 
-            # If cache miss fetch from database, then save to cache
-            logger.info(f"Cache miss on key: {key}")
-            logger.info("Fetching from datbase")
-            result = await db.fetch_one(query=_query, values=_values)
-            if result:
-                await cache.set_value(key=key, value=str(result["original_url"]))
-                return HttpUrl(result["original_url"])
-            else:
-                return None
+    # If cache miss fetch from database, then save to cache
+    if db_breaker.allow():
+        logger.debug("Cache miss on key: %s", key, extra={"sampled": True})
+        try:
+            with span("db"):
+                result = await url_loader.load(key)
+
+            # Click-limited links must be counted in the database on every resolve
+            original_url = None
+            if result and result["max_clicks"] is not None:
+                with span("db"):
+                    original_url = await _claim_click(key)
+            elif result:
+                original_url = result["original_url"]
+
+            db_breaker.record_success()
+            return original_url
         except Exception as e:
+            db_breaker.record_failure()
             logger.error(f"An error occurred while fetching the original URL: {e}")
 
+    # Neither tier could answer, so fall back to the local stale tier
+    original_url = stale_cache.get(key)
+    if original_url:
+        logger.warning(f"Serving stale original URL for key: {key}")
+    return original_url
+
+
+async def fetch_link(key: str) -> Optional[Record]:
+    """
+    Retrieve the stored link for a given key, bypassing the cache.
+
+    Args:
+        key (str): The shortened URL key.
+
+    Returns:
+        Optional[Record]: The database record containing the original URL and creation time if found,
+                          None otherwise.
+    """
+    _query = f"""SELECT {ORIGINAL_URL} AS original_url, urls.created_at FROM {URLS_WITH_DESTINATIONS} WHERE urls.key = :key AND urls.deleted_at IS NULL"""
+    _values = {"key": key}
+
+    try:
+        with span("db"):
+            result = await db.fetch_one(query=_query, values=_values)
+        return result
     except Exception as e:
-        logger.error(f"An error occurred while connecting to redis server: {e}")
-    finally:
-        await cache.disconnect()
+        logger.error(f"An error occurred while fetching the link: {e}")
+        return None
 
 
 async def fetch_multiple_urls(
     owner_id: str, limit: int = 10, offset: int = 0
-) -> Tuple[int, List[APIReadResponse]]:
+) -> Tuple[int, List[Dict[str, str]]]:
     """
     Fetch multiple URLs associated with a given owner ID, with pagination.
 
@@ -84,28 +527,32 @@ async def fetch_multiple_urls(
         offset (int, optional): The number of records to skip. Defaults to 0.
 
     Returns:
-        Tuple[int, List[APIReadResponse]]: A tuple where the first element is the total count of matching rows,
-                                           and the second element is a list of APIReadResponse objects containing
-                                           shortened and original URLs.
+        Tuple[int, List[Dict[str, str]]]: A tuple where the first element is the total count of matching rows,
+                                          and the second element is a list of dictionaries shaped like
+                                          APIReadResponse, containing shortened and original URLs.
     """
     _count_query = (
-        """SELECT COUNT(*) AS total_count FROM urls WHERE owner_id = :owner_id"""
+        """SELECT COUNT(*) AS total_count FROM urls WHERE owner_id = :owner_id AND deleted_at IS NULL"""
     )
-    _records_query = """SELECT key, original_url FROM urls WHERE owner_id = :owner_id ORDER BY created_at DESC LIMIT :limit OFFSET :offset"""
+    _records_query = f"""SELECT urls.key, {ORIGINAL_URL} AS original_url FROM {URLS_WITH_DESTINATIONS} WHERE urls.owner_id = :owner_id AND urls.deleted_at IS NULL ORDER BY urls.created_at DESC LIMIT :limit OFFSET :offset"""
     _count_values = {"owner_id": owner_id}
     _record_values = {"owner_id": owner_id, "limit": limit, "offset": offset}
 
     try:
-        count_result = await db.fetch_one(query=_count_query, values=_count_values)
+        with span("db"):
+            count_result = await db.fetch_one(query=_count_query, values=_count_values)
         total_count: int = count_result["total_count"]
 
-        records = await db.fetch_all(query=_records_query, values=_record_values)
+        with span("db"):
+            records = await db.fetch_all(query=_records_query, values=_record_values)
 
+        # Stored URLs are already validated, so rows are shaped directly into response dictionaries
+        shortened_url_base = str(settings.SHORTENED_URL_BASE)
         result = [
-            APIReadResponse(
-                shortened_url=f"{settings.SHORTENED_URL_BASE}{record['key']}",
-                original_url=record["original_url"],
-            )
+            {
+                "shortened_url": f"{shortened_url_base}{record['key']}",
+                "original_url": record["original_url"],
+            }
             for record in records
         ]
 
@@ -116,44 +563,201 @@ async def fetch_multiple_urls(
 
 
 async def create_record(
-    original_url: HttpUrl, owner_id: str, unique_key: str
-) -> Tuple[str, bool]:
+    original_url: HttpUrl,
+    owner_id: str,
+    unique_key: str,
+    expires_at: Optional[datetime] = None,
+    max_clicks: Optional[int] = None,
+) -> Optional[Tuple[str, bool, Optional[datetime], Optional[int]]]:
     """
     Create a new URL record in the database.
 
+    An expired or exhausted link of the owner is not reused: its key is renewed with the new
+    expiry policy instead. A deleted link not purged yet is revived, of any owner.
+
     Args:
         original_url (HttpUrl): The original URL to be shortened.
         owner_id (str): The ID of the owner.
         unique_key (str): The unique key for the shortened URL.
+        expires_at (Optional[datetime]): The time after which the link stops resolving, if any.
+        max_clicks (Optional[int]): The number of resolves after which the link stops resolving, if any.
 
     Returns:
-        Tuple[str, bool]: The unique key and a boolean indicating if a new record was created.
+        Optional[Tuple[str, bool, Optional[datetime], Optional[int]]]: The key, whether a new record was
+            created, and the stored expiry time and click limit, or None if the key is taken.
+    """
+    try:
+        with span("db"):
+            if settings.URL_STORAGE_LAYOUT == "content_addressed":
+                # An orphaned destination may be removed between its upsert and the link insert,
+                # failing the foreign key; the retry inserts the destination again
+                for attempt in range(CREATE_ATTEMPTS):
+                    try:
+                        result = await pool.fetchrow(
+                            CREATE_CONTENT_ADDRESSED_QUERY,
+                            unique_key,
+                            str(original_url),
+                            owner_id,
+                            expires_at,
+                            max_clicks,
+                            url_digest(str(original_url)),
+                        )
+                        break
+                    except asyncpg.ForeignKeyViolationError:
+                        if attempt == CREATE_ATTEMPTS - 1:
+                            raise
+            else:
+                result = await pool.fetchrow(
+                    CREATE_QUERY,
+                    unique_key,
+                    str(original_url),
+                    owner_id,
+                    expires_at,
+                    max_clicks,
+                )
+
+        # No row means the key is already taken by a different URL
+        if result is None:
+            logger.error(f"An error occurred while creating a record: key {unique_key} is taken")
+            return None
+
+        # A renewed key may have referenced another destination
+        if result["created"]:
+            await _remove_orphaned_destinations([result["previous_digest"]])
+
+        # A revived key starts without the sketches of the deleted link
+        if result["revived"]:
+            await _reset_click_sketches(unique_key)
+
+        return (
+            str(result["key"]),
+            result["created"],
+            result["expires_at"],
+            result["max_clicks"],
+        )
+    except Exception as e:
+        logger.error(f"An error occurred while creating a record: {e}")
+
+
+async def _reset_click_sketches(key: str) -> None:
     """
-    _query_select = """SELECT key FROM urls WHERE original_url = :original_url AND owner_id = :owner_id"""
-    _values_select = {"original_url": str(original_url), "owner_id": owner_id}
+    Drop the per-day visitor and latency sketches of a revived key, and its owner in process.
 
+    Args:
+        key (str): The shortened URL key.
+    """
+    link_owners.pop(key, None)
+
+    if not cache_breaker.allow():
+        return
+
+    days = _sketch_days(
+        None,
+        None,
+        max(settings.UNIQUE_VISITORS_RETENTION_DAYS, settings.LATENCY_SKETCH_RETENTION_DAYS),
+    )
     try:
-        existing_url = await db.fetch_one(query=_query_select, values=_values_select)
+        with span("cache"):
+            await cache.delete_click_sketches(key, days)
+        cache_breaker.record_success()
+    except Exception as e:
+        cache_breaker.record_failure()
+        logger.error(f"An error occurred while resetting click sketches: {e}")
 
-        if existing_url:
-            return str(existing_url["key"]), False
 
-        _query_insert = """INSERT INTO urls (key, original_url, owner_id) VALUES (:key, :original_url, :owner_id)"""
-        _values_insert = {
-            "key": unique_key,
-            "original_url": str(original_url),
-            "owner_id": owner_id,
-        }
+async def _add_tombstone(key: str) -> None:
+    """
+    Hide a removed link from the resolver snapshots built before its removal.
 
-        await db.execute(query=_query_insert, values=_values_insert)
-        return unique_key, True
+    Args:
+        key (str): The shortened URL key.
+    """
+    if not snapshot.enabled:
+        return
+
+    snapshot.discard(key)
+
+    _query = """
+    INSERT INTO url_tombstones (key) VALUES (:key)
+    ON CONFLICT (key) DO UPDATE SET deleted_at = now()
+    """
+    _values = {"key": key}
+
+    try:
+        with span("db"):
+            await db.execute(query=_query, values=_values)
     except Exception as e:
-        logger.error(f"An error occurred while creating a record: {e}")
+        logger.error(f"An error occurred while recording a tombstone: {e}")
+
+
+# Keys of removed links whose cache entry is deleted again, by the monotonic time it is due
+pending_invalidations: Dict[str, float] = {}
+
+
+async def _invalidate_cached_link(key: str) -> None:
+    """
+    Drop a removed link from the cache and from the stale tier of this worker.
+
+    A cache write-back that read the link before its removal may land after this delete, so the
+    entry is deleted again by `flush_cache_invalidations` once such write-backs are done, and
+    until then this worker neither reads the link from the cache nor writes it back.
+
+    Args:
+        key (str): The shortened URL key.
+    """
+    stale_cache.discard(key)
+    pending_invalidations[key] = monotonic() + settings.CACHE_INVALIDATION_DELAY_SECONDS
+
+    # While the cache is failing, only the later delete is attempted
+    if not cache_breaker.allow():
+        return
+
+    try:
+        with span("cache"):
+            await cache.delete_value(key)
+        cache_breaker.record_success()
+    except Exception as e:
+        cache_breaker.record_failure()
+        logger.error(f"An error occurred while invalidating the cache: {e}")
+
+
+async def flush_cache_invalidations() -> int:
+    """
+    Delete again the cache entries of the links removed by this worker, once they are due.
+
+    Keys stay pending until their delete succeeds, so entries of links removed while the cache
+    was failing are deleted once it recovers, even those that never expire.
+
+    Returns:
+        int: The number of cache entries deleted.
+    """
+    now = monotonic()
+    due = [key for key, due_at in pending_invalidations.items() if due_at <= now]
+    if not due or not cache_breaker.allow():
+        return 0
+
+    try:
+        with span("cache"):
+            await cache.delete_values(due)
+        cache_breaker.record_success()
+    except Exception as e:
+        cache_breaker.record_failure()
+        logger.error(f"An error occurred while invalidating the cache: {e}")
+        return 0
+
+    # A link removed again in the meantime waits for its own delete
+    for key in due:
+        if pending_invalidations.get(key, float("inf")) <= now:
+            del pending_invalidations[key]
+    return len(due)
 
 
 async def remove_record(key: str, owner_id: str) -> bool:
     """
-    Remove a URL record from the database.
+    Remove a URL record of an owner.
+
+    The link is only marked as deleted, which stops it from resolving at once; its clicks and
+    the row itself are removed later by `purge_deleted_records`, outside of the request.
 
     Args:
         key (str): The shortened URL key.
@@ -162,126 +766,681 @@ async def remove_record(key: str, owner_id: str) -> bool:
     Returns:
         bool: True if the record was deleted, False otherwise.
     """
-    _query = """SELECT key, original_url FROM urls WHERE key = :key AND owner_id = :owner_id"""
+    _query = """
+    UPDATE urls SET deleted_at = now(), purge_before = now()
+    WHERE key = :key AND owner_id = :owner_id AND deleted_at IS NULL
+    RETURNING key
+    """
     _values = {"key": key, "owner_id": owner_id}
 
     try:
-        existing_url = await db.fetch_one(query=_query, values=_values)
+        with span("db"):
+            deleted = await db.fetch_one(query=_query, values=_values)
+    except Exception as e:
+        logger.error(f"An error occurred while removing a record: {e}")
+        return False
 
-        if existing_url:
-            _query_delete = """DELETE FROM urls WHERE key = :key"""
-            _values_delete = {"key": key}
+    if not deleted:
+        return False
 
-            try:
-                await db.execute(query=_query_delete, values=_values_delete)
-                return True
-            except Exception as e:
-                logger.error(f"An error occurred while deleting the record: {e}")
-                return False
+    await _invalidate_cached_link(key)
+    await _add_tombstone(key)
+    return True
 
-        return False
 
+async def sweep_expired_records(batch_size: int) -> int:
+    """
+    Delete one bounded batch of expired links.
+
+    Rows are picked through the partial expiry indexes and locked with SKIP LOCKED, so a sweep
+    never waits on, or holds, long table-wide locks. Links are marked as deleted like removed
+    ones, and left to `purge_deleted_records`.
+
+    Args:
+        batch_size (int): The maximum number of links deleted per statement.
+
+    Returns:
+        int: The number of links deleted.
+    """
+    _query_expired = """
+    UPDATE urls SET deleted_at = now(), purge_before = now() WHERE key IN (
+        SELECT key FROM urls
+        WHERE expires_at <= NOW() AND deleted_at IS NULL
+        ORDER BY expires_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING key
+    """
+    _query_exhausted = """
+    UPDATE urls SET deleted_at = now(), purge_before = now() WHERE key IN (
+        SELECT key FROM urls
+        WHERE max_clicks IS NOT NULL AND click_count >= max_clicks AND deleted_at IS NULL
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING key
+    """
+    _values = {"batch_size": batch_size}
+
+    try:
+        expired = await db.fetch_all(query=_query_expired, values=_values)
+        exhausted = await db.fetch_all(query=_query_exhausted, values=_values)
+        return len(expired) + len(exhausted)
     except Exception as e:
-        logger.error(f"An error occurred while removing a record: {e}")
+        logger.error(f"An error occurred while sweeping expired records: {e}")
+        return 0
 
 
-async def set_metrics(key: str, **kwargs):
+async def purge_deleted_records(batch_size: int) -> int:
     """
-    Set metrics related to the shortened URL.
+    Run one bounded step of purging deleted links.
+
+    The link deleted first is locked with SKIP LOCKED, so several purgers can share the work.
+    Each step deletes at most `batch_size` of the clicks it had when it was deleted. Once they are
+    all gone, the link itself is deleted, with its geo rollups, releasing the key. A link revived
+    in the meantime is kept, and only the geo rollups of its old clicks are removed. Every step is
+    a short transaction, so purging a popular link never holds locks for long.
 
     Args:
-        key (str): The shortened URL key.
-        **kwargs: Additional keyword arguments, including 'client_ip' and 'response_time'.
+        batch_size (int): The maximum number of clicks deleted per step.
+
+    Returns:
+        int: The number of rows deleted, 0 when nothing is left to purge.
+    """
+    _query_next = """
+    SELECT key, purge_before, deleted_at IS NOT NULL AS deleted FROM urls
+    WHERE purge_before IS NOT NULL
+    ORDER BY purge_before
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+    """
+    _query_metrics = """
+    DELETE FROM metrics WHERE id IN (
+        SELECT id FROM metrics WHERE key = $1 AND created_at < $2 LIMIT $3
+    )
     """
-    _query_select = """SELECT owner_id FROM urls WHERE key = :key"""
-    _values_select = {"key": key}
+    _query_link = """DELETE FROM urls WHERE key = $1 RETURNING destination_digest"""
+    # The rollups of the day of the deletion are rebuilt from the clicks of the revived link
+    _query_rollups = """
+    DELETE FROM geo_daily WHERE key = $1 AND day <= ($2::timestamptz AT TIME ZONE 'UTC')::date
+    """
+    _query_rebuild = """
+    INSERT INTO geo_daily (key, day, country, region_id, city_id, owner_id, hits)
+    SELECT
+        key, (created_at AT TIME ZONE 'UTC')::date, COALESCE(country, 0),
+        COALESCE(region_id, 0), COALESCE(city_id, 0), owner_id, SUM(sample_rate)
+    FROM metrics
+    WHERE key = $1
+        AND (created_at AT TIME ZONE 'UTC')::date = ($2::timestamptz AT TIME ZONE 'UTC')::date
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ON CONFLICT (key, day, country, region_id, city_id)
+    DO UPDATE SET hits = geo_daily.hits + EXCLUDED.hits
+    """
+    _query_revived = """UPDATE urls SET purge_before = NULL WHERE key = $1"""
 
     try:
-        result = await db.fetch_one(query=_query_select, values=_values_select)
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                link = await connection.fetchrow(_query_next)
+                if link is None:
+                    return 0
+
+                key, purge_before = link["key"], link["purge_before"]
+                status = await connection.execute(_query_metrics, key, purge_before, batch_size)
+                deleted = int(status.split()[-1])
+                if deleted == batch_size:
+                    return deleted
+
+                if link["deleted"]:
+                    # The last clicks are gone, so the link goes, with its geo rollups by cascade
+                    digest = await connection.fetchval(_query_link, key)
+                else:
+                    await connection.execute(_query_rollups, key, purge_before)
+                    await connection.execute(_query_rebuild, key, purge_before)
+                    await connection.execute(_query_revived, key)
+                    return deleted + 1
+
+        await _remove_orphaned_destinations([digest])
+        return deleted + 1
+    except Exception as e:
+        logger.error(f"An error occurred while purging deleted records: {e}")
+        return 0
 
-        if result:
-            owner_id = str(result["owner_id"])
 
-            _query_insert = """INSERT INTO metrics (key, owner_id, client_ip, response_time) VALUES (:key, :owner_id, :client_ip, :response_time)"""
-            _values_insert = {
-                "key": key,
-                "owner_id": owner_id,
-                "client_ip": kwargs.get("client_ip"),
-                "response_time": kwargs.get("response_time"),
-            }
+async def export_snapshot_entries(
+    since: Optional[datetime],
+) -> Tuple[datetime, List[Tuple[str, str]]]:
+    """
+    Export the links that can be resolved from a snapshot.
+
+    The links are read in a single repeatable read transaction, whose start time is the
+    watermark of the snapshot.
+
+    Args:
+        since (Optional[datetime]): Only export links created after this time. None exports all links.
+
+    Returns:
+        Tuple[datetime, List[Tuple[str, str]]]: The watermark and the (key, original URL) pairs.
+    """
+    async with pool.acquire() as connection:
+        async with connection.transaction(isolation="repeatable_read", readonly=True):
+            watermark = await connection.fetchval("SELECT now()")
+            records = await connection.fetch(SNAPSHOT_EXPORT_QUERY, since)
+
+    return watermark, [(record["key"], record["original_url"]) for record in records]
+
+
+async def export_tombstones(since: datetime) -> List[str]:
+    """
+    List the links removed after a given time.
+
+    Args:
+        since (datetime): The start of the period.
+
+    Returns:
+        List[str]: The keys of the removed links.
+    """
+    records = await pool.fetch(
+        "SELECT key FROM url_tombstones WHERE deleted_at > $1", since
+    )
+    return [record["key"] for record in records]
+
+
+async def prune_tombstones(before: datetime) -> None:
+    """
+    Delete the tombstones already reflected in a full snapshot.
+
+    Args:
+        before (datetime): Tombstones recorded before this time are deleted.
+    """
+    await pool.execute("DELETE FROM url_tombstones WHERE deleted_at < $1", before)
+
+
+async def oldest_metric_time() -> Optional[datetime]:
+    """
+    Find the time of the oldest click still stored in the database.
+
+    Returns:
+        Optional[datetime]: The creation time of the oldest click, or None if there are no clicks.
+    """
+    result = await pool.fetchrow("SELECT MIN(created_at) AS oldest FROM metrics")
+    return result["oldest"]
+
+
+async def stream_metrics(
+    start: datetime, end: datetime, batch_size: int
+) -> AsyncIterator[List[asyncpg.Record]]:
+    """
+    Stream the clicks of a time range in batches, ordered by key.
+
+    Args:
+        start (datetime): The start of the range, inclusive.
+        end (datetime): The end of the range, exclusive.
+        batch_size (int): The number of clicks per batch.
+
+    Yields:
+        List[asyncpg.Record]: The next batch of clicks.
+    """
+    async with pool.acquire() as connection:
+        async with connection.transaction(isolation="repeatable_read", readonly=True):
+            cursor = await connection.cursor(METRICS_ARCHIVE_QUERY, start, end)
+            while True:
+                records = await cursor.fetch(batch_size)
+                if not records:
+                    return
+                yield records
+
+
+async def delete_metrics(start: datetime, end: datetime, batch_size: int) -> int:
+    """
+    Delete the clicks of a time range in bounded batches.
+
+    Args:
+        start (datetime): The start of the range, inclusive.
+        end (datetime): The end of the range, exclusive.
+        batch_size (int): The maximum number of clicks deleted per statement.
+
+    Returns:
+        int: The number of clicks deleted.
+    """
+    _query = """
+    DELETE FROM metrics WHERE id IN (
+        SELECT id FROM metrics
+        WHERE created_at >= $1 AND created_at < $2
+        LIMIT $3
+    )
+    """
 
-            try:
-                await db.execute(query=_query_insert, values=_values_insert)
-            except Exception as e:
-                logger.error(f"An error occurred while setting metrics: {e}")
+    total = 0
+    while True:
+        status = await pool.execute(_query, start, end, batch_size)
+        deleted = int(status.split()[-1])
+        total += deleted
+        if deleted < batch_size:
+            return total
 
+
+async def copy_metrics(start: datetime, end: datetime) -> bytes:
+    """
+    Copy the clicks of a time range out of the database as CSV, leaving out those of deleted links.
+
+    Args:
+        start (datetime): The start of the range, inclusive.
+        end (datetime): The end of the range, exclusive.
+
+    Returns:
+        bytes: One "key,owner_id,client_ip,response_time,sample_rate" line per click, without a header.
+    """
+    _query = f"""
+    SELECT key, owner_id, client_ip, response_time, sample_rate
+    FROM metrics
+    WHERE created_at >= $1 AND created_at < $2 AND {COUNTED_CLICK}
+    """
+
+    output = io.BytesIO()
+    async with pool.acquire() as connection:
+        await connection.copy_from_query(_query, start, end, output=output, format="csv")
+    return output.getvalue()
+
+
+async def replace_stats(link_rows: List[tuple], owner_rows: List[tuple]) -> None:
+    """
+    Replace the recomputed link and owner statistics in a single transaction.
+
+    Args:
+        link_rows (List[tuple]): The rows of link_stats, in LINK_STATS_COLUMNS order.
+        owner_rows (List[tuple]): The rows of owner_stats, in OWNER_STATS_COLUMNS order.
+    """
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            await connection.execute("TRUNCATE link_stats, owner_stats")
+            await connection.copy_records_to_table(
+                "link_stats", records=link_rows, columns=LINK_STATS_COLUMNS
+            )
+            await connection.copy_records_to_table(
+                "owner_stats", records=owner_rows, columns=OWNER_STATS_COLUMNS
+            )
+
+
+async def _remove_orphaned_destinations(digests: List[Optional[bytes]]) -> None:
+    """
+    Delete the given destinations if no link references them any more.
+
+    Args:
+        digests (List[Optional[bytes]]): The destination digests of deleted links; None entries are ignored.
+    """
+    digests = [digest for digest in digests if digest is not None]
+    if not digests:
+        return
+
+    _query = """
+    DELETE FROM destinations
+    WHERE digest = ANY(:digests)
+        AND NOT EXISTS (SELECT 1 FROM urls WHERE urls.destination_digest = destinations.digest)
+    """
+    _values = {"digests": digests}
+
+    try:
+        await db.execute(query=_query, values=_values)
     except Exception as e:
-        logger.error(f"An error occurred while fetching owner_id for metrics: {e}")
+        logger.error(f"An error occurred while removing orphaned destinations: {e}")
+
+
+# Ids of interned region and city names, least recently used first
+geo_name_ids: "OrderedDict[str, int]" = OrderedDict()
 
 
-async def get_average_resolution_time_by_key(key: str) -> int:
+def _geo_name_id(name: Optional[str]) -> Optional[int]:
     """
-    Calculate the average resolution time for a specific shortened URL key.
+    Look up the id of an interned region or city name in process.
+
+    Args:
+        name (Optional[str]): The name, if any.
+
+    Returns:
+        Optional[int]: The id, or None if the name is unknown to this worker.
+    """
+    if name not in geo_name_ids:
+        return None
+    geo_name_ids.move_to_end(name)
+    return geo_name_ids[name]
+
+
+def _remember_geo_name(name: Optional[str], name_id: Optional[int]) -> None:
+    """
+    Keep the id of an interned region or city name in process.
+
+    Args:
+        name (Optional[str]): The name, if any.
+        name_id (Optional[int]): Its id, if it was interned.
+    """
+    if not name or name_id is None:
+        return
+    geo_name_ids[name] = name_id
+    geo_name_ids.move_to_end(name)
+    while len(geo_name_ids) > GEO_NAME_CACHE_SIZE:
+        geo_name_ids.popitem(last=False)
+
+
+# Hits not yet added to the daily geo rollup, by (key, day, country, region_id, city_id),
+# and the owners of their links
+geo_rollup: Counter = Counter()
+geo_rollup_owners: Dict[str, str] = {}
+
+
+async def flush_geo_rollup() -> int:
+    """
+    Add the hits buffered by this worker to the daily geo rollup.
+
+    Clicks only count their hits in process, so a viral link does not serialize its click inserts
+    on one rollup row; each flush upserts every buffered row in a single statement. Hits of a
+    failed flush are buffered again for the next one.
+
+    Returns:
+        int: The number of rollup rows flushed.
+    """
+    global geo_rollup, geo_rollup_owners
+    if not geo_rollup:
+        return 0
+
+    pending, geo_rollup = geo_rollup, Counter()
+    owners, geo_rollup_owners = geo_rollup_owners, {}
+    rows = sorted(pending.items())
+    columns = [
+        list(column)
+        for column in zip(*(group + (owners[group[0]], hits) for group, hits in rows))
+    ]
+
+    try:
+        with span("db"):
+            await pool.execute(GEO_ROLLUP_FLUSH_QUERY, *columns)
+        return len(rows)
+    except Exception as e:
+        geo_rollup.update(pending)
+        geo_rollup_owners = {**owners, **geo_rollup_owners}
+        logger.error(f"An error occurred while flushing the geo rollup: {e}")
+        return 0
+
+
+async def _insert_click(key: str, sample_rate: int, **kwargs) -> Optional[str]:
+    """
+    Record a click in the metrics table and count it in the buffered daily geo rollup.
+
+    The location is stored dictionary-encoded: the country as its ISO 3166-1 numeric code, and
+    the region and city as ids of interned names, interned by the insert itself.
 
     Args:
         key (str): The shortened URL key.
+        sample_rate (int): The number of clicks the recorded click stands for.
+        **kwargs: 'client_ip', 'response_time', 'country', 'region' and 'city'.
 
     Returns:
-        int: The average resolution time in milliseconds.
+        Optional[str]: The owner of the link, or None if the link is gone or the insert failed.
     """
+    region = clean_name(kwargs.get("region"))
+    city = clean_name(kwargs.get("city"))
+    country = encode_country(kwargs.get("country"))
 
-    _query_select = """SELECT AVG(response_time) FROM metrics WHERE key = :key"""
-    _values_select = {"key": key}
+    # Names whose id this worker does not know yet are interned by the insert.
+    # A name first interned by a concurrent transaction is stored as unknown for this click.
+    region_id, city_id = _geo_name_id(region), _geo_name_id(city)
+    missing = [
+        name for name, name_id in ((region, region_id), (city, city_id)) if name and name_id is None
+    ]
 
     try:
-        result = await db.execute(query=_query_select, values=_values_select)
-        return result
+        with span("db"):
+            result = await pool.fetchrow(
+                METRICS_INSERT_QUERY,
+                key,
+                kwargs.get("client_ip"),
+                kwargs.get("response_time"),
+                country,
+                region_id,
+                city_id,
+                sample_rate,
+                missing,
+                region,
+                city,
+            )
+        db_breaker.record_success()
     except Exception as e:
-        logger.error(
-            f"An error occurred while calculating average resolution time for key => {key}: {e}"
-        )
+        db_breaker.record_failure()
+        logger.error(f"An error occurred while setting metrics: {e}")
+        return None
+
+    if not result:
+        return None
+
+    owner_id = str(result["owner_id"])
+    _remember_link_owner(key, owner_id)
+    _remember_geo_name(region, result["region_id"])
+    _remember_geo_name(city, result["city_id"])
 
+    # A sampled click stands for sample_rate clicks, in the rollup as in every hit count
+    day = datetime.now(timezone.utc).date()
+    location = (country or 0, result["region_id"] or 0, result["city_id"] or 0)
+    geo_rollup[(key, day, *location)] += sample_rate
+    geo_rollup_owners[key] = owner_id
+    return owner_id
 
-async def get_average_resolution_time_by_owner(owner_id: str) -> int:
+
+# Owners of the links whose clicks this worker recorded, least recently used first
+link_owners: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _remember_link_owner(key: str, owner_id: str) -> None:
     """
-    Calculate the average resolution time for all URLs owned by a specific user.
+    Keep the owner of a link in process, for the sketches of its clicks left out by sampling.
 
     Args:
+        key (str): The shortened URL key.
         owner_id (str): The ID of the owner.
+    """
+    link_owners[key] = owner_id
+    link_owners.move_to_end(key)
+    while len(link_owners) > LINK_OWNER_CACHE_SIZE:
+        link_owners.popitem(last=False)
 
-    Returns:
-        int: The average resolution time in milliseconds.
+
+async def set_metrics(key: str, **kwargs):
     """
+    Set metrics related to the shortened URL.
 
-    _query_select = (
-        """SELECT AVG(response_time) FROM metrics WHERE owner_id = :owner_id"""
-    )
-    _values_select = {"owner_id": owner_id}
+    Clicks of sampled links are only written to the database one in N, with N stored as their
+    sample rate, and the click is counted in the daily geo rollup through the buffer of
+    `flush_geo_rollup`. The visitor and latency sketches in the cache are fed by every click;
+    those of a click left out by sampling are updated once this worker knows the owner of the
+    link from one of its recorded clicks.
 
+    Args:
+        key (str): The shortened URL key.
+        **kwargs: Additional keyword arguments, including 'client_ip', 'response_time',
+                  'country', 'region' and 'city'.
+    """
+    sample_rate = click_sampler.sample(key)
+    if sample_rate:
+        # Skip recording while the database is known to be failing, rather than waiting on it
+        if not db_breaker.allow():
+            return
+        owner_id = await _insert_click(key, sample_rate, **kwargs)
+    else:
+        owner_id = link_owners.get(key)
+
+    if owner_id is None or not cache_breaker.allow():
+        return
+
+    # Feed the per-day visitor and latency sketches of the key and its owner
+    response_time = kwargs.get("response_time")
     try:
-        result = await db.execute(query=_query_select, values=_values_select)
-        return result
+        with span("cache"):
+            await cache.add_click_sketches(
+                key=key,
+                owner_id=owner_id,
+                day=datetime.now(timezone.utc).date(),
+                client_ip=kwargs.get("client_ip"),
+                visitor_ttl=settings.UNIQUE_VISITORS_RETENTION_DAYS * 86400,
+                latency_bin=(
+                    latency_sketch.bin(response_time)
+                    if response_time is not None
+                    else None
+                ),
+                response_time=response_time,
+                latency_ttl=settings.LATENCY_SKETCH_RETENTION_DAYS * 86400,
+            )
+        cache_breaker.record_success()
     except Exception as e:
-        logger.error(
-            f"An error occurred while calculating average resolution time for a user account: {e}"
+        cache_breaker.record_failure()
+        logger.error(f"An error occurred while updating click sketches: {e}")
+
+
+async def _resolution_time_summary_exact(
+    column: str, value: str, start: Optional[date], end: Optional[date]
+) -> Optional[dict]:
+    """
+    Compute resolution time percentiles exactly from the metrics table.
+
+    The count and average are weighted by the sample rate of each click; percentiles are taken
+    over the recorded clicks.
+
+    Args:
+        column (str): The column to filter on, either "key" or "owner_id".
+        value (str): The value of the filter column.
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+
+    Returns:
+        Optional[dict]: The count, average and percentiles in milliseconds, or None if there are no clicks.
+    """
+    _query = f"""
+    SELECT
+        SUM(sample_rate)::bigint AS count,
+        SUM(response_time * sample_rate)::float8 / SUM(sample_rate) AS avg,
+        percentile_cont(ARRAY{list(RESOLUTION_TIME_QUANTILES)}) WITHIN GROUP (ORDER BY response_time) AS quantiles
+    FROM metrics
+    WHERE {column} = :value AND {COUNTED_CLICK}"""
+    _values = {"value": value}
+
+    if start:
+        _query += """ AND created_at >= :start"""
+        _values["start"] = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    if end:
+        _query += """ AND created_at < :end"""
+        _values["end"] = datetime.combine(
+            end + timedelta(days=1), time.min, tzinfo=timezone.utc
+        )
+
+    with span("db"):
+        result = await db.fetch_one(query=_query, values=_values)
+    if not result or not result["count"]:
+        return None
+
+    summary = {"count": result["count"], "avg": round(float(result["avg"]), 2)}
+    for quantile, estimate in zip(RESOLUTION_TIME_QUANTILES, result["quantiles"]):
+        summary[f"p{quantile * 100:g}"] = round(estimate, 2)
+    return summary
+
+
+async def _resolution_time_summary(
+    scope: str,
+    column: str,
+    value: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Optional[dict]:
+    """
+    Compute resolution time percentiles by merging per-day latency sketches.
+
+    The metrics table is read instead when the sketches cannot be reached, do not cover the
+    range, or hold no clicks, e.g. after being evicted from the cache.
+
+    Args:
+        scope (str): The sketch scope, either "key" or "owner".
+        column (str): The metrics column matching the scope.
+        value (str): The shortened URL key or the owner ID.
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+
+    Returns:
+        Optional[dict]: The count, average and percentiles in milliseconds, or None if there are no clicks.
+    """
+    days = _sketch_days(start, end, settings.LATENCY_SKETCH_RETENTION_DAYS)
+
+    try:
+        covered = await _sketches_cover(
+            "lat", scope, value, start, settings.LATENCY_SKETCH_RETENTION_DAYS
         )
+        if covered:
+            with span("cache"):
+                sketches = await cache.read_latency_sketches(
+                    cache.latency_sketch_key(scope, value, day) for day in days
+                )
+            summary = latency_sketch.summarize(
+                latency_sketch.merge(sketches), RESOLUTION_TIME_QUANTILES
+            )
+            if summary is not None:
+                return summary
+    except Exception as e:
+        logger.error(f"An error occurred while reading latency sketches: {e}")
+
+    try:
+        return await _resolution_time_summary_exact(column, value, start, end)
+    except Exception as e:
+        logger.error(f"An error occurred while computing resolution time percentiles: {e}")
+        return None
+
+
+async def get_average_resolution_time_by_key(key: str) -> Optional[float]:
+    """
+    Calculate the average resolution time for a specific shortened URL key.
+
+    Args:
+        key (str): The shortened URL key.
+
+    Returns:
+        Optional[float]: The average resolution time in milliseconds, or None if there are no clicks.
+    """
+    summary = await _resolution_time_summary("key", "key", key)
+    return summary["avg"] if summary else None
+
+
+async def get_average_resolution_time_by_owner(owner_id: str) -> Optional[float]:
+    """
+    Calculate the average resolution time for all URLs owned by a specific user.
+
+    Args:
+        owner_id (str): The ID of the owner.
+
+    Returns:
+        Optional[float]: The average resolution time in milliseconds, or None if there are no clicks.
+    """
+    summary = await _resolution_time_summary("owner", "owner_id", owner_id)
+    return summary["avg"] if summary else None
 
 
 async def count_hits(key: str) -> int:
     """
     Counts the number of times a shortened URL was resolved.
 
+    Sampled clicks count for their sample rate, so the total is an estimate for sampled links.
+
     Args:
         key (str): The shortened URL key.
 
     Returns:
         int: The total number of hits for the given key.
     """
-    _query = """SELECT COUNT(*) AS total_number_of_hits FROM metrics WHERE key = :key"""
+    _query = f"""
+    SELECT COALESCE(SUM(sample_rate), 0)::bigint AS total_number_of_hits
+    FROM metrics
+    WHERE key = :key AND {COUNTED_CLICK}
+    """
     _values = {"key": key}
 
     try:
-        count_result = await db.fetch_one(query=_query, values=_values)
+        with span("db"):
+            count_result = await db.fetch_one(query=_query, values=_values)
         total_number_of_hits: int = count_result["total_number_of_hits"]
         return total_number_of_hits
     except Exception as e:
@@ -299,17 +1458,18 @@ async def count_top_five_hits(owner_id: str) -> Dict[str, int]:
     Returns:
         Dict[str, int]: A dictionary where keys are shortened URL keys and values are the number of hits.
     """
-    _query = """
-    SELECT key, COUNT(*) AS total_hits
+    _query = f"""
+    SELECT key, SUM(sample_rate)::bigint AS total_hits
     FROM metrics
-    WHERE owner_id = :owner_id
+    WHERE owner_id = :owner_id AND {COUNTED_CLICK}
     GROUP BY key
     ORDER BY total_hits DESC
     LIMIT 5
     """
 
     try:
-        results = await db.fetch_all(query=_query, values={"owner_id": owner_id})
+        with span("db"):
+            results = await db.fetch_all(query=_query, values={"owner_id": owner_id})
         top_hits = {result["key"]: result["total_hits"] for result in results}
         return top_hits
     except Exception as e:
@@ -317,34 +1477,270 @@ async def count_top_five_hits(owner_id: str) -> Dict[str, int]:
         return {}
 
 
-async def count_unique_ips(key: str) -> int:
+def _sketch_days(
+    start: Optional[date], end: Optional[date], retention_days: int
+) -> List[date]:
     """
-    Counts the number of unique IP addresses that accessed a shortened URL.
+    List the days whose sketches cover a date range, clamped to the retention window.
 
     Args:
-        key (str): The shortened URL key.
+        start (Optional[date]): The first day of the range. Defaults to the oldest retained day.
+        end (Optional[date]): The last day of the range. Defaults to today.
+        retention_days (int): The number of days the sketches are kept.
+
+    Returns:
+        List[date]: The days of the range, oldest first.
+    """
+    today = datetime.now(timezone.utc).date()
+    oldest = today - timedelta(days=retention_days - 1)
+    start = max(start or oldest, oldest)
+    end = min(end or today, today)
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+async def _sketches_cover(
+    kind: str, scope: str, value: str, start: Optional[date], retention_days: int
+) -> bool:
+    """
+    Check that per-day sketches hold every click of a series from the start of a range.
+
+    Sketches only exist for days after the first one they were written, and within their
+    retention. A range without a start covers all history, which for a link begins the day it
+    was created; the full history of an owner is never known to be covered.
+
+    Args:
+        kind (str): The sketch kind, "hll" for visitors or "lat" for latencies.
+        scope (str): The sketch scope, either "key" or "owner".
+        value (str): The shortened URL key or the owner ID.
+        start (Optional[date]): The first day of the range, if any.
+        retention_days (int): The number of days the sketches are kept.
+
+    Returns:
+        bool: True if the sketches can answer the range, False if it must be counted exactly.
+    """
+    with span("cache"):
+        origin = await cache.sketch_origin(kind)
+    if origin is None:
+        return False
+
+    if start is None and scope == "key":
+        link = await fetch_link(value)
+        if link is None:
+            return False
+        start = link["created_at"].astimezone(timezone.utc).date()
+    if start is None:
+        return False
+
+    # Clicks of the origin day may predate the first sketch, so coverage starts the day after
+    oldest = datetime.now(timezone.utc).date() - timedelta(days=retention_days - 1)
+    return start > origin and start >= oldest
+
+
+async def _count_unique_ips_exact(
+    column: str, value: str, start: Optional[date], end: Optional[date]
+) -> int:
+    """
+    Count distinct visitor IPs exactly from the metrics table.
+
+    Args:
+        column (str): The column to filter on, either "key" or "owner_id".
+        value (str): The value of the filter column.
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
 
     Returns:
         int: The number of unique IPs.
     """
-    _query = """SELECT COUNT(DISTINCT client_ip) AS unique_ip_count FROM metrics WHERE key = :key"""
-    _values = {"key": key}
+    _query = f"""
+    SELECT COUNT(DISTINCT client_ip) AS unique_ip_count
+    FROM metrics
+    WHERE {column} = :value AND {COUNTED_CLICK}"""
+    _values = {"value": value}
+
+    if start:
+        _query += """ AND created_at >= :start"""
+        _values["start"] = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    if end:
+        _query += """ AND created_at < :end"""
+        _values["end"] = datetime.combine(
+            end + timedelta(days=1), time.min, tzinfo=timezone.utc
+        )
 
-    try:
+    with span("db"):
         count_result = await db.fetch_one(query=_query, values=_values)
-        unique_ip_count: int = count_result["unique_ip_count"]
-        return unique_ip_count
+    unique_ip_count: int = count_result["unique_ip_count"]
+    return unique_ip_count
+
+
+async def _count_unique_ips(
+    scope: str,
+    column: str,
+    value: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> int:
+    """
+    Estimate distinct visitor IPs by merging per-day sketches, counting exactly when the estimate is small.
+
+    Ranges reaching before the sketches, or beyond their retention, are always counted exactly.
+
+    Args:
+        scope (str): The sketch scope, either "key" or "owner".
+        column (str): The metrics column matching the scope.
+        value (str): The shortened URL key or the owner ID.
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+
+    Returns:
+        int: The number of unique IPs.
+    """
+    try:
+        covered = await _sketches_cover(
+            "hll", scope, value, start, settings.UNIQUE_VISITORS_RETENTION_DAYS
+        )
+        if covered:
+            sketch_keys = (
+                cache.visitor_sketch_key(scope, value, day)
+                for day in _sketch_days(
+                    start, end, settings.UNIQUE_VISITORS_RETENTION_DAYS
+                )
+            )
+            with span("cache"):
+                estimate = await cache.count_unique_visitors(sketch_keys)
+
+            # Large audiences are served from the sketches alone
+            if estimate >= settings.UNIQUE_VISITORS_EXACT_THRESHOLD:
+                return estimate
+    except Exception as e:
+        logger.error(f"An error occurred while estimating unique IPs: {e}")
+
+    # Small audiences, and ranges the sketches cannot answer, are counted exactly
+    try:
+        return await _count_unique_ips_exact(column, value, start, end)
     except Exception as e:
         logger.error(f"An error occurred while counting unique IPs: {e}")
         return 0
 
 
-async def evaluate_performance(key: str) -> Optional[dict]:
+async def count_unique_ips(
+    key: str, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """
+    Counts the number of unique IP addresses that accessed a shortened URL.
+
+    Args:
+        key (str): The shortened URL key.
+        start (Optional[date]): The first day to count. Defaults to all history.
+        end (Optional[date]): The last day to count. Defaults to today.
+
+    Returns:
+        int: The number of unique IPs.
+    """
+    return await _count_unique_ips("key", "key", key, start=start, end=end)
+
+
+async def count_unique_ips_by_owner(
+    owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """
+    Counts the number of unique IP addresses that accessed any shortened URL of an owner.
+
+    Args:
+        owner_id (str): The ID of the owner.
+        start (Optional[date]): The first day to count. Defaults to all history.
+        end (Optional[date]): The last day to count. Defaults to today.
+
+    Returns:
+        int: The number of unique IPs.
+    """
+    return await _count_unique_ips(
+        "owner", "owner_id", owner_id, start=start, end=end
+    )
+
+
+async def geo_breakdown(
+    column: str,
+    value: str,
+    level: str = "country",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = 50,
+) -> List[dict]:
+    """
+    Break clicks down by location, from the daily geo rollup.
+
+    The rollup is read through its primary key for a link and its owner index for an owner, and
+    names are only joined onto the aggregated rows.
+
+    Args:
+        column (str): The column to filter on, either "key" or "owner_id".
+        value (str): The shortened URL key or the owner ID.
+        level (str, optional): The breakdown level: "country", "region" or "city". Defaults to "country".
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+        limit (int, optional): The maximum number of locations returned. Defaults to 50.
+
+    Returns:
+        List[dict]: One row per location with its hits, most hits first.
+    """
+    group_columns = ["country", "region_id", "city_id"][: GEO_LEVELS.index(level) + 1]
+    columns = ", ".join(group_columns)
+
+    _query = f"""
+    SELECT {columns}, SUM(hits) AS hits
+    FROM geo_daily
+    WHERE {column} = :value AND {COUNTED_ROLLUP}"""
+    _values = {"value": value, "limit": limit}
+    if start:
+        _query += """ AND day >= :start"""
+        _values["start"] = start
+    if end:
+        _query += """ AND day <= :end"""
+        _values["end"] = end
+
+    # Names are joined for the levels that group by them; unknown locations (id 0) have none
+    region_name, city_name, _joins = "NULL", "NULL", ""
+    if level != "country":
+        region_name = "regions.name"
+        _joins += """ LEFT JOIN geo_names AS regions ON regions.id = totals.region_id"""
+    if level == "city":
+        city_name = "cities.name"
+        _joins += """ LEFT JOIN geo_names AS cities ON cities.id = totals.city_id"""
+
+    _query = f"""
+    SELECT totals.country, {region_name} AS region, {city_name} AS city, totals.hits
+    FROM ({_query} GROUP BY {columns} ORDER BY hits DESC LIMIT :limit) AS totals{_joins}
+    ORDER BY totals.hits DESC
+    """
+
+    try:
+        with span("db"):
+            records = await db.fetch_all(query=_query, values=_values)
+        return [
+            breakdown_row(
+                level,
+                decode_country(record["country"]),
+                record["region"],
+                record["city"],
+                int(record["hits"]),
+            )
+            for record in records
+        ]
+    except Exception as e:
+        logger.error(f"An error occurred while computing the geo breakdown: {e}")
+        return []
+
+
+async def evaluate_performance(
+    key: str, start: Optional[date] = None, end: Optional[date] = None
+) -> Optional[dict]:
     """
     Evaluate performance metrics for a shortened URL.
 
     Args:
         key (str): The shortened URL key.
+        start (Optional[date]): The first day of the resolution time range. Defaults to all retained days.
+        end (Optional[date]): The last day of the resolution time range. Defaults to today.
 
     Returns:
         Optional[dict]: A dictionary with performance metrics or None if an error occurs.
@@ -352,12 +1748,15 @@ async def evaluate_performance(key: str) -> Optional[dict]:
     try:
         total_hits = await count_hits(key)
         unique_ips = await count_unique_ips(key)
-        avg_resolution_time = await get_average_resolution_time_by_key(key=key)
+        resolution_time = await _resolution_time_summary(
+            "key", "key", key, start=start, end=end
+        )
 
         performance = {
             "total_hits": total_hits,
             "unique_ips": unique_ips,
-            "avg_resolution_time": avg_resolution_time,
+            "avg_resolution_time": resolution_time["avg"] if resolution_time else None,
+            "resolution_time": resolution_time,
         }
 
         return performance
@@ -366,6 +1765,36 @@ async def evaluate_performance(key: str) -> Optional[dict]:
         return None
 
 
+async def evaluate_owner_performance(
+    owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+) -> Optional[dict]:
+    """
+    Evaluate the resolution time percentiles across all URLs of an owner.
+
+    Args:
+        owner_id (str): The ID of the owner.
+        start (Optional[date]): The first day of the range. Defaults to all retained days.
+        end (Optional[date]): The last day of the range. Defaults to today.
+
+    Returns:
+        Optional[dict]: A dictionary with performance metrics or None if an error occurs.
+    """
+    try:
+        resolution_time = await _resolution_time_summary(
+            "owner", "owner_id", owner_id, start=start, end=end
+        )
+
+        performance = {
+            "avg_resolution_time": resolution_time["avg"] if resolution_time else None,
+            "resolution_time": resolution_time,
+        }
+
+        return performance
+    except Exception as e:
+        logger.error(f"An error occurred while evaluating owner performance: {e}")
+        return None
+
+
 async def get_metrics(key: str) -> Optional[dict]:
     """
     Retrieve metrics for a shortened URL.
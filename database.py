@@ -1,96 +1,110 @@
+from typing import Any, List, Optional
+
+import asyncpg
 from databases import Database
 from settings import settings
 
 # PostgreSQL Data Source Name (DSN) for connecting to the database
 PG_DSN: str = (
-    f"postgresql+asyncpg://{settings.PG_USERNAME}:{settings.PG_PASSWORD}@{settings.PG_HOST}/{settings.PG_DATABASE_NAME}"
+    f"postgresql+asyncpg://{settings.PG_USERNAME}:{settings.PG_PASSWORD}@{settings.PG_HOST}:{settings.PG_PORT}/{settings.PG_DATABASE_NAME}"
 )
 
 # Initialize the database connection
-database = Database(PG_DSN)
+database = Database(
+    PG_DSN, min_size=settings.PG_POOL_MIN_SIZE, max_size=settings.PG_POOL_MAX_SIZE
+)
 
 
-async def create_tables(database: Database):
+class ConnectionPool:
     """
-    Create tables in the database if they do not already exist.
+    Direct asyncpg connection pool for hot-path statements.
 
-    Args:
-        database (Database): The database connection object.
-    """
-    # Enable the pgcrypto extension to use gen_random_uuid() for UUID generation
-    extension = """CREATE EXTENSION IF NOT EXISTS pgcrypto"""
-
-    # SQL query to create the 'urls' table if it does not exist
-    urls_table_query = """
-    CREATE TABLE IF NOT EXISTS urls (
-        key VARCHAR(7) PRIMARY KEY, 
-        original_url TEXT NOT NULL, 
-        owner_id VARCHAR(255) NOT NULL, 
-        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-    );
+    Statements bypass SQLAlchemy compilation and use positional ($1) parameters. asyncpg
+    prepares each statement text once per connection and keeps it in the connection's
+    statement cache, so repeated hot statements are only bound and executed.
     """
 
-    # SQL query to create the 'metrics' table if it does not exist
-    metrics_table_query = """
-    CREATE TABLE IF NOT EXISTS metrics (
-        id UUID PRIMARY KEY DEFAULT gen_random_uuid(), 
-        key VARCHAR(7) NOT NULL REFERENCES urls(key) ON DELETE CASCADE, 
-        owner_id VARCHAR(255) NOT NULL, 
-        client_ip VARCHAR(45) NOT NULL, 
-        response_time INTEGER NOT NULL,
-        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-    );
-    """
+    def __init__(self, dsn: str, **kwargs) -> None:
+        self.dsn = dsn
+        self.min_size: int = kwargs.get("min_size", 1)
+        self.max_size: int = kwargs.get("max_size", 10)
+        self.statement_cache_size: int = kwargs.get("statement_cache_size", 100)
+        self.command_timeout: Optional[float] = kwargs.get("command_timeout")
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self) -> None:
+        if self.pool is not None:
+            return
+
+        self.pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            command_timeout=self.command_timeout,
+        )
+
+    async def fetchrow(self, query: str, *args: Any) -> Optional[asyncpg.Record]:
+        return await self.pool.fetchrow(query, *args)
+
+    async def fetch(self, query: str, *args: Any) -> List[asyncpg.Record]:
+        return await self.pool.fetch(query, *args)
+
+    async def execute(self, query: str, *args: Any) -> str:
+        return await self.pool.execute(query, *args)
+
+    def acquire(self):
+        # Dedicated connection, for statements that need a transaction
+        return self.pool.acquire()
+
+    async def disconnect(self) -> None:
+        if self.pool is None:
+            return
+
+        await self.pool.close()
+        self.pool = None
+
+
+# Initialize the pool used for hot-path statements
+pool = ConnectionPool(
+    f"postgresql://{settings.PG_USERNAME}:{settings.PG_PASSWORD}@{settings.PG_HOST}:{settings.PG_PORT}/{settings.PG_DATABASE_NAME}",
+    min_size=settings.PG_POOL_MIN_SIZE,
+    max_size=settings.PG_POOL_MAX_SIZE,
+    statement_cache_size=settings.PG_STATEMENT_CACHE_SIZE,
+    command_timeout=settings.PG_COMMAND_TIMEOUT,
+)
 
-    try:
-        # Execute the queries to create the tables
-        await database.execute(query=urls_table_query)
-        await database.execute(query=metrics_table_query)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-async def create_triggers(database: Database):
-    # SQL query to create update_updated_at_column function
-    update_function_query = """
-    CREATE OR REPLACE FUNCTION update_updated_at_column()
-    RETURNS TRIGGER AS $$
-    BEGIN
-        NEW.updated_at = NOW();
-        RETURN NEW;
-    END;
-    $$ LANGUAGE plpgsql;
-    """
+# Alembic revision of the schema this code expects (see migrations/versions)
+SCHEMA_HEAD: str = "0009"
 
-    # Check if trigger exists before creation
-    check_update_trigger_query = """
-    SELECT EXISTS (
-        SELECT 1
-        FROM pg_trigger
-        WHERE tgname = 'update_urls_updated_at'
-    );
-    """
 
-    # SQL query to create update_urls_updated_at trigger
-    update_trigger_query = """
-    CREATE TRIGGER update_urls_updated_at
-    BEFORE UPDATE ON urls
-    FOR EACH ROW
-    EXECUTE FUNCTION update_updated_at_column();
+async def check_schema_version(database: Database) -> None:
     """
+    Check that the database schema is at the revision this code expects.
 
-    try:
-        # Execute query to create function
-        await database.execute(update_function_query)
+    Schema changes are applied by an explicit migration step (`alembic upgrade head`), so startup
+    only performs this single cheap query instead of running DDL in every worker.
 
-        # Check if trigger exists
-        update_trigger_exists = await database.execute(check_update_trigger_query)
+    Args:
+        database (Database): The database connection object.
 
-        # Create trigger if it does not exist
-        if not update_trigger_exists:
-            await database.execute(update_trigger_query)
+    Raises:
+        RuntimeError: If the schema is missing or at a different revision.
+    """
+    try:
+        version = await database.fetch_val(
+            query="""SELECT version_num FROM alembic_version"""
+        )
     except Exception as e:
-        print(f"An error occurred: {e}")
+        raise RuntimeError(
+            "The database schema is not initialised, run `alembic upgrade head`"
+        ) from e
+
+    if version != SCHEMA_HEAD:
+        raise RuntimeError(
+            f"The database schema is at revision {version}, expected {SCHEMA_HEAD}; "
+            "run `alembic upgrade head`"
+        )
 
 
 # Pydantic models (if needed)
@@ -0,0 +1,77 @@
+import asyncio
+import re
+import time
+from typing import Dict, Set
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from http_cache import REDIRECT_HEADERS
+from routes.url_resolver import get_client_ip, record_click
+from settings import settings
+from storage import storage
+
+# Paths that can be a shortened URL key
+KEY_PATH_PATTERN = re.compile(r"^/([0-9A-Za-z]{7})$")
+
+
+class RedirectFastLane:
+    """
+    ASGI middleware answering cached redirects before FastAPI routing runs.
+
+    GET requests whose path is a 7 character key are looked up in the fast tiers of the storage
+    backend (for PostgreSQL, the snapshot and then the cache). On a hit the redirect is written
+    straight from the URL bytes and pre-encoded headers, and the click is handed to a background
+    task once the response has been sent, so the request returns without waiting for it.
+    Everything else, including cache misses and cache errors, falls through to the application.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        # Click recording tasks still running, referenced so they are not garbage collected
+        self._clicks: Set[asyncio.Task] = set()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        match = KEY_PATH_PATTERN.match(scope["path"])
+        if match is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Measure the start time
+        start_time = time.time()
+        key = match.group(1)
+
+        # Misses, and lookups while the cache is failing, go to the application's resolve path
+        original_url = await storage.fetch_cached_url(key)
+
+        if not original_url:
+            await self.app(scope, receive, send)
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": settings.REDIRECT_STATUS_CODE,
+                "headers": [(b"location", original_url), *REDIRECT_HEADERS],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+        # Record the click once the client has its response
+        headers: Dict[str, str] = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+            if name == b"x-forwarded-for"
+        }
+        task = asyncio.create_task(
+            record_click(
+                key=key,
+                client_ip=get_client_ip(headers, scope.get("client")),
+                start_time=start_time,
+            )
+        )
+        self._clicks.add(task)
+        task.add_done_callback(self._clicks.discard)
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import Optional
+
+import pycountry
+
+# Levels of the geographic breakdowns, coarsest first
+GEO_LEVELS = ("country", "region", "city")
+
+# Placeholder returned by the geolocation lookup when a field is not known
+UNKNOWN = "Unknown"
+
+
+@lru_cache(maxsize=512)
+def encode_country(alpha_2: Optional[str]) -> Optional[int]:
+    """
+    Encode a country as its ISO 3166-1 numeric code, which fits in a smallint column.
+
+    Args:
+        alpha_2 (Optional[str]): The two-letter country code, e.g. "US".
+
+    Returns:
+        Optional[int]: The numeric code, e.g. 840, or None if the country is not known.
+    """
+    if not alpha_2 or alpha_2 == UNKNOWN:
+        return None
+    country = pycountry.countries.get(alpha_2=alpha_2.upper())
+    return int(country.numeric) if country else None
+
+
+@lru_cache(maxsize=512)
+def decode_country(numeric: Optional[int]) -> Optional[str]:
+    """
+    Decode an ISO 3166-1 numeric code back into the two-letter country code.
+
+    Args:
+        numeric (Optional[int]): The numeric code.
+
+    Returns:
+        Optional[str]: The two-letter code, or None if the country is not known.
+    """
+    if not numeric:
+        return None
+    country = pycountry.countries.get(numeric=f"{numeric:03d}")
+    return country.alpha_2 if country else None
+
+
+def clean_name(name: Optional[str]) -> Optional[str]:
+    """
+    Normalize a region or city name from the geolocation lookup.
+
+    Args:
+        name (Optional[str]): The name, possibly empty or the "Unknown" placeholder.
+
+    Returns:
+        Optional[str]: The name, or None if it is not known.
+    """
+    if not name or name == UNKNOWN:
+        return None
+    return name.strip() or None
+
+
+def breakdown_row(
+    level: str,
+    country: Optional[str],
+    region: Optional[str],
+    city: Optional[str],
+    hits: int,
+) -> dict:
+    """
+    Shape one row of a geographic breakdown, keeping the fields down to the requested level.
+
+    Args:
+        level (str): The breakdown level, one of GEO_LEVELS.
+        country (Optional[str]): The two-letter country code, if known.
+        region (Optional[str]): The region name, if known.
+        city (Optional[str]): The city name, if known.
+        hits (int): The number of clicks from the location.
+
+    Returns:
+        dict: The location fields of the level and the number of hits.
+    """
+    depth = GEO_LEVELS.index(level) + 1
+    row = dict(zip(GEO_LEVELS[:depth], (country, region, city)))
+    row["hits"] = hits
+    return row
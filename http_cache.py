@@ -0,0 +1,184 @@
+import hashlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from settings import settings
+
+# Redirect status codes that browsers and CDNs are allowed to cache
+PERMANENT_REDIRECTS = (301, 308)
+
+
+def redirect_cache_control() -> str:
+    """
+    Build the Cache-Control header value for redirects according to the configured policy.
+
+    Permanent redirects (301/308) are cacheable by shared caches for REDIRECT_MAX_AGE seconds.
+    Temporary redirects (302/307) are marked no-store so every click reaches the service and is counted.
+
+    Returns:
+        str: The Cache-Control header value.
+    """
+    if settings.REDIRECT_STATUS_CODE in PERMANENT_REDIRECTS:
+        return f"public, max-age={settings.REDIRECT_MAX_AGE}"
+    return "private, no-store"
+
+
+# The redirect policy is global, so the header value only needs to be built once
+REDIRECT_CACHE_CONTROL: str = redirect_cache_control()
+
+# Pre-encoded headers shared by every redirect response
+REDIRECT_HEADERS = [
+    (b"cache-control", REDIRECT_CACHE_CONTROL.encode("latin-1")),
+    (b"content-length", b"0"),
+]
+
+
+class FastRedirectResponse(Response):
+    """
+    Redirect response built from pre-encoded headers.
+
+    Unlike RedirectResponse, the URL is neither quoted nor parsed again, since stored URLs are
+    validated (and percent-encoded) before they are written.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.status_code = settings.REDIRECT_STATUS_CODE
+        self.background = None
+        self.body = b""
+        self.raw_headers = [(b"location", url.encode("latin-1")), *REDIRECT_HEADERS]
+
+
+def _orjson_default(obj: Any) -> Any:
+    """
+    Serialize types orjson does not handle natively.
+
+    Args:
+        obj (Any): The object to serialize.
+
+    Raises:
+        TypeError: If the object type is not supported.
+
+    Returns:
+        Any: A JSON-serializable representation of the object.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def compute_etag(body: bytes) -> str:
+    """
+    Compute a strong entity tag for a response body.
+
+    Args:
+        body (bytes): The rendered response body.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check whether an If-None-Match header matches an entity tag using weak comparison.
+
+    Args:
+        if_none_match (str): The raw If-None-Match header value.
+        etag (str): The entity tag of the current representation.
+
+    Returns:
+        bool: True if the client already holds the current representation.
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    """
+    Check whether a representation has been modified since the date sent by the client.
+
+    Args:
+        if_modified_since (str): The raw If-Modified-Since header value.
+        last_modified (datetime): The last modification time of the representation.
+
+    Returns:
+        bool: True if the representation has not been modified.
+    """
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    # HTTP dates have a resolution of one second
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_json_response(
+    request: Request,
+    content: Any,
+    last_modified: Optional[datetime] = None,
+    status_code: int = 200,
+) -> Response:
+    """
+    Render a JSON response with validators and answer conditional GETs with 304 Not Modified.
+
+    If-None-Match takes precedence over If-Modified-Since, as required by RFC 9110.
+
+    Args:
+        request (Request): The incoming request carrying the conditional headers.
+        content (Any): The JSON-serializable response content.
+        last_modified (Optional[datetime]): The last modification time of the content, if known.
+        status_code (int, optional): The status code for a full response. Defaults to 200.
+
+    Returns:
+        Response: A 304 response if the client copy is current, otherwise the full JSON response.
+    """
+    body = orjson.dumps(content, default=_orjson_default)
+    etag = compute_etag(body)
+
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Cache-Control": settings.API_CACHE_CONTROL,
+        "Vary": "Authorization",
+    }
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None and last_modified is not None:
+        not_modified = _not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=body,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
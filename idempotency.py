@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from breaker import cache_breaker
+from cache import IDEMPOTENCY_PENDING, cache
+from logger import logger
+from settings import settings
+
+# Longest accepted Idempotency-Key header value
+MAX_KEY_LENGTH = 255
+
+# A captured response: status, headers and body
+CapturedResponse = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+def _digest(*parts: bytes) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(hashlib.blake2b(part, digest_size=16).digest())
+    return hasher.hexdigest()
+
+
+def _succeeded(response: Optional[CapturedResponse]) -> bool:
+    # Only successful responses are replayed; anything else may succeed when retried
+    return response is not None and 200 <= response[0] < 300
+
+
+def _encode(fingerprint: str, response: CapturedResponse) -> bytes:
+    """
+    Serialize a response for Redis: a JSON line of metadata followed by the raw body.
+
+    Args:
+        fingerprint (str): The fingerprint of the request that produced the response.
+        response (CapturedResponse): The response.
+
+    Returns:
+        bytes: The serialized record.
+    """
+    status, headers, body = response
+    meta = {
+        "fingerprint": fingerprint,
+        "status": status,
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+    }
+    return orjson.dumps(meta) + b"\n" + body
+
+
+def _decode(record: bytes) -> Tuple[str, CapturedResponse]:
+    meta, body = record.split(b"\n", 1)
+    meta = orjson.loads(meta)
+    headers = [
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in meta["headers"]
+    ]
+    return meta["fingerprint"], (meta["status"], headers, body)
+
+
+async def _send_response(
+    send: Send, response: CapturedResponse, replayed: bool = False
+) -> None:
+    status, headers, body = response
+    if replayed:
+        headers = [*headers, (b"idempotent-replayed", b"true")]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send: Send, status: int, detail: str, retry_after: bool = False) -> None:
+    body = orjson.dumps({"detail": detail})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    ]
+    if retry_after:
+        headers.append((b"retry-after", b"1"))
+    await _send_response(send, (status, headers, body))
+
+
+class IdempotentRequests:
+    """
+    ASGI middleware making link creation safe to retry with an Idempotency-Key header.
+
+    The first request with a given key runs normally, and its successful response is stored in
+    Redis for IDEMPOTENCY_TTL_SECONDS. Retries with the same key are answered from Redis before
+    routing, so they skip token verification and the write path. Records are scoped to the
+    caller's Authorization header, so one caller cannot replay another's response. Concurrent
+    duplicates in the same worker wait for the first request and replay its response if it
+    succeeded, and duplicates in other workers, or of a request that failed, get 409 Conflict.
+    Reusing a key with different parameters is rejected with 422.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.paths = {f"{settings.BASE_URL_PATH}/shorten/", f"{settings.BASE_URL_PATH}/shorten"}
+        self.in_flight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, "Invalid Idempotency-Key header")
+            return
+
+        # Read the body once, so it can be fingerprinted and then handed to the application
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        async def replay_body() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        digest = _digest(headers.get(b"authorization", b""), idempotency_key)
+        fingerprint = _digest(scope["path"].encode(), scope["query_string"], body)
+
+        # Duplicates within this worker wait for the request already in progress
+        leader = self.in_flight.get(digest)
+        if leader is not None:
+            try:
+                leader_fingerprint, response = await asyncio.shield(leader)
+            except BaseException:
+                # Only swallow the failure of the first request, not the cancellation of this one
+                if not leader.done():
+                    raise
+                leader_fingerprint, response = fingerprint, None
+
+            if leader_fingerprint != fingerprint:
+                await _send_error(send, 422, "Idempotency-Key was used with different parameters")
+            elif response is None:
+                await _send_error(
+                    send, 409, "A request with this Idempotency-Key is in progress", retry_after=True
+                )
+            else:
+                await _send_response(send, response, replayed=True)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[digest] = future
+        try:
+            response = await self.handle(digest, fingerprint, scope, replay_body, send)
+            # Waiters replay the response only if it would have been recorded
+            future.set_result((fingerprint, response if _succeeded(response) else None))
+        finally:
+            # Waiters of a request that failed are told to retry
+            if not future.done():
+                future.cancel()
+            del self.in_flight[digest]
+
+    async def handle(
+        self, digest: str, fingerprint: str, scope: Scope, receive: Receive, send: Send
+    ) -> Optional[CapturedResponse]:
+        """
+        Answer a request from its Redis record, or run it and record its response.
+
+        Args:
+            digest (str): The digest of the caller's credentials and idempotency key.
+            fingerprint (str): The fingerprint of the request parameters.
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel, replaying the buffered body.
+            send (Send): The ASGI send channel.
+
+        Returns:
+            Optional[CapturedResponse]: The response sent, shared with concurrent duplicates.
+        """
+        name = cache.idempotency_key(digest)
+
+        # Without the cache, the request runs without idempotency rather than failing
+        reserved = False
+        if cache_breaker.allow():
+            try:
+                reserved = await cache.reserve_idempotency_key(
+                    name, ttl=settings.IDEMPOTENCY_LOCK_SECONDS
+                )
+                record = None if reserved else await cache.get_idempotency_record(name)
+                cache_breaker.record_success()
+            except Exception as e:
+                cache_breaker.record_failure()
+                logger.error(f"An error occurred while reserving an idempotency key: {e}")
+                record = None
+
+            if record == IDEMPOTENCY_PENDING:
+                await _send_error(
+                    send, 409, "A request with this Idempotency-Key is in progress", retry_after=True
+                )
+                return None
+            if record is not None:
+                stored_fingerprint, response = _decode(record)
+                if stored_fingerprint != fingerprint:
+                    await _send_error(
+                        send, 422, "Idempotency-Key was used with different parameters"
+                    )
+                    return None
+                await _send_response(send, response, replayed=True)
+                return response
+
+        # Run the request, passing the response through while capturing it
+        status = 500
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            response = (status, response_headers, b"".join(chunks))
+            if reserved:
+                await self.record(name, fingerprint, response)
+
+        return response
+
+    @staticmethod
+    async def record(name: str, fingerprint: str, response: CapturedResponse) -> None:
+        """
+        Store a successful response, or release the key so the request can be retried.
+
+        Args:
+            name (str): The Redis key of the record.
+            fingerprint (str): The fingerprint of the request parameters.
+            response (CapturedResponse): The response sent.
+        """
+        try:
+            if _succeeded(response):
+                await cache.store_idempotent_response(
+                    name, _encode(fingerprint, response), ttl=settings.IDEMPOTENCY_TTL_SECONDS
+                )
+            else:
+                await cache.release_idempotency_key(name)
+        except Exception as e:
+            logger.error(f"An error occurred while recording an idempotent response: {e}")
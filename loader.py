@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Signature of a batch function: it receives distinct keys and returns a result per found key
+BatchFunction = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+
+class BatchLoader:
+    """
+    Micro-batching loader in the style of a dataloader.
+
+    Keys requested within `window` seconds of each other (or until `max_batch` keys are queued)
+    are resolved together by a single call to the batch function. Every caller receives the
+    result for its own key, and concurrent requests for the same key share one lookup.
+    """
+
+    def __init__(self, batch_fn: BatchFunction, window: float, max_batch: int) -> None:
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches are referenced here so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: str) -> Any:
+        """
+        Load the result for a key, batching it with other keys requested at the same time.
+
+        Args:
+            key (str): The key to load.
+
+        Returns:
+            Any: The result for the key, or None if the batch function did not return one.
+        """
+        future = self._pending.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._dispatch)
+
+        # A cancelled caller must not cancel the lookup shared with other callers
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, asyncio.Future]) -> None:
+        try:
+            results = await self.batch_fn(list(batch))
+        except asyncio.CancelledError:
+            # Callers waiting on a cancelled batch are cancelled rather than left waiting forever
+            for future in batch.values():
+                future.cancel()
+            raise
+        except BaseException as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
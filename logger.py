@@ -1,11 +1,114 @@
+import atexit
 import logging
+import queue
+import random
 
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import orjson
 from uvicorn.config import LOGGING_CONFIG
 
+from settings import settings
+
+
+class JSONFormatter(logging.Formatter):
+    """Formatter that renders each record as a single JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        # Structured fields passed with extra={"fields": {...}}
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+
+        return orjson.dumps(payload, default=str).decode("utf-8")
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Filter that keeps only a fraction of high-volume records.
+
+    Records logged with extra={"sampled": True} are kept with probability `rate`;
+    all other records pass through.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    Queue handler for a queue consumed in the same process.
+
+    The record is enqueued untouched, so message formatting (including the argument-based
+    formatting of uvicorn's access logs) happens on the listener thread, not the event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_queued_logging(*loggers: logging.Logger) -> QueueListener:
+    """
+    Route the handlers of the given loggers through a queue drained by a background thread.
+
+    Handlers already attached to the loggers (such as uvicorn's console handler) are moved behind
+    the queue, next to a size-rotated JSON file handler.
+
+    Args:
+        *loggers (logging.Logger): The loggers to route through the queue.
+
+    Returns:
+        QueueListener: The started listener that runs the handlers.
+    """
+    # Create a file handler writing one JSON record per line
+    file_handler = RotatingFileHandler(
+        settings.LOG_FILE,
+        maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT,
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(JSONFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handlers = [file_handler]
+
+    for _logger in loggers:
+        handlers.extend(_logger.handlers)
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+
+        queue_handler = InProcessQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+        _logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    # Flush queued records when the process exits
+    atexit.register(listener.stop)
+
+    return listener
+
+
 # Get the default FastAPI logger (used by Uvicorn)
 logger = logging.getLogger("uvicorn")
-logger.setLevel(logging.INFO)
+logger.setLevel(settings.LOG_LEVEL)
 LOGGING_CONFIG["formatters"]["default"][
     "fmt"
 ] = "%(asctime)s %(levelprefix)s %(message)s"
@@ -14,12 +117,5 @@ LOGGING_CONFIG["formatters"]["access"][
     "fmt"
 ] = "%(asctime)s %(levelprefix)s %(message)s"
 
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-# Create a file handler
-file_handler = RotatingFileHandler("app.log", maxBytes=10000, backupCount=3)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-
-# Add file handler to logging handlers
-logger.addHandler(file_handler)
+# Application and access logs are written by a background thread
+listener = configure_queued_logging(logger, logging.getLogger("uvicorn.access"))
@@ -1,7 +1,12 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 
 from settings import settings
+from admission import AdmissionControl
+from fast_lane import RedirectFastLane
+from idempotency import IdempotentRequests
+from tracing import RequestTracing
 from routes.info import router as info_router
 from routes.auth import router as auth_router
 from routes.metrics import router as metrics_router
@@ -11,9 +16,21 @@ from routes.url_resolver import router as url_resolver_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from database import create_triggers, database as db, create_tables
+    from snapshot import snapshot
+    from storage import storage
+    from tasks import (
+        run_cache_invalidator,
+        run_expiry_sweeper,
+        run_geo_rollup_flusher,
+        run_link_purger,
+        run_snapshot_reloader,
+    )
     """
-    Manage the lifespan of the FastAPI application, including connecting to and disconnecting from the database.
+    Manage the lifespan of the FastAPI application, including connecting to and disconnecting from the storage
+    backend (the database and the cache, by default).
+
+    Schema changes are not applied here; they are applied once with `alembic upgrade head`, and each
+    worker only checks that the schema revision matches.
 
     Args:
         app (FastAPI): The FastAPI application instance.
@@ -21,21 +38,36 @@ async def lifespan(app: FastAPI):
     Yields:
         None
     """
-    # Connect to the database
-    await db.connect()
+    # Connect to the storage backend, checking the schema revision of the database
+    await storage.connect()
 
-    # Create tables in the database
-    await create_tables(database=db)
+    # Start the background sweeper that deletes expired links, the purger of deleted links,
+    # the invalidator of their cache entries and the flusher of buffered geo rollup counts
+    tasks = [
+        asyncio.create_task(run_expiry_sweeper()),
+        asyncio.create_task(run_link_purger()),
+        asyncio.create_task(run_cache_invalidator()),
+        asyncio.create_task(run_geo_rollup_flusher()),
+    ]
 
-    # Create triggers on tables in the database
-    await create_triggers(database=db)
+    # Map the resolver snapshot, if enabled, and keep it current
+    if snapshot.enabled:
+        tasks.append(asyncio.create_task(run_snapshot_reloader()))
 
     try:
         # Provide control back to the application
         yield
     finally:
-        # Disconnect from the database
-        await db.disconnect()
+        # Stop the background tasks
+        for task in tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        snapshot.close()
+
+        # Flush the geo rollup counts still buffered, then disconnect from the storage backend
+        await storage.flush_geo_rollup()
+        await storage.disconnect()
 
 
 # Initialize the FastAPI application with the specified title and lifespan manager
@@ -47,3 +79,16 @@ app.include_router(auth_router)  # Router for authentication-related endpoints
 app.include_router(metrics_router)  # Router for metrics
 app.include_router(url_shortener_router)  # Router for URL shortening endpoints
 app.include_router(url_resolver_router)  # Router for URL resolving endpoints
+
+# Answer cached redirects before routing, so the catch-all resolver route is only reached on a miss
+app.add_middleware(RedirectFastLane)
+
+# Answer retried link creations with an Idempotency-Key from their recorded response, kept in Redis
+if settings.STORAGE_BACKEND == "postgres":
+    app.add_middleware(IdempotentRequests)
+
+# Admit requests by priority class and shed them early under overload
+app.add_middleware(AdmissionControl)
+
+# Time the stages of every request, including its admission wait (outermost middleware)
+app.add_middleware(RequestTracing)
@@ -14,6 +14,17 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Build the connection URL from the application settings instead of alembic.ini
+from settings import settings
+
+config.set_main_option(
+    "sqlalchemy.url",
+    (
+        f"postgresql+psycopg2://{settings.PG_USERNAME}:{settings.PG_PASSWORD}"
+        f"@{settings.PG_HOST}:{settings.PG_PORT}/{settings.PG_DATABASE_NAME}"
+    ).replace("%", "%%"),
+)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
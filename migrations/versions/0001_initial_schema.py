@@ -0,0 +1,98 @@
+"""initial schema
+
+Creates the urls and metrics tables, the expiry indexes and the updated_at trigger.
+Every statement is idempotent, so databases created by earlier releases (which ran
+the DDL at application startup) can be stamped by simply upgrading.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Enable the pgcrypto extension to use gen_random_uuid() for UUID generation
+    op.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto")
+
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS urls (
+            key VARCHAR(7) PRIMARY KEY,
+            original_url TEXT NOT NULL,
+            owner_id VARCHAR(255) NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    op.execute(
+        """
+        ALTER TABLE urls
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS max_clicks INTEGER,
+            ADD COLUMN IF NOT EXISTS click_count INTEGER NOT NULL DEFAULT 0
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS metrics (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            key VARCHAR(7) NOT NULL REFERENCES urls(key) ON DELETE CASCADE,
+            owner_id VARCHAR(255) NOT NULL,
+            client_ip VARCHAR(45) NOT NULL,
+            response_time INTEGER NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    # Partial indexes so the expiry sweeper only visits links that can expire
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS urls_expires_at_idx ON urls (expires_at) WHERE expires_at IS NOT NULL"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS urls_max_clicks_idx ON urls (key) WHERE max_clicks IS NOT NULL"
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+    # Only edits to the link itself bump updated_at, not click counting on click-limited links
+    op.execute("DROP TRIGGER IF EXISTS update_urls_updated_at ON urls")
+    op.execute(
+        """
+        CREATE TRIGGER update_urls_updated_at
+        BEFORE UPDATE OF original_url, expires_at, max_clicks ON urls
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS update_urls_updated_at ON urls")
+    op.execute("DROP FUNCTION IF EXISTS update_updated_at_column()")
+    op.execute("DROP TABLE IF EXISTS metrics")
+    op.execute("DROP TABLE IF EXISTS urls")
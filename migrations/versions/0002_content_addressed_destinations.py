@@ -0,0 +1,84 @@
+"""content addressed destinations
+
+Adds the destinations table, keyed by a digest of the original URL, and lets urls
+reference a destination instead of storing the URL inline.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS destinations (
+            digest BYTEA PRIMARY KEY,
+            url TEXT NOT NULL
+        )
+        """
+    )
+    op.execute(
+        """
+        ALTER TABLE urls
+            ADD COLUMN IF NOT EXISTS destination_digest BYTEA REFERENCES destinations(digest),
+            ALTER COLUMN original_url DROP NOT NULL
+        """
+    )
+    # ADD CONSTRAINT has no IF NOT EXISTS, so the catalog is checked to keep reruns safe
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conname = 'urls_destination_check' AND conrelid = 'urls'::regclass
+            ) THEN
+                ALTER TABLE urls ADD CONSTRAINT urls_destination_check
+                    CHECK (original_url IS NOT NULL OR destination_digest IS NOT NULL);
+            END IF;
+        END
+        $$
+        """
+    )
+
+    # Serves the per-owner deduplication lookup and the orphaned destination sweep
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS urls_destination_idx ON urls (destination_digest, owner_id)
+        WHERE destination_digest IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    # Inline the URLs again before dropping the destinations table
+    op.execute(
+        """
+        UPDATE urls SET original_url = destinations.url
+        FROM destinations
+        WHERE urls.original_url IS NULL AND destinations.digest = urls.destination_digest
+        """
+    )
+    op.execute("DROP INDEX IF EXISTS urls_destination_idx")
+    op.execute("ALTER TABLE urls DROP CONSTRAINT IF EXISTS urls_destination_check")
+    op.execute(
+        """
+        ALTER TABLE urls
+            DROP COLUMN IF EXISTS destination_digest,
+            ALTER COLUMN original_url SET NOT NULL
+        """
+    )
+    op.execute("DROP TABLE IF EXISTS destinations")
@@ -0,0 +1,50 @@
+"""url tombstones
+
+Records deleted links, so the resolver snapshots built before a deletion can hide them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS url_tombstones (
+            key VARCHAR(7) PRIMARY KEY,
+            deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+    # Serves the delta export and the pruning done by full snapshot builds
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS url_tombstones_deleted_at_idx ON url_tombstones (deleted_at)
+        """
+    )
+
+    # Serves the export of links created since the last full snapshot
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS urls_created_at_idx ON urls (created_at)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS urls_created_at_idx")
+    op.execute("DROP TABLE IF EXISTS url_tombstones")
@@ -0,0 +1,31 @@
+"""metrics created_at brin index
+
+Indexes metrics by creation time, so the archival job can read and delete one day at a time.
+Clicks are appended in time order, which keeps a BRIN index tiny.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS metrics_created_at_brin ON metrics USING brin (created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS metrics_created_at_brin")
@@ -0,0 +1,62 @@
+"""link and owner stats
+
+Adds the tables written by the batch recompute of link and owner statistics.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS link_stats (
+            key VARCHAR(7) PRIMARY KEY,
+            owner_id VARCHAR(255) NOT NULL,
+            hits BIGINT NOT NULL,
+            unique_ips BIGINT NOT NULL,
+            avg_resolution_time DOUBLE PRECISION,
+            p50 DOUBLE PRECISION,
+            p90 DOUBLE PRECISION,
+            p99 DOUBLE PRECISION,
+            period_start DATE NOT NULL,
+            period_end DATE NOT NULL,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS owner_stats (
+            owner_id VARCHAR(255) PRIMARY KEY,
+            hits BIGINT NOT NULL,
+            unique_ips BIGINT NOT NULL,
+            avg_resolution_time DOUBLE PRECISION,
+            p50 DOUBLE PRECISION,
+            p90 DOUBLE PRECISION,
+            p99 DOUBLE PRECISION,
+            top_keys JSONB NOT NULL,
+            period_start DATE NOT NULL,
+            period_end DATE NOT NULL,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS owner_stats")
+    op.execute("DROP TABLE IF EXISTS link_stats")
@@ -0,0 +1,75 @@
+"""click geo
+
+Stores the location of each click in dictionary-encoded columns, and keeps a daily rollup of
+clicks per location for the geographic breakdowns.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Region and city names are interned once, and clicks refer to them by id
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geo_names (
+            id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+
+    # Countries are stored as their ISO 3166-1 numeric code
+    op.execute(
+        """
+        ALTER TABLE metrics
+            ADD COLUMN IF NOT EXISTS country SMALLINT,
+            ADD COLUMN IF NOT EXISTS region_id INTEGER,
+            ADD COLUMN IF NOT EXISTS city_id INTEGER
+        """
+    )
+
+    # Unknown locations are stored as 0, since primary key columns cannot be NULL
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geo_daily (
+            key VARCHAR(7) NOT NULL REFERENCES urls(key) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            country SMALLINT NOT NULL,
+            region_id INTEGER NOT NULL,
+            city_id INTEGER NOT NULL,
+            owner_id VARCHAR(255) NOT NULL,
+            hits BIGINT NOT NULL,
+            PRIMARY KEY (key, day, country, region_id, city_id)
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS geo_daily_owner_day_idx ON geo_daily (owner_id, day)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS geo_daily")
+    op.execute(
+        """
+        ALTER TABLE metrics
+            DROP COLUMN IF EXISTS country,
+            DROP COLUMN IF EXISTS region_id,
+            DROP COLUMN IF EXISTS city_id
+        """
+    )
+    op.execute("DROP TABLE IF EXISTS geo_names")
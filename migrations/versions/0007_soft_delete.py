@@ -0,0 +1,47 @@
+"""soft delete
+
+Links are deleted by marking them, and their clicks are purged in the background.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A deleted link stops resolving at once, and keeps its key until it is purged
+    op.execute("ALTER TABLE urls ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ")
+
+    # Partial index so the purger only visits deleted links
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS urls_deleted_at_idx ON urls (deleted_at)
+        WHERE deleted_at IS NOT NULL
+        """
+    )
+
+    # The purger deletes the clicks of one link in batches, which needs an index on the key.
+    # It is built without locking out click inserts on a large table.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS metrics_key_created_at_idx ON metrics (key, created_at)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS metrics_key_created_at_idx")
+    op.execute("DROP INDEX IF EXISTS urls_deleted_at_idx")
+    op.execute("ALTER TABLE urls DROP COLUMN IF EXISTS deleted_at")
@@ -0,0 +1,31 @@
+"""click sampling
+
+Clicks of sampled links store the number of clicks each recorded row stands for.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing clicks were all recorded; a constant default does not rewrite the table
+    op.execute(
+        "ALTER TABLE metrics ADD COLUMN IF NOT EXISTS sample_rate INTEGER NOT NULL DEFAULT 1"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE metrics DROP COLUMN IF EXISTS sample_rate")
@@ -0,0 +1,51 @@
+"""revive deleted links
+
+A deleted link can be shortened again before it is purged, so the purger deletes the clicks
+recorded before a given time rather than the whole link.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Clicks recorded before this time are purged; it stays set when the link is revived
+    op.execute("ALTER TABLE urls ADD COLUMN IF NOT EXISTS purge_before TIMESTAMPTZ")
+    op.execute(
+        "UPDATE urls SET purge_before = deleted_at WHERE deleted_at IS NOT NULL AND purge_before IS NULL"
+    )
+
+    # The purger now picks links by purge time, including revived ones
+    with op.get_context().autocommit_block():
+        op.execute(
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS urls_purge_before_idx ON urls (purge_before)
+            WHERE purge_before IS NOT NULL
+            """
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS urls_deleted_at_idx")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS urls_deleted_at_idx ON urls (deleted_at)
+            WHERE deleted_at IS NOT NULL
+            """
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS urls_purge_before_idx")
+    op.execute("ALTER TABLE urls DROP COLUMN IF EXISTS purge_before")
@@ -0,0 +1,449 @@
+"""
+Batch recompute of link and owner statistics from click data.
+
+Clicks are loaded one day at a time, from the Parquet archive when the day has been archived
+and from PostgreSQL (with COPY) otherwise, and folded into NumPy accumulators: hit counts and
+latency sums per key and owner, and sparse counts of (key, visitor) pairs and (key, latency
+bin) pairs that are merged with np.unique. Sampled clicks are weighted by their sample rate in
+the hit counts, latency sums and latency bins. Unique visitors and DDSketch percentiles are derived
+from the sparse counts at the end, and the results replace link_stats and owner_stats with COPY.
+
+    python recompute.py                                     # all history
+    python recompute.py --start 2026-01-01 --end 2026-06-30
+    python recompute.py --source postgres                   # ignore the archive
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from archive import partition_path
+from settings import settings
+from sketches import latency_sketch
+
+CLICK_COLUMNS = ["key", "owner_id", "client_ip", "response_time", "sample_rate"]
+CLICK_TYPES = {
+    "key": pa.string(),
+    "owner_id": pa.string(),
+    "client_ip": pa.string(),
+    "response_time": pa.int32(),
+    "sample_rate": pa.int32(),
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+TOP_K = 5
+
+# Latency bins per key: bin 0 counts sub-millisecond clicks and the last bin absorbs outliers
+LATENCY_BINS = 1024
+
+
+class _Interner:
+    """Assigns dense integer IDs to strings across chunks."""
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, column: pa.ChunkedArray) -> np.ndarray:
+        """
+        Map a column of strings to their IDs.
+
+        Only the distinct values of the chunk are looked up in Python; rows are mapped with a
+        NumPy gather.
+
+        Args:
+            column (pa.ChunkedArray): The string column.
+
+        Returns:
+            np.ndarray: The ID of each row.
+        """
+        encoded = column.combine_chunks().dictionary_encode()
+        dictionary = encoded.dictionary.to_pylist()
+
+        mapping = np.empty(len(dictionary), dtype=np.int64)
+        for position, value in enumerate(dictionary):
+            index = self.ids.get(value)
+            if index is None:
+                index = self.ids[value] = len(self.values)
+                self.values.append(value)
+            mapping[position] = index
+
+        return mapping[encoded.indices.to_numpy(zero_copy_only=False)]
+
+
+class _SparseCounts:
+    """
+    Counts of int64 codes, appended per chunk and periodically merged with np.unique.
+
+    Used both for distinct pairs (the counts are ignored) and for per-group histograms.
+    """
+
+    def __init__(self) -> None:
+        self.codes: List[np.ndarray] = []
+        self.counts: List[np.ndarray] = []
+        self.pending = 0
+        self.compacted = 0
+
+    def add(self, codes: np.ndarray, weights: Optional[np.ndarray] = None) -> None:
+        if weights is None:
+            codes, counts = np.unique(codes, return_counts=True)
+        else:
+            codes, inverse = np.unique(codes, return_inverse=True)
+            counts = np.bincount(inverse, weights=weights).astype(np.int64)
+        self.codes.append(codes)
+        self.counts.append(counts)
+        self.pending += len(codes)
+
+        # Merge once the appended chunks outgrow the merged state
+        if self.pending > max(5_000_000, 2 * self.compacted):
+            self.compact()
+
+    def compact(self) -> None:
+        if not self.codes:
+            self.codes, self.counts = [np.empty(0, np.int64)], [np.empty(0, np.int64)]
+            return
+
+        codes = np.concatenate(self.codes)
+        counts = np.concatenate(self.counts)
+        if len(self.codes) > 1:
+            order = np.argsort(codes, kind="stable")
+            codes, counts = codes[order], counts[order]
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            codes, counts = codes[starts], np.add.reduceat(counts, starts)
+
+        self.codes = [codes]
+        self.counts = [counts]
+        self.pending = self.compacted = len(codes)
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        self.compact()
+        return self.codes[0], self.counts[0]
+
+
+def _grow_add(total: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Add per-ID values to a running total, growing it as new IDs appear.
+
+    Args:
+        total (np.ndarray): The running total.
+        values (np.ndarray): The values of the chunk, at least as long as the total.
+
+    Returns:
+        np.ndarray: The updated total.
+    """
+    if len(values) > len(total):
+        total = np.concatenate([total, np.zeros(len(values) - len(total), total.dtype)])
+    total[: len(values)] += values
+    return total
+
+
+def _latency_bins(response_times: np.ndarray) -> np.ndarray:
+    """
+    Map latencies to the bins of the latency sketch, shifted by one to make room for bin 0.
+
+    Args:
+        response_times (np.ndarray): The latencies in milliseconds.
+
+    Returns:
+        np.ndarray: The bin of each latency.
+    """
+    bins = np.zeros(len(response_times), dtype=np.int64)
+    indexable = response_times >= latency_sketch.min_value
+    bins[indexable] = (
+        np.ceil(np.log(response_times[indexable]) / latency_sketch.log_gamma).astype(np.int64) + 1
+    )
+    return np.clip(bins, 0, LATENCY_BINS - 1)
+
+
+def _quantiles(codes: np.ndarray, counts: np.ndarray, groups: int) -> np.ndarray:
+    """
+    Compute latency quantiles per group from sparse (group, bin) counts.
+
+    Args:
+        codes (np.ndarray): The sorted group * LATENCY_BINS + bin codes.
+        counts (np.ndarray): The clicks counted in each code.
+        groups (int): The number of groups.
+
+    Returns:
+        np.ndarray: A (groups, len(QUANTILES)) array of latencies, NaN for groups without clicks.
+    """
+    result = np.full((groups, len(QUANTILES)), np.nan)
+    if not len(codes):
+        return result
+
+    group = codes // LATENCY_BINS
+    bins = codes % LATENCY_BINS
+    gamma = latency_sketch.gamma
+    values = np.where(bins > 0, 2 * gamma ** (bins - 1.0) / (gamma + 1), 0.0)
+
+    cumulative = np.cumsum(counts)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    totals = np.add.reduceat(counts, starts)
+    before = cumulative[starts] - counts[starts]
+
+    # The quantile is the first bin of the group whose cumulative count passes the rank
+    for column, quantile in enumerate(QUANTILES):
+        rank = before + quantile * (totals - 1)
+        result[group[starts], column] = values[np.searchsorted(cumulative, rank, side="right")]
+
+    return np.round(result, 2)
+
+
+class StatsAccumulator:
+    """Folds chunks of clicks into per-key and per-owner statistics."""
+
+    def __init__(self) -> None:
+        self.keys = _Interner()
+        self.owners = _Interner()
+        self.ips = _Interner()
+        self.key_owner = np.empty(0, np.int64)
+        self.key_hits = np.zeros(0, np.int64)
+        self.key_latency_sum = np.zeros(0, np.float64)
+        self.owner_hits = np.zeros(0, np.int64)
+        self.owner_latency_sum = np.zeros(0, np.float64)
+        self.key_visitors = _SparseCounts()
+        self.owner_visitors = _SparseCounts()
+        self.key_latency = _SparseCounts()
+        self.owner_latency = _SparseCounts()
+        self.clicks = 0
+
+    def add(self, clicks: pa.Table) -> None:
+        """
+        Fold a chunk of clicks into the statistics.
+
+        Args:
+            clicks (pa.Table): Clicks with the CLICK_COLUMNS columns.
+        """
+        if clicks.num_rows == 0:
+            return
+
+        # Each recorded click stands for sample_rate clicks
+        weights = clicks.column("sample_rate").to_numpy().astype(np.int64)
+        self.clicks += int(weights.sum())
+
+        key_ids = self.keys.encode(clicks.column("key"))
+        owner_ids = self.owners.encode(clicks.column("owner_id"))
+        response_times = clicks.column("response_time").to_numpy().astype(np.float64)
+
+        # Visitors are identified by the dense ID of their IP across all chunks, so distinct IPs
+        # are never merged; IDs stay below 2**32 and share the packed code with the key or owner
+        ip_ids = self.ips.encode(clicks.column("client_ip"))
+
+        if len(self.key_owner) < len(self.keys):
+            self.key_owner = np.concatenate(
+                [self.key_owner, np.full(len(self.keys) - len(self.key_owner), -1)]
+            )
+        self.key_owner[key_ids] = owner_ids
+
+        weighted_times = response_times * weights
+        self.key_hits = _grow_add(
+            self.key_hits,
+            np.bincount(key_ids, weights=weights, minlength=len(self.keys)).astype(np.int64),
+        )
+        self.key_latency_sum = _grow_add(
+            self.key_latency_sum,
+            np.bincount(key_ids, weights=weighted_times, minlength=len(self.keys)),
+        )
+        self.owner_hits = _grow_add(
+            self.owner_hits,
+            np.bincount(owner_ids, weights=weights, minlength=len(self.owners)).astype(np.int64),
+        )
+        self.owner_latency_sum = _grow_add(
+            self.owner_latency_sum,
+            np.bincount(owner_ids, weights=weighted_times, minlength=len(self.owners)),
+        )
+
+        bins = _latency_bins(response_times)
+        self.key_visitors.add((key_ids << 32) | ip_ids)
+        self.owner_visitors.add((owner_ids << 32) | ip_ids)
+        self.key_latency.add(key_ids * LATENCY_BINS + bins, weights)
+        self.owner_latency.add(owner_ids * LATENCY_BINS + bins, weights)
+
+    def link_rows(self, period: Tuple[date, date]) -> List[tuple]:
+        """
+        Build the rows of link_stats.
+
+        Args:
+            period (Tuple[date, date]): The first and last day covered.
+
+        Returns:
+            List[tuple]: One row per key, in LINK_STATS_COLUMNS order.
+        """
+        keys = len(self.keys)
+        visitors, _ = self.key_visitors.result()
+        unique_ips = np.bincount(visitors >> 32, minlength=keys)
+        quantiles = _quantiles(*self.key_latency.result(), keys)
+        averages = np.round(self.key_latency_sum / np.maximum(self.key_hits, 1), 2)
+
+        return [
+            (
+                self.keys.values[index],
+                self.owners.values[self.key_owner[index]],
+                int(self.key_hits[index]),
+                int(unique_ips[index]),
+                float(averages[index]),
+                *(float(value) for value in quantiles[index]),
+                *period,
+            )
+            for index in range(keys)
+        ]
+
+    def owner_rows(self, period: Tuple[date, date]) -> List[tuple]:
+        """
+        Build the rows of owner_stats, including each owner's top keys by hits.
+
+        Args:
+            period (Tuple[date, date]): The first and last day covered.
+
+        Returns:
+            List[tuple]: One row per owner, in OWNER_STATS_COLUMNS order.
+        """
+        owners = len(self.owners)
+        visitors, _ = self.owner_visitors.result()
+        unique_ips = np.bincount(visitors >> 32, minlength=owners)
+        quantiles = _quantiles(*self.owner_latency.result(), owners)
+        averages = np.round(self.owner_latency_sum / np.maximum(self.owner_hits, 1), 2)
+
+        # Sort keys by owner, then by descending hits, and keep the first TOP_K of each owner
+        order = np.lexsort((-self.key_hits, self.key_owner))
+        sorted_owners = self.key_owner[order]
+        starts = np.flatnonzero(np.r_[True, sorted_owners[1:] != sorted_owners[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+        top_keys: Dict[int, Dict[str, int]] = {}
+        for position in np.flatnonzero(rank < TOP_K):
+            key_id = order[position]
+            top_keys.setdefault(int(sorted_owners[position]), {})[
+                self.keys.values[key_id]
+            ] = int(self.key_hits[key_id])
+
+        return [
+            (
+                self.owners.values[index],
+                int(self.owner_hits[index]),
+                int(unique_ips[index]),
+                float(averages[index]),
+                *(float(value) for value in quantiles[index]),
+                orjson.dumps(top_keys.get(index, {})).decode("utf-8"),
+                *period,
+            )
+            for index in range(owners)
+        ]
+
+
+def _archived_days() -> List[date]:
+    if not os.path.isdir(settings.ARCHIVE_DIR):
+        return []
+    return sorted(
+        date.fromisoformat(name.removeprefix("day="))
+        for name in os.listdir(settings.ARCHIVE_DIR)
+        if name.startswith("day=")
+    )
+
+
+async def load_day(day: date, source: str) -> Optional[pa.Table]:
+    """
+    Load the clicks of one day, from the archive if it holds the day, otherwise from the database.
+
+    Args:
+        day (date): The day to load.
+        source (str): "auto", "archive" or "postgres".
+
+    Returns:
+        Optional[pa.Table]: The clicks, or None if the selected sources do not hold the day.
+    """
+    from dal import copy_metrics
+
+    path = partition_path(day)
+    if source != "postgres" and os.path.exists(path):
+        # Partitions archived before click sampling have no sample rate, and every click was kept
+        columns = pq.read_schema(path).names
+        clicks = pq.read_table(path, columns=[name for name in CLICK_COLUMNS if name in columns])
+        if "sample_rate" not in columns:
+            clicks = clicks.append_column(
+                "sample_rate", pa.array(np.ones(clicks.num_rows, np.int32))
+            )
+        return clicks
+    if source == "archive":
+        return None
+
+    start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    data = await copy_metrics(start, start + timedelta(days=1))
+    if not data:
+        return None
+    return pacsv.read_csv(
+        io.BytesIO(data),
+        read_options=pacsv.ReadOptions(column_names=CLICK_COLUMNS),
+        convert_options=pacsv.ConvertOptions(column_types=CLICK_TYPES),
+    )
+
+
+async def recompute(start: Optional[date], end: Optional[date], source: str) -> None:
+    """
+    Recompute link and owner statistics over a range of days and replace the stored ones.
+
+    Args:
+        start (Optional[date]): The first day. Defaults to the oldest archived or stored click.
+        end (Optional[date]): The last day. Defaults to today.
+        source (str): "auto", "archive" or "postgres".
+    """
+    from dal import oldest_metric_time, replace_stats
+    from database import pool
+
+    await pool.connect()
+    try:
+        if start is None:
+            candidates = [] if source == "postgres" else _archived_days()[:1]
+            oldest = None if source == "archive" else await oldest_metric_time()
+            if oldest is not None:
+                candidates.append(oldest.astimezone(timezone.utc).date())
+            if not candidates:
+                print("No clicks to recompute")
+                return
+            start = min(candidates)
+        end = end or datetime.now(timezone.utc).date()
+
+        accumulator = StatsAccumulator()
+        started = time.perf_counter()
+        day = start
+        while day <= end:
+            clicks = await load_day(day, source)
+            if clicks is not None:
+                accumulator.add(clicks)
+            day += timedelta(days=1)
+        loaded = time.perf_counter()
+
+        period = (start, end)
+        link_rows = accumulator.link_rows(period)
+        owner_rows = accumulator.owner_rows(period)
+        await replace_stats(link_rows, owner_rows)
+
+        print(
+            f"Recomputed {len(link_rows)} links and {len(owner_rows)} owners from "
+            f"{accumulator.clicks} clicks: loaded in {loaded - started:.1f} s, "
+            f"aggregated and written in {time.perf_counter() - loaded:.1f} s"
+        )
+    finally:
+        await pool.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute link and owner statistics.")
+    parser.add_argument("--start", type=date.fromisoformat, default=None)
+    parser.add_argument("--end", type=date.fromisoformat, default=None)
+    parser.add_argument("--source", choices=["auto", "archive", "postgres"], default="auto")
+    args = parser.parse_args()
+
+    asyncio.run(recompute(args.start, args.end, args.source))
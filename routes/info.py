@@ -1,8 +1,12 @@
 from fastapi import APIRouter
 
-from dal import count_hits
+from admission import admission
+from breaker import cache_breaker, db_breaker
+from cache_policy import cache_policy
+from sampling import click_sampler
 from schemas.info import Info
 from settings import settings
+from storage import storage
 
 # Initialize the API router with a base path and tag
 router = APIRouter(prefix="", tags=["info"])
@@ -10,7 +14,7 @@ router = APIRouter(prefix="", tags=["info"])
 # Testing route
 @router.get("/info/hits/{key}")
 async def get_hit_count(key: str):
-    count = await count_hits(key=key)
+    count = await storage.count_hits(key=key)
     return count
 
 
@@ -31,3 +35,22 @@ async def info() -> Info:
         items_per_page=settings.ITEMS_PER_PAGE,  # The number of items to be displayed per page
         database=settings.DATABASE,  # The database connection string or name
     )
+
+
+@router.get(f"{settings.BASE_URL_PATH}/info/health")
+async def health() -> dict:
+    """
+    Returns the state of the circuit breakers guarding the cache and the database, the
+    admission control measurements of each priority class, the cache hit ratio and click sampling.
+
+    Returns:
+        dict: The state and failure counters of each breaker, queue times and shed counts, the
+            cache lookup and admission counters, and the recorded and skipped clicks of this worker.
+    """
+    return {
+        "cache": cache_breaker.snapshot(),
+        "database": db_breaker.snapshot(),
+        "admission": admission.snapshot(),
+        "cache_policy": cache_policy.snapshot(),
+        "click_sampling": click_sampler.snapshot(),
+    }
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
@@ -6,7 +9,8 @@ from fastapi.security import (
 )
 
 from settings import settings
-from dal import count_top_five_hits, evaluate_performance
+from storage import storage
+from http_cache import conditional_json_response
 from utils import VerifyToken
 
 router = APIRouter(prefix=f"{settings.BASE_URL_PATH}/metrics", tags=["metrics"])
@@ -17,15 +21,89 @@ bearer_scheme = HTTPBearer()
 
 @router.get("/performance/{key}")
 async def get_performance_for_key(
-    key: str, credentials: HTTPAuthorizationCredentials = Depends(auth.verify)
+    request: Request,
+    key: str,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
+):
+    metrics_for_key = await storage.evaluate_performance(key=key, start=start, end=end)
+    return conditional_json_response(request, metrics_for_key)
+
+
+@router.get("/performance")
+async def get_performance(
+    request: Request,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
 ):
-    metrics_for_key = await evaluate_performance(key=key)
-    return metrics_for_key
+    performance = await storage.evaluate_owner_performance(
+        owner_id=credentials["sub"], start=start, end=end
+    )
+    return conditional_json_response(request, performance)
 
 
 @router.get("/top")
 async def get_top_urls(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
+):
+    top_five_hits = await storage.count_top_five_hits(owner_id=credentials["sub"])
+    return conditional_json_response(request, top_five_hits)
+
+
+@router.get("/visitors/{key}")
+async def get_unique_visitors_for_key(
+    request: Request,
+    key: str,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
+):
+    unique_ips = await storage.count_unique_ips(key=key, start=start, end=end)
+    return conditional_json_response(request, {"unique_ips": unique_ips})
+
+
+@router.get("/visitors")
+async def get_unique_visitors(
+    request: Request,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
+):
+    unique_ips = await storage.count_unique_ips_by_owner(
+        owner_id=credentials["sub"], start=start, end=end
+    )
+    return conditional_json_response(request, {"unique_ips": unique_ips})
+
+
+@router.get("/geo/{key}")
+async def get_geo_breakdown_for_key(
+    request: Request,
+    key: str,
+    level: Literal["country", "region", "city"] = Query("country"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    limit: int = Query(50, gt=0, le=1000),
+    credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
+):
+    breakdown = await storage.geo_breakdown(
+        "key", key, level=level, start=start, end=end, limit=limit
+    )
+    return conditional_json_response(request, {"level": level, "locations": breakdown})
+
+
+@router.get("/geo")
+async def get_geo_breakdown(
+    request: Request,
+    level: Literal["country", "region", "city"] = Query("country"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    limit: int = Query(50, gt=0, le=1000),
     credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
 ):
-    top_five_hits = await count_top_five_hits(owner_id=credentials["sub"])
-    return top_five_hits
+    breakdown = await storage.geo_breakdown(
+        "owner", credentials["sub"], level=level, start=start, end=end, limit=limit
+    )
+    return conditional_json_response(request, {"level": level, "locations": breakdown})
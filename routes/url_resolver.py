@@ -1,55 +1,64 @@
+import asyncio
 import requests
 import time
+from typing import Mapping, Optional, Tuple
 
 from fastapi import APIRouter, Request, Response
-from fastapi.responses import RedirectResponse
 
-from dal import set_metrics
+from http_cache import FastRedirectResponse
 from utils import URLShortener
 from logger import logger
+from storage import storage
+from tracing import span
 
 # Initialize the API router
 router = APIRouter()
 
 
-@router.get("/{key}", include_in_schema=False)
-async def resolve_url(request: Request, key: str) -> RedirectResponse:
+def get_client_ip(
+    headers: Mapping[str, str], client: Optional[Tuple[str, int]]
+) -> Optional[str]:
     """
-    Resolve the shortened URL to its original URL and redirect to it.
+    Determine the client IP address of a request.
 
     Args:
-        request (Request): The FastAPI request object to retrieve client IP address.
-        key (str): The unique key associated with the shortened URL.
+        headers (Mapping[str, str]): The request headers, with lower-case names.
+        client (Optional[Tuple[str, int]]): The peer address of the connection.
 
     Returns:
-        RedirectResponse: A response that redirects the client to the original URL.
+        Optional[str]: The client IP address, if known.
     """
-    # Measure the start time
-    start_time = time.time()
-    
-    try:
-        # Retrieve the original URL associated with the provided key
-        original_url = await URLShortener.retrieve_original_url(key=key)
-        if not original_url:
-            return Response("URL not found", status_code=404)
-    except Exception as e:
-        logger.error(e)
-
     # Get the client IP address
-    client_ip = request.client.host
+    client_ip = client[0] if client else None
 
     # Check for X-Forwarded-For header for proxies
-    x_forwarded_for = request.headers.get("x-forwarded-for")
+    x_forwarded_for = headers.get("x-forwarded-for")
     if x_forwarded_for:
         client_ip = x_forwarded_for.split(",")[0].strip()
 
-    # Query ipinfo.io to get geolocation data
+    return client_ip
+
+
+async def record_click(key: str, client_ip: Optional[str], start_time: float) -> None:
+    """
+    Record the metrics of a resolved click, including geolocation of the client.
+
+    Args:
+        key (str): The unique key associated with the shortened URL.
+        client_ip (Optional[str]): The client IP address.
+        start_time (float): The time at which the request started, from time.time().
+    """
+    # Calculate the response time, before the geolocation lookup so it only covers resolution
+    response_time = int((time.time() - start_time) * 1000)  # Time in milliseconds
+
+    # Query ipinfo.io to get geolocation data, in a thread so the event loop keeps serving requests
     # For testing purposes set client_ip to a public address
     client_ip = "8.8.8.8"
     ipinfo_url = f"https://ipinfo.io/{client_ip}/json"
     try:
-        response = requests.get(ipinfo_url)
-        ip_info = response.json()
+        with span("geo"):
+            response = await asyncio.to_thread(requests.get, ipinfo_url)
+            ip_info = response.json()
         country = ip_info.get("country", "Unknown")
         region = ip_info.get("region", "Unknown")
         city = ip_info.get("city", "Unknown")
@@ -58,9 +67,6 @@ async def resolve_url(request: Request, key: str) -> RedirectResponse:
         region = "Unknown"
         city = "Unknown"
 
-    # Calculate the response time
-    response_time = int((time.time() - start_time) * 1000)  # Time in milliseconds
-
     # Store metrics in a dictionary
     metrics = {
         "client_ip": client_ip,
@@ -72,10 +78,43 @@ async def resolve_url(request: Request, key: str) -> RedirectResponse:
 
     try:
         # Store metrics in a database
-        await set_metrics(key=key, **metrics)
-        logger.info("Saved metrics to database")
+        await storage.set_metrics(key=key, **metrics)
+        logger.debug("Saved metrics to database", extra={"sampled": True})
     except Exception as e:
         logger.error(e)
 
-    # Redirect the client to the original URL
-    return RedirectResponse(url=original_url)
+
+@router.get("/{key}", include_in_schema=False)
+async def resolve_url(request: Request, key: str) -> Response:
+    """
+    Resolve the shortened URL to its original URL and redirect to it.
+
+    Cache hits are normally answered by the RedirectFastLane middleware before reaching this route.
+
+    Args:
+        request (Request): The FastAPI request object to retrieve client IP address.
+        key (str): The unique key associated with the shortened URL.
+
+    Returns:
+        Response: A response that redirects the client to the original URL.
+    """
+    # Measure the start time
+    start_time = time.time()
+
+    try:
+        # Retrieve the original URL associated with the provided key
+        original_url = await URLShortener.retrieve_original_url(key=key)
+        if not original_url:
+            return Response("URL not found", status_code=404)
+    except Exception as e:
+        logger.error(e)
+
+    # Record the click
+    await record_click(
+        key=key,
+        client_ip=get_client_ip(request.headers, request.client),
+        start_time=start_time,
+    )
+
+    # Redirect the client to the original URL using the configured caching policy
+    return FastRedirectResponse(url=original_url)
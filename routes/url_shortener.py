@@ -1,6 +1,7 @@
-from typing import Dict, List, Union
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
@@ -14,9 +15,10 @@ from schemas.url import (
     APIReadOriginalURLResponse,
     APIReadResponse,
 )
+from http_cache import conditional_json_response
 from settings import settings
 from utils import VerifyToken, URLShortener
-from dal import fetch_multiple_urls, fetch_original_url, remove_record
+from storage import storage
 
 # Initialize the API router for URL shortening endpoints
 router = APIRouter(prefix=f"{settings.BASE_URL_PATH}/shorten", tags=["url shortener"])
@@ -28,6 +30,8 @@ bearer_scheme = HTTPBearer()
 @router.post("/")
 async def shorten_url(
     url: HttpUrl = Query(),
+    expires_at: Optional[datetime] = Query(None),
+    max_clicks: Optional[int] = Query(None, gt=0),
     credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
 ) -> APICreateResponse:
     """
@@ -35,28 +39,54 @@ async def shorten_url(
 
     Args:
         original_url (HttpUrl): The URL to be shortened.
+        expires_at (Optional[datetime]): The time after which the shortened URL stops resolving.
+        max_clicks (Optional[int]): The number of resolves after which the shortened URL stops resolving.
         credentials (HTTPAuthorizationCredentials): The credentials of the authenticated user.
 
     Returns:
         APICreateResponse: A response containing the shortened URL, the original URL, and a flag indicating if the URL was newly created.
     """
-    # Initialize URLShortener with the provided URL and the authenticated user's ID
-    shortener = URLShortener(original_url=url, owner_id=credentials["sub"])
+    # Times without an offset are taken as UTC, and must lie in the future
+    if expires_at is not None:
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= datetime.now(timezone.utc):
+            raise HTTPException(
+                status_code=422, detail="expires_at must be in the future"
+            )
+
+    # Initialize URLShortener with the provided URL, the authenticated user's ID and the expiry policy
+    shortener = URLShortener(
+        original_url=url,
+        owner_id=credentials["sub"],
+        expires_at=expires_at,
+        max_clicks=max_clicks,
+    )
 
     # Generate a unique key and store the URL in the database
-    key, created = await shortener.shorten_url()
+    result = await shortener.shorten_url()
+    if result is None:
+        raise HTTPException(
+            status_code=409, detail="The key of this URL is taken by another link"
+        )
+    key, created, expires_at, max_clicks = result
 
     # Construct the full shortened URL
     shortened_url = f"{str(settings.SHORTENED_URL_BASE)}{key}"
 
-    # Return the response with the shortened URL details
+    # Return the response with the shortened URL details, echoing the stored expiry policy
     return APICreateResponse(
-        shortened_url=shortened_url, original_url=url, created=created
+        shortened_url=shortened_url,
+        original_url=url,
+        created=created,
+        expires_at=expires_at,
+        max_clicks=max_clicks,
     )
 
 
 @router.get("/")
 async def list_shortened_urls(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
     limit: int = Query(10, gt=0),
     offset: int = Query(0, ge=0),
@@ -64,7 +94,10 @@ async def list_shortened_urls(
     """
     List all shortened URLs for the authenticated user with pagination support.
 
+    The response carries an ETag, so repeated requests for an unchanged page are answered with 304 Not Modified.
+
     Args:
+        request (Request): The incoming request carrying conditional headers.
         credentials (HTTPAuthorizationCredentials): The credentials of the authenticated user.
         limit (int): The number of results to return per page (default is 10).
         offset (int): The starting point for pagination (default is 0).
@@ -74,20 +107,16 @@ async def list_shortened_urls(
         responses with shortened URLs.
     """
     try:
-        total_count, urls = await fetch_multiple_urls(
+        total_count, urls = await storage.fetch_multiple_urls(
             owner_id=credentials["sub"], limit=limit, offset=offset
         )
-        # Convert URL instances to strings if necessary
-        response_data = {
-            "total": total_count,
-            "urls": [
-                url.model_dump() for url in urls
-            ],  # Ensure URLs are serialized to dicts
-        }
-        return response_data
+        # URLs are already shaped as dictionaries and are serialized with orjson
+        response_data = {"total": total_count, "urls": urls}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return conditional_json_response(request, response_data)
+
 
 @router.delete("/{key}")
 async def delete_shortened_url(
@@ -105,16 +134,37 @@ async def delete_shortened_url(
         APIDeleteResponse: A response indicating the result of the deletion operation.
     """
     # Remove the record associated with the key for the authenticated user
-    await remove_record(key=key, owner_id=credentials["sub"])
+    await storage.remove_record(key=key, owner_id=credentials["sub"])
 
     # Return a response indicating successful deletion
     return APIDeleteResponse()
 
 
-@router.get("/{key}")
+@router.get("/{key}", response_model=APIReadOriginalURLResponse)
 async def get_original_url(
+    request: Request,
     key: str,
     credentials: HTTPAuthorizationCredentials = Depends(auth.verify),
-) -> APIReadOriginalURLResponse:
-    original_url = await fetch_original_url(key=key)
-    return APIReadOriginalURLResponse(original_url=original_url)
+) -> Response:
+    """
+    Retrieve the original URL for a shortened URL key.
+
+    Links are immutable, so the creation time is used as Last-Modified alongside the ETag.
+
+    Args:
+        request (Request): The incoming request carrying conditional headers.
+        key (str): The unique key associated with the shortened URL.
+        credentials (HTTPAuthorizationCredentials): The credentials of the authenticated user.
+
+    Returns:
+        Response: The original URL, or 304 Not Modified if the client copy is current.
+    """
+    link = await storage.fetch_link(key=key)
+    if not link:
+        raise HTTPException(status_code=404, detail="URL not found")
+
+    return conditional_json_response(
+        request,
+        {"original_url": link["original_url"]},
+        last_modified=link["created_at"],
+    )
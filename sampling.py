@@ -0,0 +1,112 @@
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict
+
+from settings import settings
+
+
+class ClickSampler:
+    """
+    Sampling policy deciding which clicks are written to the database.
+
+    A sampled link has only one click in N recorded, and the recorded click stores N as its
+    sample rate so counts can be scaled back up. The rate of a link is the larger of its
+    configured rate and an automatic one: once a link is clicked more than `threshold` times per
+    second, N grows with its hit rate so that about `threshold` clicks per second are recorded,
+    up to `max_rate`. Hit rates are measured per worker over fixed windows of `window` seconds,
+    and only the links clicked in the last two windows are tracked.
+
+    Each click is recorded with probability 1/N, independently of the others, so the recorded
+    clicks scaled by N are an unbiased estimate of the count whatever the window boundaries.
+
+    Args:
+        rates (Dict[str, int]): Fixed 1-in-N sample rates by shortened URL key.
+        threshold (float): The clicks per second above which a link is sampled; 0 disables automatic sampling.
+        max_rate (int): The largest automatic sample rate.
+        window (float): The length in seconds of the windows hit rates are measured over.
+    """
+
+    def __init__(
+        self, rates: Dict[str, int], threshold: float, max_rate: int, window: float
+    ) -> None:
+        self.rates = rates
+        self.threshold = threshold
+        self.max_rate = max_rate
+        self.window = window
+        self.window_end = time.monotonic() + window
+        self.current: Counter = Counter()
+        self.previous: Counter = Counter()
+        # Counters exposed for monitoring
+        self.recorded = 0
+        self.skipped = 0
+
+    def _roll(self) -> None:
+        now = time.monotonic()
+        if now < self.window_end:
+            return
+
+        # After an idle gap longer than a window, the previous counts are stale
+        self.previous = self.current if now < self.window_end + self.window else Counter()
+        self.current = Counter()
+        self.window_end = now + self.window
+
+    def rate(self, key: str) -> int:
+        """
+        Compute the sample rate of a link.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            int: N, where one click in N is recorded; 1 records every click.
+        """
+        rate = self.rates.get(key, 1)
+        if self.threshold:
+            hit_rate = self.previous[key] / self.window
+            if hit_rate > self.threshold:
+                rate = max(rate, min(math.ceil(hit_rate / self.threshold), self.max_rate))
+        return rate
+
+    def sample(self, key: str) -> int:
+        """
+        Count a click of a link and decide whether it is recorded.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            int: The number of clicks the recorded click stands for, or 0 if it is not recorded.
+        """
+        self._roll()
+        self.current[key] += 1
+
+        rate = self.rate(key)
+        if rate > 1 and random.random() >= 1 / rate:
+            self.skipped += 1
+            return 0
+        self.recorded += 1
+        return rate
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Describe the sampling of this worker for monitoring.
+
+        Returns:
+            Dict[str, object]: The recorded and skipped click counters and the number of sampled links.
+        """
+        return {
+            "recorded": self.recorded,
+            "skipped": self.skipped,
+            "sampled_links": sum(1 for key in self.previous if self.rate(key) > 1),
+        }
+
+
+# Sampling policy of the clicks recorded by this worker
+click_sampler = ClickSampler(
+    rates=settings.CLICK_SAMPLE_RATES,
+    threshold=settings.CLICK_SAMPLING_THRESHOLD,
+    max_rate=settings.CLICK_SAMPLING_MAX_RATE,
+    window=settings.CLICK_SAMPLING_WINDOW_SECONDS,
+)
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, HttpUrl
 
 
@@ -34,11 +37,15 @@ class APICreateResponse(BaseModel):
         shortened_url (HttpUrl): The newly created shortened URL.
         original_url (HttpUrl): The original URL that was shortened.
         created (bool): Indicates whether the URL was newly created or already existed.
+        expires_at (Optional[datetime]): The time after which the shortened URL stops resolving, if any.
+        max_clicks (Optional[int]): The number of resolves after which the shortened URL stops resolving, if any.
     """
 
     shortened_url: HttpUrl  # The newly created shortened URL.
     original_url: HttpUrl  # The original URL that was shortened.
     created: bool  # Indicates whether the URL was newly created or already existed.
+    expires_at: Optional[datetime] = None  # The expiry time requested for the shortened URL.
+    max_clicks: Optional[int] = None  # The click limit requested for the shortened URL.
 
 
 class APIDeleteResponse(BaseModel):
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Dict, Literal
 from pydantic import HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -18,16 +19,76 @@ class Settings(BaseSettings):
         ADMIN_EMAIL (str): The admin email address.
         ITEMS_PER_PAGE (int): The number of items per page for pagination. Default is 10.
         DATABASE (str): The database connection string.
+        STORAGE_BACKEND (str): Where links and clicks are stored: "postgres" (with the Redis cache), "memory" or "sqlite". Default is postgres.
+        SQLITE_PATH (str): The database file of the "sqlite" backend. Default is shortener.db.
         PG_USERNAME (str): The PostgreSQL username.
         PG_PASSWORD (str): The PostgreSQL password.
         PG_DATABASE_NAME (str): The name of the PostgreSQL database.
         PG_HOST (str): The host of the PostgreSQL database.
+        PG_PORT (int): The port of the PostgreSQL database. Default is 5432.
+        PG_POOL_MIN_SIZE (int): The minimum number of pooled database connections. Default is 2.
+        PG_POOL_MAX_SIZE (int): The maximum number of pooled database connections. Default is 10.
+        PG_STATEMENT_CACHE_SIZE (int): The number of prepared statements cached per connection. Default is 100.
+        PG_COMMAND_TIMEOUT (float): The timeout of hot-path statements in seconds. Default is 5.
         AUTH0_DOMAIN (str): The Auth0 domain.
         AUTH0_CLIENT_ID (str): The Auth0 client ID.
         AUTH0_CLIENT_SECRET (str): The Auth0 client secret.
         AUTH0_ALGORITHMS (str): The algorithms used by Auth0.
         AUTH0_API_AUDIENCE (str): The audience for the Auth0 API.
         AUTH0_ISSUER (str): The issuer for the Auth0 tokens.
+        URL_STORAGE_LAYOUT (str): How new links store their URL: "inline" in urls, or "content_addressed" in a shared destinations table. Default is inline.
+        CACHE_MODE (str): The Redis deployment: "standalone", "sentinel" or "cluster". Default is standalone.
+        CACHE_NODES (str): Comma-separated host:port list of cluster startup nodes or sentinels. Defaults to CACHE_HOST:CACHE_PORT.
+        CACHE_SENTINEL_SERVICE (str): The name of the master monitored by the sentinels. Default is mymaster.
+        CACHE_STORAGE_MODE (str): The key->URL layout: "string" (one Redis key per link) or "hash" (small bucketed hashes). Default is string.
+        CACHE_HASH_BUCKETS (int): The number of hash buckets in "hash" mode; aim for about 100 links per bucket. Default is 1048576.
+        CACHE_COMPRESS_MIN_LENGTH (int): URLs at least this many bytes long are zlib-compressed in the cache; 0 disables. Default is 0.
+        CACHE_ADMISSION_MIN_FREQUENCY (int): The number of recent lookups after which a missed link is written to the cache; 1 caches every miss. Default is 2.
+        CACHE_SKETCH_WIDTH (int): The number of counters per row of the lookup frequency sketch. Default is 65536.
+        CACHE_TTL_MIN_SECONDS (int): The cache TTL of a link at the admission threshold, doubled per further lookup. Default is 300.
+        CACHE_TTL_MAX_SECONDS (int): The longest cache TTL of a link. Default is 86400.
+        REDIRECT_STATUS_CODE (int): The status code used for redirects. 301/308 are cacheable, 302/307 are not. Default is 307.
+        REDIRECT_MAX_AGE (int): The max-age in seconds sent with cacheable (301/308) redirects. Default is 3600.
+        API_CACHE_CONTROL (str): The Cache-Control header sent with conditional read responses.
+        UNIQUE_VISITORS_EXACT_THRESHOLD (int): Below this estimate, unique visitors are counted exactly from the database. Default is 100.
+        UNIQUE_VISITORS_RETENTION_DAYS (int): The number of days per-day visitor sketches are kept. Default is 400.
+        LATENCY_SKETCH_ACCURACY (float): The relative accuracy of the resolution time percentiles. Default is 0.01.
+        LATENCY_SKETCH_RETENTION_DAYS (int): The number of days per-day latency sketches are kept. Default is 400.
+        EXPIRY_SWEEP_INTERVAL_SECONDS (int): The pause between expiry sweeps in seconds. Default is 60.
+        EXPIRY_SWEEP_BATCH_SIZE (int): The maximum number of expired links deleted per statement. Default is 500.
+        PURGE_BATCH_SIZE (int): The maximum number of clicks of a deleted link purged per step. Default is 5000.
+        PURGE_BATCH_PAUSE_SECONDS (float): The pause between purge steps, throttling the load on the database. Default is 0.1.
+        PURGE_INTERVAL_SECONDS (int): The pause once no deleted link is left to purge, in seconds. Default is 30.
+        CACHE_INVALIDATION_DELAY_SECONDS (float): How long after a link is removed its cache entry is deleted again, covering write-backs already in flight. Default is 5.
+        CACHE_INVALIDATION_INTERVAL_SECONDS (float): How often pending cache deletes are attempted. Default is 1.
+        GEO_ROLLUP_FLUSH_SECONDS (float): How often each worker adds its buffered click counts to the daily geo rollup. Default is 1.
+        CLICK_SAMPLE_RATES (Dict[str, int]): Fixed 1-in-N sample rates of the clicks recorded, by shortened URL key.
+        CLICK_SAMPLING_THRESHOLD (float): The clicks per second per worker above which a link's clicks are sampled. 0 (default) disables automatic sampling.
+        CLICK_SAMPLING_MAX_RATE (int): The largest automatic 1-in-N sample rate. Default is 1000.
+        CLICK_SAMPLING_WINDOW_SECONDS (float): The window over which hit rates are measured. Default is 10.
+        LOADER_WINDOW_MS (float): How long cache misses are collected before one batched database lookup. Default is 2.
+        LOADER_MAX_BATCH (int): The number of collected misses that triggers a batched lookup immediately. Default is 100.
+        BREAKER_FAILURE_THRESHOLD (int): Consecutive failures after which a dependency is skipped. Default is 5.
+        BREAKER_RESET_SECONDS (float): How long a failing dependency is skipped before it is probed again. Default is 30.
+        STALE_CACHE_SIZE (int): The number of recently resolved links kept in process to serve during outages. Default is 10000.
+        SNAPSHOT_DIR (str): The directory of the key to URL snapshot files. Empty (default) disables snapshots.
+        SNAPSHOT_RELOAD_SECONDS (float): How often workers check for rebuilt snapshot files. Default is 30.
+        ADMISSION_CAPACITY (int): The maximum number of requests processed at once. Default is 256.
+        ADMISSION_LIMITS (Dict[str, int]): The maximum concurrent requests per priority class (redirect, analytics, bulk).
+        ADMISSION_DEADLINES_MS (Dict[str, float]): How long a request of each class may queue before it is shed with 503.
+        IDEMPOTENCY_TTL_SECONDS (int): How long responses to requests with an Idempotency-Key are kept for retries. Default is 86400.
+        IDEMPOTENCY_LOCK_SECONDS (int): How long an Idempotency-Key stays reserved while its request runs. Default is 30.
+        ARCHIVE_DIR (str): The directory of the Parquet click archive. Default is "archive".
+        ARCHIVE_AFTER_DAYS (int): Clicks older than this many days are archived. Default is 30.
+        ARCHIVE_BATCH_SIZE (int): The number of clicks streamed, written or deleted per batch. Default is 100000.
+        LOG_LEVEL (str): The application log level. Default is INFO.
+        LOG_FILE (str): The path of the JSON log file. Default is app.log.
+        LOG_MAX_BYTES (int): The size at which the log file is rotated. Default is 10 MiB.
+        LOG_BACKUP_COUNT (int): The number of rotated log files kept. Default is 5.
+        LOG_SAMPLE_RATE (float): The fraction of high-volume debug records (e.g. cache hit/miss) kept. Default is 0.01.
+        SERVER_TIMING_ENABLED (bool): Whether responses carry a Server-Timing header with their stage timings. Default is False.
+        SLOW_REQUEST_THRESHOLD_MS (float): Requests slower than this are logged with their stage timings. Default is 500.
+        PROFILE_SAMPLE_RATE (float): The fraction of requests run under cProfile, whose profile is logged if they are slow. Default is 0.0.
     """
 
     model_config = SettingsConfigDict(env_file=(".env", ".local.env", ".env.prod"))
@@ -45,12 +106,21 @@ class Settings(BaseSettings):
     ITEMS_PER_PAGE: int = 10
     DATABASE: str
 
+    # Storage backend
+    STORAGE_BACKEND: Literal["postgres", "memory", "sqlite"] = "postgres"
+    SQLITE_PATH: str = "shortener.db"
+
     # Database information
     PG_USERNAME: str
     PG_PASSWORD: str
     PG_DATABASE_NAME: str
     PG_HOST: str
     PG_PORT: int = 5432
+    PG_POOL_MIN_SIZE: int = 2
+    PG_POOL_MAX_SIZE: int = 10
+    PG_STATEMENT_CACHE_SIZE: int = 100
+    PG_COMMAND_TIMEOUT: float = 5.0
+    URL_STORAGE_LAYOUT: Literal["inline", "content_addressed"] = "inline"
 
     # Cache information
     CACHE_HOST: str
@@ -58,6 +128,16 @@ class Settings(BaseSettings):
     CACHE_USERNAME: str
     CACHE_PASSWORD: str
     CACHE_DB: str
+    CACHE_MODE: Literal["standalone", "sentinel", "cluster"] = "standalone"
+    CACHE_NODES: str = ""
+    CACHE_SENTINEL_SERVICE: str = "mymaster"
+    CACHE_STORAGE_MODE: Literal["string", "hash"] = "string"
+    CACHE_HASH_BUCKETS: int = 1 << 20
+    CACHE_COMPRESS_MIN_LENGTH: int = 0
+    CACHE_ADMISSION_MIN_FREQUENCY: int = 2
+    CACHE_SKETCH_WIDTH: int = 1 << 16
+    CACHE_TTL_MIN_SECONDS: int = 300
+    CACHE_TTL_MAX_SECONDS: int = 86400
 
     # Auth0 details
     AUTH0_DOMAIN: str
@@ -67,6 +147,76 @@ class Settings(BaseSettings):
     AUTH0_API_AUDIENCE: str
     AUTH0_ISSUER: str
 
+    # HTTP caching policy
+    REDIRECT_STATUS_CODE: Literal[301, 302, 307, 308] = 307
+    REDIRECT_MAX_AGE: int = 3600
+    API_CACHE_CONTROL: str = "private, no-cache"
+
+    # Unique visitor counting
+    UNIQUE_VISITORS_EXACT_THRESHOLD: int = 100
+    UNIQUE_VISITORS_RETENTION_DAYS: int = 400
+    LATENCY_SKETCH_ACCURACY: float = 0.01
+    LATENCY_SKETCH_RETENTION_DAYS: int = 400
+
+    # Link expiry
+    EXPIRY_SWEEP_INTERVAL_SECONDS: int = 60
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500
+
+    # Purging of deleted links
+    PURGE_BATCH_SIZE: int = 5000
+    PURGE_BATCH_PAUSE_SECONDS: float = 0.1
+    PURGE_INTERVAL_SECONDS: int = 30
+    CACHE_INVALIDATION_DELAY_SECONDS: float = 5.0
+    CACHE_INVALIDATION_INTERVAL_SECONDS: float = 1.0
+
+    # Daily geo rollup
+    GEO_ROLLUP_FLUSH_SECONDS: float = 1.0
+
+    # Click sampling
+    CLICK_SAMPLE_RATES: Dict[str, int] = {}
+    CLICK_SAMPLING_THRESHOLD: float = 0.0
+    CLICK_SAMPLING_MAX_RATE: int = 1000
+    CLICK_SAMPLING_WINDOW_SECONDS: float = 10.0
+
+    # Batched cache-miss lookups
+    LOADER_WINDOW_MS: float = 2.0
+    LOADER_MAX_BATCH: int = 100
+
+    # Dependency failure handling
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    STALE_CACHE_SIZE: int = 10_000
+    SNAPSHOT_DIR: str = ""
+    SNAPSHOT_RELOAD_SECONDS: float = 30.0
+
+    # Admission control and load shedding
+    ADMISSION_CAPACITY: int = 256
+    ADMISSION_LIMITS: Dict[str, int] = {"redirect": 256, "analytics": 16, "bulk": 64}
+    ADMISSION_DEADLINES_MS: Dict[str, float] = {
+        "redirect": 250.0,
+        "analytics": 1000.0,
+        "bulk": 2000.0,
+    }
+
+    # Idempotent link creation
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_LOCK_SECONDS: int = 30
+
+    # Click archive
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_DAYS: int = 30
+    ARCHIVE_BATCH_SIZE: int = 100_000
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FILE: str = "app.log"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_SAMPLE_RATE: float = 0.01
+    SERVER_TIMING_ENABLED: bool = False
+    SLOW_REQUEST_THRESHOLD_MS: float = 500.0
+    PROFILE_SAMPLE_RATE: float = 0.0
+
 
 @lru_cache()
 def get_settings() -> Settings:
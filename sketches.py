@@ -0,0 +1,138 @@
+import math
+from typing import Dict, Iterable, Optional, Sequence
+
+from settings import settings
+
+# Field of a sketch hash holding the count of values below the smallest indexable value
+ZERO_BIN = "z"
+
+# Field of a sketch hash holding the sum of all values
+SUM_FIELD = "sum"
+
+# Resolution time quantiles reported by the performance endpoints
+RESOLUTION_TIME_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencySketch:
+    """
+    DDSketch-style mapping of latencies onto logarithmic bins.
+
+    A value x is counted in bin ceil(log_gamma(x)), with gamma = (1 + a) / (1 - a), so every
+    quantile read back from the bins is within a relative error a of the true value. Bins are
+    plain counters, which makes sketches mergeable by adding them up: per-day sketches of a key
+    or an owner can be combined over any range of days.
+    """
+
+    def __init__(self, relative_accuracy: float, min_value: float = 1.0) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+    def bin(self, value: float) -> str:
+        """
+        Find the bin counting a value.
+
+        Args:
+            value (float): The latency in milliseconds.
+
+        Returns:
+            str: The bin name, usable as a Redis hash field.
+        """
+        if value < self.min_value:
+            return ZERO_BIN
+        return str(math.ceil(math.log(value) / self.log_gamma))
+
+    def bin_value(self, index: int) -> float:
+        """
+        Return the representative value of a bin, equidistant in relative terms from its bounds.
+
+        Args:
+            index (int): The bin index.
+
+        Returns:
+            float: The representative latency in milliseconds.
+        """
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    @staticmethod
+    def merge(sketches: Iterable[Dict[bytes, bytes]]) -> Dict[str, float]:
+        """
+        Add up sketches read from Redis.
+
+        Args:
+            sketches (Iterable[Dict[bytes, bytes]]): The raw sketch hashes.
+
+        Returns:
+            Dict[str, float]: The merged bin counts and sum.
+        """
+        merged: Dict[str, float] = {}
+        for sketch in sketches:
+            for field, count in sketch.items():
+                name = field.decode("utf-8") if isinstance(field, bytes) else field
+                merged[name] = merged.get(name, 0) + float(count)
+        return merged
+
+    def summarize(self, merged: Dict[str, float], quantiles: Iterable[float]) -> Optional[dict]:
+        """
+        Compute the count, mean and quantiles of a merged sketch.
+
+        Args:
+            merged (Dict[str, float]): The merged bin counts and sum.
+            quantiles (Iterable[float]): The quantiles to compute, between 0 and 1.
+
+        Returns:
+            Optional[dict]: The count, average and "pXX" quantiles in milliseconds, or None if the sketch is empty.
+        """
+        total = merged.pop(SUM_FIELD, 0.0)
+        zero_count = merged.pop(ZERO_BIN, 0.0)
+        bins = sorted((int(index), count) for index, count in merged.items())
+        count = zero_count + sum(bin_count for _, bin_count in bins)
+        if count <= 0:
+            return None
+
+        summary = {"count": int(count), "avg": round(total / count, 2)}
+        for quantile in quantiles:
+            # Walk the bins in order until the cumulative count passes the rank
+            rank = quantile * (count - 1)
+            cumulative = zero_count
+            value = 0.0
+            if cumulative <= rank and bins:
+                value = self.bin_value(bins[-1][0])
+                for index, bin_count in bins:
+                    cumulative += bin_count
+                    if cumulative > rank:
+                        value = self.bin_value(index)
+                        break
+            summary[f"p{quantile * 100:g}"] = round(value, 2)
+
+        return summary
+
+
+def summarize_exact(values: Sequence[float], quantiles: Iterable[float]) -> Optional[dict]:
+    """
+    Compute the count, mean and quantiles of raw latencies, interpolating like percentile_cont.
+
+    Args:
+        values (Sequence[float]): The latencies in milliseconds, sorted in ascending order.
+        quantiles (Iterable[float]): The quantiles to compute, between 0 and 1.
+
+    Returns:
+        Optional[dict]: The count, average and "pXX" quantiles in milliseconds, or None if there are no values.
+    """
+    count = len(values)
+    if not count:
+        return None
+
+    summary = {"count": count, "avg": round(sum(values) / count, 2)}
+    for quantile in quantiles:
+        rank = quantile * (count - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, count - 1)
+        value = values[lower] + (values[upper] - values[lower]) * (rank - lower)
+        summary[f"p{quantile * 100:g}"] = round(value, 2)
+
+    return summary
+
+
+latency_sketch = LatencySketch(settings.LATENCY_SKETCH_ACCURACY)
@@ -0,0 +1,336 @@
+"""
+Memory-mapped key to URL snapshots for resolving links without the cache or the database.
+
+A snapshot file holds, after a fixed header, the sorted 7-byte keys, an array of URL offsets,
+the sorted keys of deleted links (tombstones) and a blob of UTF-8 URLs:
+
+    header | keys (n x 7) | offsets ((n + 1) x uint64) | tombstones (t x 7) | urls
+
+Workers map the files read-only and binary search the keys in place, so the table is shared
+through the page cache instead of being loaded into each process. A full snapshot is rebuilt
+periodically and a cumulative delta, covering links created and deleted since the full build,
+is rebuilt more often:
+
+    python snapshot.py full
+    python snapshot.py delta --every 60
+
+Only links without an expiry time or click limit are exported, since those never change.
+"""
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from settings import settings
+
+MAGIC = b"URLSNAP1"
+HEADER = struct.Struct("<8sQQd")
+KEY_WIDTH = 7
+OFFSET = struct.Struct("<Q")
+
+FULL_SNAPSHOT = "urls.snap"
+DELTA_SNAPSHOT = "urls.delta.snap"
+
+# Overlap between the full snapshot and its delta, covering transactions still in flight at build time
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+class _KeyArray:
+    """Read-only view over a sorted run of fixed-width keys in a mapped file."""
+
+    def __init__(self, buffer: mmap.mmap, start: int, count: int) -> None:
+        self.buffer = buffer
+        self.start = start
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        position = self.start + index * KEY_WIDTH
+        return self.buffer[position : position + KEY_WIDTH]
+
+    def contains(self, key: bytes) -> bool:
+        index = _bisect(self, key)
+        return index < self.count and self[index] == key
+
+
+def _bisect(keys: _KeyArray, key: bytes) -> int:
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if keys[middle] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class SnapshotFile:
+    """
+    A snapshot file mapped into memory.
+
+    Args:
+        path (str): The path of the snapshot file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self.mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, tombstone_count, watermark = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a URL snapshot")
+
+        self.watermark = datetime.fromtimestamp(watermark, tz=timezone.utc)
+        self.keys = _KeyArray(self.buffer, HEADER.size, count)
+        self.offsets_start = HEADER.size + count * KEY_WIDTH
+        self.tombstones = _KeyArray(
+            self.buffer, self.offsets_start + (count + 1) * OFFSET.size, tombstone_count
+        )
+        self.urls_start = self.tombstones.start + tombstone_count * KEY_WIDTH
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """
+        Look up the URL of a key.
+
+        Args:
+            key (bytes): The shortened URL key.
+
+        Returns:
+            Optional[bytes]: The URL, or None if the key is not in the file.
+        """
+        index = _bisect(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+
+        start, end = struct.unpack_from(
+            "<QQ", self.buffer, self.offsets_start + index * OFFSET.size
+        )
+        return self.buffer[self.urls_start + start : self.urls_start + end]
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+def write_snapshot(
+    path: str,
+    entries: List[Tuple[str, str]],
+    tombstones: List[str],
+    watermark: datetime,
+) -> int:
+    """
+    Write a snapshot file atomically, replacing any previous file at the same path.
+
+    Args:
+        path (str): The path of the snapshot file.
+        entries (List[Tuple[str, str]]): The (key, URL) pairs, in any order.
+        tombstones (List[str]): The keys of deleted links.
+        watermark (datetime): The time up to which the snapshot is complete.
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    entries = sorted((key.encode("ascii"), url.encode("utf-8")) for key, url in entries)
+    tombstone_keys = sorted(key.encode("ascii") for key in tombstones)
+
+    offsets = bytearray()
+    position = 0
+    offsets += OFFSET.pack(position)
+    for _, url in entries:
+        position += len(url)
+        offsets += OFFSET.pack(position)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(
+            HEADER.pack(MAGIC, len(entries), len(tombstone_keys), watermark.timestamp())
+        )
+        file.write(b"".join(key for key, _ in entries))
+        file.write(offsets)
+        file.write(b"".join(tombstone_keys))
+        for _, url in entries:
+            file.write(url)
+        file.flush()
+        os.fsync(file.fileno())
+
+    # Readers keep their mapping of the old file until they reload
+    os.replace(temporary_path, path)
+    return os.path.getsize(path)
+
+
+class Snapshot:
+    """
+    The full snapshot and its delta, as seen by one worker.
+
+    Lookups check the delta first, then its tombstones, then the full snapshot. Links removed
+    by this worker are hidden at once; removals by other workers are hidden once they appear in
+    the next delta.
+
+    Args:
+        directory (str): The directory holding the snapshot files. Empty to disable snapshots.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.full: Optional[SnapshotFile] = None
+        self.delta: Optional[SnapshotFile] = None
+        self.local_tombstones: Dict[bytes, datetime] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up the URL of a key.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[bytes]: The URL, or None if the snapshot cannot answer.
+        """
+        if self.full is None:
+            return None
+
+        key_bytes = key.encode("ascii", errors="replace")
+        if len(key_bytes) != KEY_WIDTH or key_bytes in self.local_tombstones:
+            return None
+
+        if self.delta is not None:
+            original_url = self.delta.get(key_bytes)
+            if original_url is not None:
+                return original_url
+            if self.delta.tombstones.contains(key_bytes):
+                return None
+
+        return self.full.get(key_bytes)
+
+    def discard(self, key: str) -> None:
+        """
+        Hide a link removed by this worker until a delta records its removal.
+
+        Args:
+            key (str): The shortened URL key.
+        """
+        self.local_tombstones[key.encode("ascii", errors="replace")] = datetime.now(
+            timezone.utc
+        )
+
+    def _reload_file(
+        self, current: Optional[SnapshotFile], name: str
+    ) -> Optional[SnapshotFile]:
+        path = os.path.join(self.directory, name)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            if current is not None:
+                current.close()
+            return None
+
+        if current is not None and current.mtime_ns == mtime_ns:
+            return current
+
+        replacement = SnapshotFile(path)
+        if current is not None:
+            current.close()
+        return replacement
+
+    def reload(self) -> None:
+        """Map the snapshot files again if they have been rebuilt since they were last mapped."""
+        if not self.enabled:
+            return
+
+        self.full = self._reload_file(self.full, FULL_SNAPSHOT)
+        delta = self._reload_file(self.delta, DELTA_SNAPSHOT)
+
+        # A delta older than the full snapshot would hide links recreated since
+        if delta is not None and self.full is not None and delta.watermark < self.full.watermark:
+            delta.close()
+            delta = None
+        self.delta = delta
+
+        # Local removals older than the delta are now recorded in its tombstones
+        if self.delta is not None:
+            horizon = self.delta.watermark - WATERMARK_OVERLAP
+            self.local_tombstones = {
+                key: removed_at
+                for key, removed_at in self.local_tombstones.items()
+                if removed_at > horizon
+            }
+
+    def close(self) -> None:
+        for snapshot_file in (self.full, self.delta):
+            if snapshot_file is not None:
+                snapshot_file.close()
+        self.full = self.delta = None
+
+
+async def build(kind: str) -> None:
+    """
+    Export the links of the database into a full or delta snapshot file.
+
+    Args:
+        kind (str): Either "full" or "delta".
+    """
+    from dal import export_snapshot_entries, export_tombstones, prune_tombstones
+    from database import pool
+
+    await pool.connect()
+    try:
+        start = time.perf_counter()
+        if kind == "full":
+            watermark, entries = await export_snapshot_entries(since=None)
+            tombstones: List[str] = []
+            path = os.path.join(settings.SNAPSHOT_DIR, FULL_SNAPSHOT)
+        else:
+            full = SnapshotFile(os.path.join(settings.SNAPSHOT_DIR, FULL_SNAPSHOT))
+            since = full.watermark - WATERMARK_OVERLAP
+            full.close()
+            watermark, entries = await export_snapshot_entries(since=since)
+            tombstones = await export_tombstones(since=since)
+            path = os.path.join(settings.SNAPSHOT_DIR, DELTA_SNAPSHOT)
+
+        size = write_snapshot(path, entries, tombstones, watermark)
+
+        # Removals before the full snapshot are reflected in it
+        if kind == "full":
+            await prune_tombstones(before=watermark - WATERMARK_OVERLAP)
+
+        print(
+            f"Wrote {len(entries)} links and {len(tombstones)} tombstones to {path} "
+            f"({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f} s"
+        )
+    finally:
+        await pool.disconnect()
+
+
+async def main(kind: str, every: float) -> None:
+    while True:
+        await build(kind)
+        if not every:
+            return
+        await asyncio.sleep(every)
+
+
+# Snapshot of the worker, mapped by the reload task
+snapshot = Snapshot(settings.SNAPSHOT_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a URL snapshot file.")
+    parser.add_argument("kind", choices=["full", "delta"])
+    parser.add_argument(
+        "--every", type=float, default=0, help="Rebuild every N seconds instead of once."
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.kind, args.every))
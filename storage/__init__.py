@@ -0,0 +1,33 @@
+from settings import settings
+from storage.base import StorageBackend
+
+
+def create_storage(backend: str) -> StorageBackend:
+    """
+    Create the storage backend selected in the settings.
+
+    Backends are imported on demand, so the in-memory and SQLite backends do not set up the
+    PostgreSQL and Redis clients.
+
+    Args:
+        backend (str): Either "postgres", "memory" or "sqlite".
+
+    Returns:
+        StorageBackend: The storage backend.
+    """
+    if backend == "memory":
+        from storage.memory import MemoryStorage
+
+        return MemoryStorage()
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStorage
+
+        return SQLiteStorage(settings.SQLITE_PATH)
+
+    from storage.postgres import PostgresStorage
+
+    return PostgresStorage()
+
+
+# Storage used by the application
+storage = create_storage(settings.STORAGE_BACKEND)
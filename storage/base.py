@@ -0,0 +1,373 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from pydantic import HttpUrl
+
+from logger import logger
+
+# A created or existing link: (key, created, expires_at, max_clicks)
+CreatedLink = Tuple[str, bool, Optional[datetime], Optional[int]]
+
+
+def day_bounds(
+    start: Optional[date], end: Optional[date]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Convert an inclusive day range into a half-open time range.
+
+    Args:
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+
+    Returns:
+        Tuple[Optional[datetime], Optional[datetime]]: The start and end times, in UTC.
+    """
+    return (
+        datetime.combine(start, time.min, tzinfo=timezone.utc) if start else None,
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        if end
+        else None,
+    )
+
+
+class StorageBackend(ABC):
+    """
+    Storage of links and their clicks, as used by the API.
+
+    Backends implement link CRUD, resolution, click ingestion and the analytics primitives; the
+    composite performance and metrics views are built on those primitives here. Methods follow
+    the error handling of the data access layer: failures are logged and an empty result is
+    returned rather than raised.
+    """
+
+    async def connect(self) -> None:
+        """Open the connections of the backend."""
+
+    async def disconnect(self) -> None:
+        """Close the connections of the backend."""
+
+    async def fetch_cached_url(self, key: str) -> Optional[bytes]:
+        """
+        Look up a link in the fast tiers only, for answering redirects before routing.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[bytes]: The original URL, or None if the full resolve path must run.
+        """
+        return None
+
+    @abstractmethod
+    async def create_record(
+        self,
+        original_url: HttpUrl,
+        owner_id: str,
+        unique_key: str,
+        expires_at: Optional[datetime] = None,
+        max_clicks: Optional[int] = None,
+    ) -> Optional[CreatedLink]:
+        """
+        Create a new URL record, or return the owner's existing key for the same URL.
+
+        Expired and exhausted links are not returned; the owner's dead link holding the key is
+        renewed with the new expiry policy instead.
+
+        Args:
+            original_url (HttpUrl): The original URL to be shortened.
+            owner_id (str): The ID of the owner.
+            unique_key (str): The unique key for the shortened URL.
+            expires_at (Optional[datetime]): The time after which the link stops resolving, if any.
+            max_clicks (Optional[int]): The number of resolves after which the link stops resolving, if any.
+
+        Returns:
+            Optional[CreatedLink]: The key, whether a new record was created, and the stored expiry time and
+                click limit, or None if the key is taken.
+        """
+
+    @abstractmethod
+    async def fetch_original_url(self, key: str) -> Optional[str]:
+        """
+        Resolve a key, counting the click against click-limited links.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[str]: The original URL if found and not expired, None otherwise.
+        """
+
+    @abstractmethod
+    async def fetch_link(self, key: str) -> Optional[Mapping]:
+        """
+        Retrieve the stored link for a key.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[Mapping]: The original URL and creation time if found, None otherwise.
+        """
+
+    @abstractmethod
+    async def fetch_multiple_urls(
+        self, owner_id: str, limit: int = 10, offset: int = 0
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Fetch a page of an owner's links, newest first.
+
+        Args:
+            owner_id (str): The ID of the owner.
+            limit (int, optional): The maximum number of records to return. Defaults to 10.
+            offset (int, optional): The number of records to skip. Defaults to 0.
+
+        Returns:
+            Tuple[int, List[Dict[str, str]]]: The total count of the owner's links, and the page shaped like APIReadResponse.
+        """
+
+    @abstractmethod
+    async def remove_record(self, key: str, owner_id: str) -> bool:
+        """
+        Remove a link of an owner.
+
+        Args:
+            key (str): The shortened URL key.
+            owner_id (str): The ID of the owner.
+
+        Returns:
+            bool: True if the record was deleted, False otherwise.
+        """
+
+    @abstractmethod
+    async def sweep_expired_records(self, batch_size: int) -> int:
+        """
+        Delete one bounded batch of expired and exhausted links.
+
+        Args:
+            batch_size (int): The maximum number of links deleted per kind.
+
+        Returns:
+            int: The number of links deleted.
+        """
+
+    async def purge_deleted_records(self, batch_size: int) -> int:
+        """
+        Run one bounded step of purging the clicks of deleted links.
+
+        Backends that delete links and their clicks at once have nothing to purge.
+
+        Args:
+            batch_size (int): The maximum number of clicks deleted per step.
+
+        Returns:
+            int: The number of rows deleted, 0 when nothing is left to purge.
+        """
+        return 0
+
+    async def flush_cache_invalidations(self) -> int:
+        """
+        Delete again the cache entries of removed links, once they are due.
+
+        Backends without a shared cache have nothing to invalidate.
+
+        Returns:
+            int: The number of cache entries deleted.
+        """
+        return 0
+
+    async def flush_geo_rollup(self) -> int:
+        """
+        Add the click counts buffered in process to the daily geo rollup.
+
+        Backends that update the rollup with each click have nothing to flush.
+
+        Returns:
+            int: The number of rollup rows flushed.
+        """
+        return 0
+
+    @abstractmethod
+    async def set_metrics(self, key: str, **kwargs) -> None:
+        """
+        Record a click of a link.
+
+        Args:
+            key (str): The shortened URL key.
+            **kwargs: Additional keyword arguments, including 'client_ip' and 'response_time'.
+        """
+
+    @abstractmethod
+    async def count_hits(self, key: str) -> int:
+        """
+        Count the number of times a link was resolved.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            int: The total number of hits for the given key.
+        """
+
+    @abstractmethod
+    async def count_top_five_hits(self, owner_id: str) -> Dict[str, int]:
+        """
+        Retrieve the five most hit links of an owner.
+
+        Args:
+            owner_id (str): The ID of the owner.
+
+        Returns:
+            Dict[str, int]: The number of hits by key.
+        """
+
+    @abstractmethod
+    async def count_unique_ips(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        """
+        Count the distinct IP addresses that resolved a link.
+
+        Args:
+            key (str): The shortened URL key.
+            start (Optional[date]): The first day to count. Defaults to all history.
+            end (Optional[date]): The last day to count. Defaults to today.
+
+        Returns:
+            int: The number of unique IPs.
+        """
+
+    @abstractmethod
+    async def count_unique_ips_by_owner(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        """
+        Count the distinct IP addresses that resolved any link of an owner.
+
+        Args:
+            owner_id (str): The ID of the owner.
+            start (Optional[date]): The first day to count. Defaults to all history.
+            end (Optional[date]): The last day to count. Defaults to today.
+
+        Returns:
+            int: The number of unique IPs.
+        """
+
+    @abstractmethod
+    async def resolution_time_summary(
+        self,
+        scope: str,
+        value: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[dict]:
+        """
+        Compute the resolution time count, average and percentiles of a link or an owner.
+
+        Args:
+            scope (str): Either "key" or "owner".
+            value (str): The shortened URL key or the owner ID.
+            start (Optional[date]): The first day of the range, if any.
+            end (Optional[date]): The last day of the range, if any.
+
+        Returns:
+            Optional[dict]: The count, average and percentiles in milliseconds, or None if there are no clicks.
+        """
+
+    @abstractmethod
+    async def geo_breakdown(
+        self,
+        scope: str,
+        value: str,
+        level: str = "country",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        """
+        Break the clicks of a link or an owner down by location.
+
+        Args:
+            scope (str): Either "key" or "owner".
+            value (str): The shortened URL key or the owner ID.
+            level (str, optional): The breakdown level: "country", "region" or "city". Defaults to "country".
+            start (Optional[date]): The first day of the range, if any.
+            end (Optional[date]): The last day of the range, if any.
+            limit (int, optional): The maximum number of locations returned. Defaults to 50.
+
+        Returns:
+            List[dict]: One row per location with its hits, most hits first.
+        """
+
+    async def evaluate_performance(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Optional[dict]:
+        """
+        Evaluate performance metrics for a shortened URL.
+
+        Args:
+            key (str): The shortened URL key.
+            start (Optional[date]): The first day of the resolution time range. Defaults to all history.
+            end (Optional[date]): The last day of the resolution time range. Defaults to today.
+
+        Returns:
+            Optional[dict]: A dictionary with performance metrics or None if an error occurs.
+        """
+        try:
+            resolution_time = await self.resolution_time_summary(
+                "key", key, start=start, end=end
+            )
+            return {
+                "total_hits": await self.count_hits(key),
+                "unique_ips": await self.count_unique_ips(key),
+                "avg_resolution_time": resolution_time["avg"] if resolution_time else None,
+                "resolution_time": resolution_time,
+            }
+        except Exception as e:
+            logger.error(f"An error occurred while evaluating performance: {e}")
+            return None
+
+    async def evaluate_owner_performance(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Optional[dict]:
+        """
+        Evaluate the resolution time percentiles across all URLs of an owner.
+
+        Args:
+            owner_id (str): The ID of the owner.
+            start (Optional[date]): The first day of the range. Defaults to all history.
+            end (Optional[date]): The last day of the range. Defaults to today.
+
+        Returns:
+            Optional[dict]: A dictionary with performance metrics or None if an error occurs.
+        """
+        try:
+            resolution_time = await self.resolution_time_summary(
+                "owner", owner_id, start=start, end=end
+            )
+            return {
+                "avg_resolution_time": resolution_time["avg"] if resolution_time else None,
+                "resolution_time": resolution_time,
+            }
+        except Exception as e:
+            logger.error(f"An error occurred while evaluating owner performance: {e}")
+            return None
+
+    async def get_metrics(self, key: str) -> Optional[dict]:
+        """
+        Retrieve metrics for a shortened URL.
+
+        Args:
+            key (str): The shortened URL key.
+
+        Returns:
+            Optional[dict]: A dictionary with metrics or None if an error occurs.
+        """
+        try:
+            return {
+                "hits": await self.count_hits(key),
+                "unique_ips": await self.count_unique_ips(key),
+            }
+        except Exception as e:
+            logger.error(f"An error occurred while retrieving metrics: {e}")
+            return None
@@ -0,0 +1,321 @@
+import heapq
+import itertools
+import sys
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from pydantic import HttpUrl
+
+from geo import GEO_LEVELS, breakdown_row, clean_name, decode_country, encode_country
+from settings import settings
+from sketches import RESOLUTION_TIME_QUANTILES, summarize_exact
+from storage.base import CreatedLink, StorageBackend, day_bounds
+
+# A recorded click: (created_at, key, client_ip, response_time)
+Click = Tuple[datetime, str, Optional[str], Optional[int]]
+
+# A daily geo rollup entry: (day, country, region, city)
+Location = Tuple[date, Optional[str], Optional[str], Optional[str]]
+
+
+class _Link:
+    """A stored link."""
+
+    __slots__ = (
+        "key", "original_url", "owner_id", "created_at", "sequence",
+        "expires_at", "max_clicks", "click_count",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        original_url: str,
+        owner_id: str,
+        sequence: int,
+        expires_at: Optional[datetime],
+        max_clicks: Optional[int],
+    ) -> None:
+        self.key = key
+        self.original_url = original_url
+        self.owner_id = owner_id
+        self.created_at = datetime.now(timezone.utc)
+        self.sequence = sequence
+        self.expires_at = expires_at
+        self.max_clicks = max_clicks
+        self.click_count = 0
+
+    @property
+    def position(self) -> Tuple[datetime, int, str]:
+        # Sort key of the link in its owner's index; the sequence breaks creation time ties
+        return self.created_at, self.sequence, self.key
+
+    def expired(self, now: datetime) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+    def dead(self, now: datetime) -> bool:
+        # Expired and exhausted links no longer resolve, even before they are swept
+        return self.expired(now) or (
+            self.max_clicks is not None and self.click_count >= self.max_clicks
+        )
+
+
+def _clicks_between(
+    clicks: List[Click], start: Optional[date], end: Optional[date]
+) -> List[Click]:
+    # Clicks are appended in time order, so a day range is a contiguous slice
+    start_time, end_time = day_bounds(start, end)
+    low = bisect_left(clicks, start_time, key=lambda click: click[0]) if start_time else 0
+    high = (
+        bisect_left(clicks, end_time, key=lambda click: click[0])
+        if end_time
+        else len(clicks)
+    )
+    return clicks[low:high]
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Links and clicks held in process, for tests and hermetic load tests.
+
+    Links are kept in a dictionary by key, with a per-owner list sorted by creation time for
+    pagination and a heap of expiry times for the sweeper. Clicks are appended to per-key and
+    per-owner lists in time order, so day ranges are found by binary search, and counted in
+    per-key and per-owner daily rollups by location. Nothing is persisted, and each worker
+    process has its own copy, so run a single worker.
+    """
+
+    def __init__(self) -> None:
+        self.links: Dict[str, _Link] = {}
+        self.keys_by_url: Dict[Tuple[str, str], str] = {}
+        self.owner_links: Dict[str, List[Tuple[datetime, int, str]]] = {}
+        self.expiries: List[Tuple[datetime, str]] = []
+        self.exhausted: Set[str] = set()
+        self.clicks_by_key: Dict[str, List[Click]] = {}
+        self.clicks_by_owner: Dict[str, List[Click]] = {}
+        self.hits_by_owner: Dict[str, Counter] = {}
+        self.geo_by_key: Dict[str, Counter] = {}
+        self.geo_by_owner: Dict[str, Counter] = {}
+        self.sequence = itertools.count()
+
+    def _live_link(self, key: str) -> Optional[_Link]:
+        link = self.links.get(key)
+        if link is None or link.expired(datetime.now(timezone.utc)):
+            return None
+        return link
+
+    def _unlink(self, link: _Link) -> None:
+        del self.links[link.key]
+        # A renewed URL may already map to its new key
+        if self.keys_by_url.get((link.owner_id, link.original_url)) == link.key:
+            del self.keys_by_url[(link.owner_id, link.original_url)]
+        self.exhausted.discard(link.key)
+
+        owner_links = self.owner_links[link.owner_id]
+        del owner_links[bisect_left(owner_links, link.position)]
+
+    def _delete(self, link: _Link) -> None:
+        self._unlink(link)
+
+        # The clicks and rollups of the link go with it, so a later link at its key starts empty
+        self.clicks_by_key.pop(link.key, None)
+        if link.owner_id in self.clicks_by_owner:
+            self.clicks_by_owner[link.owner_id] = [
+                click for click in self.clicks_by_owner[link.owner_id] if click[1] != link.key
+            ]
+        self.hits_by_owner.get(link.owner_id, Counter()).pop(link.key, None)
+        geo = self.geo_by_key.pop(link.key, None)
+        if geo and link.owner_id in self.geo_by_owner:
+            self.geo_by_owner[link.owner_id] -= geo
+
+    async def fetch_cached_url(self, key: str) -> Optional[bytes]:
+        # Click-limited links are left to the full resolve path, which counts the click
+        link = self._live_link(key)
+        if link is None or link.max_clicks is not None:
+            return None
+        return link.original_url.encode("utf-8")
+
+    async def create_record(
+        self,
+        original_url: HttpUrl,
+        owner_id: str,
+        unique_key: str,
+        expires_at: Optional[datetime] = None,
+        max_clicks: Optional[int] = None,
+    ) -> Optional[CreatedLink]:
+        original_url = str(original_url)
+        now = datetime.now(timezone.utc)
+
+        existing_key = self.keys_by_url.get((owner_id, original_url))
+        if existing_key is not None:
+            existing = self.links[existing_key]
+            if not existing.dead(now):
+                return existing_key, False, existing.expires_at, existing.max_clicks
+
+        # The key is taken by a different URL, unless it holds a dead link of the same owner
+        taken = self.links.get(unique_key)
+        if taken is not None:
+            if taken.owner_id != owner_id or not taken.dead(now):
+                return None
+            # A renewed link keeps its clicks, like the database upsert
+            self._unlink(taken)
+
+        link = _Link(
+            unique_key, original_url, owner_id, next(self.sequence), expires_at, max_clicks
+        )
+        self.links[unique_key] = link
+        self.keys_by_url[(owner_id, original_url)] = unique_key
+        insort(self.owner_links.setdefault(owner_id, []), link.position)
+        if expires_at is not None:
+            heapq.heappush(self.expiries, (expires_at, unique_key))
+
+        return unique_key, True, expires_at, max_clicks
+
+    async def fetch_original_url(self, key: str) -> Optional[str]:
+        link = self._live_link(key)
+        if link is None:
+            return None
+
+        if link.max_clicks is not None:
+            if link.click_count >= link.max_clicks:
+                return None
+            link.click_count += 1
+            if link.click_count >= link.max_clicks:
+                self.exhausted.add(key)
+
+        return link.original_url
+
+    async def fetch_link(self, key: str) -> Optional[Mapping]:
+        link = self.links.get(key)
+        if link is None:
+            return None
+        return {"original_url": link.original_url, "created_at": link.created_at}
+
+    async def fetch_multiple_urls(
+        self, owner_id: str, limit: int = 10, offset: int = 0
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        owner_links = self.owner_links.get(owner_id, [])
+
+        # The index is oldest first, so the newest-first page is read from its end
+        end = max(len(owner_links) - offset, 0)
+        start = max(end - limit, 0)
+
+        shortened_url_base = str(settings.SHORTENED_URL_BASE)
+        urls = [
+            {
+                "shortened_url": f"{shortened_url_base}{key}",
+                "original_url": self.links[key].original_url,
+            }
+            for _, _, key in reversed(owner_links[start:end])
+        ]
+        return len(owner_links), urls
+
+    async def remove_record(self, key: str, owner_id: str) -> bool:
+        link = self.links.get(key)
+        if link is None or link.owner_id != owner_id:
+            return False
+
+        self._delete(link)
+        return True
+
+    async def sweep_expired_records(self, batch_size: int) -> int:
+        now = datetime.now(timezone.utc)
+
+        expired = 0
+        while self.expiries and self.expiries[0][0] <= now and expired < batch_size:
+            expires_at, key = heapq.heappop(self.expiries)
+
+            # Entries of links removed or recreated since are skipped
+            link = self.links.get(key)
+            if link is not None and link.expires_at == expires_at:
+                self._delete(link)
+                expired += 1
+
+        exhausted = list(itertools.islice(self.exhausted, batch_size))
+        for key in exhausted:
+            self._delete(self.links[key])
+
+        return expired + len(exhausted)
+
+    async def set_metrics(self, key: str, **kwargs) -> None:
+        # Clicks are only recorded for links that exist, like the database insert
+        link = self.links.get(key)
+        if link is None:
+            return
+
+        click = (
+            datetime.now(timezone.utc),
+            key,
+            kwargs.get("client_ip"),
+            kwargs.get("response_time"),
+        )
+        self.clicks_by_key.setdefault(key, []).append(click)
+        self.clicks_by_owner.setdefault(link.owner_id, []).append(click)
+        self.hits_by_owner.setdefault(link.owner_id, Counter())[key] += 1
+
+        # Locations are normalized like the database encoding, and names are interned
+        region, city = clean_name(kwargs.get("region")), clean_name(kwargs.get("city"))
+        location: Location = (
+            click[0].date(),
+            decode_country(encode_country(kwargs.get("country"))),
+            sys.intern(region) if region else None,
+            sys.intern(city) if city else None,
+        )
+        self.geo_by_key.setdefault(key, Counter())[location] += 1
+        self.geo_by_owner.setdefault(link.owner_id, Counter())[location] += 1
+
+    async def count_hits(self, key: str) -> int:
+        return len(self.clicks_by_key.get(key, []))
+
+    async def count_top_five_hits(self, owner_id: str) -> Dict[str, int]:
+        return dict(self.hits_by_owner.get(owner_id, Counter()).most_common(5))
+
+    async def count_unique_ips(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        clicks = _clicks_between(self.clicks_by_key.get(key, []), start, end)
+        return len({client_ip for _, _, client_ip, _ in clicks if client_ip is not None})
+
+    async def count_unique_ips_by_owner(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        clicks = _clicks_between(self.clicks_by_owner.get(owner_id, []), start, end)
+        return len({client_ip for _, _, client_ip, _ in clicks if client_ip is not None})
+
+    async def resolution_time_summary(
+        self,
+        scope: str,
+        value: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[dict]:
+        clicks_by_scope = self.clicks_by_key if scope == "key" else self.clicks_by_owner
+        clicks = _clicks_between(clicks_by_scope.get(value, []), start, end)
+        response_times = sorted(
+            response_time for _, _, _, response_time in clicks if response_time is not None
+        )
+        return summarize_exact(response_times, RESOLUTION_TIME_QUANTILES)
+
+    async def geo_breakdown(
+        self,
+        scope: str,
+        value: str,
+        level: str = "country",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        rollup = (self.geo_by_key if scope == "key" else self.geo_by_owner).get(value, {})
+        depth = GEO_LEVELS.index(level) + 1
+
+        totals: Counter = Counter()
+        for (day, *location), hits in rollup.items():
+            if (start and day < start) or (end and day > end):
+                continue
+            totals[tuple(location[:depth])] += hits
+
+        return [
+            breakdown_row(level, *location, *[None] * (len(GEO_LEVELS) - depth), hits)
+            for location, hits in totals.most_common(limit)
+        ]
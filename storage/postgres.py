@@ -0,0 +1,136 @@
+from datetime import date, datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from pydantic import HttpUrl
+
+import dal
+from cache import cache
+from database import check_schema_version, database as db, pool
+from storage.base import CreatedLink, StorageBackend
+
+
+class PostgresStorage(StorageBackend):
+    """
+    Links in PostgreSQL, fronted by the Redis cache, the resolver snapshot and the stale tier.
+
+    Every method delegates to the data access layer, which remains the home of the queries.
+    """
+
+    async def connect(self) -> None:
+        # Connect to the database
+        await db.connect()
+
+        # Check that migrations have been applied
+        await check_schema_version(database=db)
+
+        # Open the asyncpg pool used for hot-path statements
+        await pool.connect()
+
+        # Connect to the cache once, so requests share its connection pool
+        await cache.connect()
+
+    async def disconnect(self) -> None:
+        await cache.disconnect()
+        await pool.disconnect()
+        await db.disconnect()
+
+    async def fetch_cached_url(self, key: str) -> Optional[bytes]:
+        return await dal.fetch_cached_url(key)
+
+    async def create_record(
+        self,
+        original_url: HttpUrl,
+        owner_id: str,
+        unique_key: str,
+        expires_at: Optional[datetime] = None,
+        max_clicks: Optional[int] = None,
+    ) -> Optional[CreatedLink]:
+        return await dal.create_record(
+            original_url=original_url,
+            owner_id=owner_id,
+            unique_key=unique_key,
+            expires_at=expires_at,
+            max_clicks=max_clicks,
+        )
+
+    async def fetch_original_url(self, key: str) -> Optional[str]:
+        return await dal.fetch_original_url(key)
+
+    async def fetch_link(self, key: str) -> Optional[Mapping]:
+        return await dal.fetch_link(key)
+
+    async def fetch_multiple_urls(
+        self, owner_id: str, limit: int = 10, offset: int = 0
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        return await dal.fetch_multiple_urls(owner_id, limit=limit, offset=offset)
+
+    async def remove_record(self, key: str, owner_id: str) -> bool:
+        return await dal.remove_record(key, owner_id)
+
+    async def sweep_expired_records(self, batch_size: int) -> int:
+        return await dal.sweep_expired_records(batch_size)
+
+    async def purge_deleted_records(self, batch_size: int) -> int:
+        return await dal.purge_deleted_records(batch_size)
+
+    async def flush_cache_invalidations(self) -> int:
+        return await dal.flush_cache_invalidations()
+
+    async def flush_geo_rollup(self) -> int:
+        return await dal.flush_geo_rollup()
+
+    async def set_metrics(self, key: str, **kwargs) -> None:
+        await dal.set_metrics(key, **kwargs)
+
+    async def count_hits(self, key: str) -> int:
+        return await dal.count_hits(key)
+
+    async def count_top_five_hits(self, owner_id: str) -> Dict[str, int]:
+        return await dal.count_top_five_hits(owner_id)
+
+    async def count_unique_ips(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        return await dal.count_unique_ips(key, start=start, end=end)
+
+    async def count_unique_ips_by_owner(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        return await dal.count_unique_ips_by_owner(owner_id, start=start, end=end)
+
+    async def resolution_time_summary(
+        self,
+        scope: str,
+        value: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[dict]:
+        column = "key" if scope == "key" else "owner_id"
+        return await dal._resolution_time_summary(scope, column, value, start=start, end=end)
+
+    async def geo_breakdown(
+        self,
+        scope: str,
+        value: str,
+        level: str = "country",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        column = "key" if scope == "key" else "owner_id"
+        return await dal.geo_breakdown(
+            column, value, level=level, start=start, end=end, limit=limit
+        )
+
+    async def evaluate_performance(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Optional[dict]:
+        return await dal.evaluate_performance(key, start=start, end=end)
+
+    async def evaluate_owner_performance(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Optional[dict]:
+        return await dal.evaluate_owner_performance(owner_id, start=start, end=end)
+
+    async def get_metrics(self, key: str) -> Optional[dict]:
+        return await dal.get_metrics(key)
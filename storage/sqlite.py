@@ -0,0 +1,543 @@
+import asyncio
+import sqlite3
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from pydantic import HttpUrl
+
+from geo import GEO_LEVELS, breakdown_row, clean_name, decode_country, encode_country
+from logger import logger
+from settings import settings
+from sketches import RESOLUTION_TIME_QUANTILES, summarize_exact
+from storage.base import CreatedLink, StorageBackend, day_bounds
+
+# Tables are created on connect, since this backend is not managed by the Alembic migrations.
+# Times are stored as UNIX timestamps in seconds.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    key TEXT PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    owner_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    max_clicks INTEGER,
+    click_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS urls_owner_created_idx ON urls (owner_id, created_at);
+CREATE INDEX IF NOT EXISTS urls_owner_url_idx ON urls (owner_id, original_url);
+CREATE INDEX IF NOT EXISTS urls_expires_at_idx ON urls (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    owner_id TEXT NOT NULL,
+    client_ip TEXT,
+    response_time INTEGER,
+    country INTEGER,
+    region_id INTEGER,
+    city_id INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metrics_key_created_idx ON metrics (key, created_at);
+CREATE INDEX IF NOT EXISTS metrics_owner_created_idx ON metrics (owner_id, created_at);
+CREATE TABLE IF NOT EXISTS geo_names (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS geo_daily (
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    country INTEGER NOT NULL,
+    region_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    owner_id TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    PRIMARY KEY (key, day, country, region_id, city_id)
+);
+CREATE INDEX IF NOT EXISTS geo_daily_owner_day_idx ON geo_daily (owner_id, day);
+"""
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+def _datetime(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+
+def _delete_links(connection: sqlite3.Connection, keys: List[str]) -> int:
+    """
+    Delete links with their clicks and geo rollups, which have no cascading foreign keys here.
+
+    Args:
+        connection (sqlite3.Connection): The connection, inside a transaction.
+        keys (List[str]): The shortened URL keys.
+
+    Returns:
+        int: The number of links deleted.
+    """
+    if not keys:
+        return 0
+
+    placeholders = ", ".join("?" * len(keys))
+    connection.execute(f"DELETE FROM metrics WHERE key IN ({placeholders})", keys)
+    connection.execute(f"DELETE FROM geo_daily WHERE key IN ({placeholders})", keys)
+    deleted = connection.execute(f"DELETE FROM urls WHERE key IN ({placeholders})", keys)
+    return deleted.rowcount
+
+
+def _range_filter(start: Optional[date], end: Optional[date]) -> Tuple[str, List[float]]:
+    """
+    Build the created_at condition of a day range.
+
+    Args:
+        start (Optional[date]): The first day of the range, if any.
+        end (Optional[date]): The last day of the range, if any.
+
+    Returns:
+        Tuple[str, List[float]]: The SQL condition, to append to a WHERE clause, and its parameters.
+    """
+    start_time, end_time = day_bounds(start, end)
+    condition, parameters = "", []
+    if start_time:
+        condition += " AND created_at >= ?"
+        parameters.append(start_time.timestamp())
+    if end_time:
+        condition += " AND created_at < ?"
+        parameters.append(end_time.timestamp())
+    return condition, parameters
+
+
+def _intern_name(connection: sqlite3.Connection, name: Optional[str]) -> int:
+    """
+    Look up the id of a region or city name, interning it if it is new.
+
+    Args:
+        connection (sqlite3.Connection): The connection, inside a transaction.
+        name (Optional[str]): The name, if known.
+
+    Returns:
+        int: The id of the name, or 0 if it is not known.
+    """
+    if name is None:
+        return 0
+    connection.execute(
+        "INSERT INTO geo_names (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,)
+    )
+    return connection.execute("SELECT id FROM geo_names WHERE name = ?", (name,)).fetchone()[0]
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Links and clicks in a local SQLite file, for hermetic load tests that outlive the process.
+
+    The sqlite3 module is blocking, so statements run in a worker thread. They are serialized
+    through one connection, which keeps each method's statements atomic.
+
+    Args:
+        path (str): The path of the database file, or ":memory:".
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = asyncio.Lock()
+
+    async def _run(self, function: Callable[[sqlite3.Connection], Any]) -> Any:
+        # One statement batch at a time, each committed or rolled back as a whole
+        def transaction() -> Any:
+            with self.connection:
+                return function(self.connection)
+
+        async with self.lock:
+            return await asyncio.to_thread(transaction)
+
+    async def connect(self) -> None:
+        if self.connection is not None:
+            return
+
+        def open_connection() -> sqlite3.Connection:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            return connection
+
+        self.connection = await asyncio.to_thread(open_connection)
+
+    async def disconnect(self) -> None:
+        if self.connection is None:
+            return
+
+        async with self.lock:
+            await asyncio.to_thread(self.connection.close)
+        self.connection = None
+
+    async def create_record(
+        self,
+        original_url: HttpUrl,
+        owner_id: str,
+        unique_key: str,
+        expires_at: Optional[datetime] = None,
+        max_clicks: Optional[int] = None,
+    ) -> Optional[CreatedLink]:
+        def create(connection: sqlite3.Connection) -> Optional[CreatedLink]:
+            now = datetime.now(timezone.utc).timestamp()
+
+            # Expired and exhausted links are not reused
+            existing = connection.execute(
+                """
+                SELECT key, expires_at, max_clicks FROM urls
+                WHERE owner_id = ? AND original_url = ?
+                    AND (expires_at IS NULL OR expires_at > ?)
+                    AND (max_clicks IS NULL OR click_count < max_clicks)
+                """,
+                (owner_id, str(original_url), now),
+            ).fetchone()
+            if existing:
+                return (
+                    existing["key"],
+                    False,
+                    _datetime(existing["expires_at"]),
+                    existing["max_clicks"],
+                )
+
+            # A conflicting key is taken over when it holds a dead link of the same owner
+            inserted = connection.execute(
+                """
+                INSERT INTO urls (key, original_url, owner_id, created_at, expires_at, max_clicks)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    original_url = excluded.original_url, created_at = excluded.created_at,
+                    expires_at = excluded.expires_at, max_clicks = excluded.max_clicks,
+                    click_count = 0
+                WHERE urls.owner_id = excluded.owner_id
+                    AND (urls.expires_at <= ? OR urls.click_count >= urls.max_clicks)
+                """,
+                (
+                    unique_key,
+                    str(original_url),
+                    owner_id,
+                    now,
+                    _timestamp(expires_at),
+                    max_clicks,
+                    now,
+                ),
+            )
+            return (unique_key, True, expires_at, max_clicks) if inserted.rowcount else None
+
+        try:
+            result = await self._run(create)
+
+            # No row means the key is already taken by a different URL
+            if result is None:
+                logger.error(f"An error occurred while creating a record: key {unique_key} is taken")
+            return result
+        except Exception as e:
+            logger.error(f"An error occurred while creating a record: {e}")
+            return None
+
+    async def fetch_original_url(self, key: str) -> Optional[str]:
+        def resolve(connection: sqlite3.Connection) -> Optional[str]:
+            now = datetime.now(timezone.utc).timestamp()
+            link = connection.execute(
+                """
+                SELECT original_url, max_clicks FROM urls
+                WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+                """,
+                (key, now),
+            ).fetchone()
+            if link is None or link["max_clicks"] is None:
+                return link["original_url"] if link else None
+
+            # Click-limited links are counted on every resolve
+            claimed = connection.execute(
+                "UPDATE urls SET click_count = click_count + 1 WHERE key = ? AND click_count < max_clicks",
+                (key,),
+            )
+            return link["original_url"] if claimed.rowcount else None
+
+        try:
+            return await self._run(resolve)
+        except Exception as e:
+            logger.error(f"An error occurred while fetching the original URL: {e}")
+            return None
+
+    async def fetch_link(self, key: str) -> Optional[Mapping]:
+        def fetch(connection: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return connection.execute(
+                "SELECT original_url, created_at FROM urls WHERE key = ?", (key,)
+            ).fetchone()
+
+        try:
+            result = await self._run(fetch)
+        except Exception as e:
+            logger.error(f"An error occurred while fetching the link: {e}")
+            return None
+
+        if result is None:
+            return None
+        return {
+            "original_url": result["original_url"],
+            "created_at": _datetime(result["created_at"]),
+        }
+
+    async def fetch_multiple_urls(
+        self, owner_id: str, limit: int = 10, offset: int = 0
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        def fetch(connection: sqlite3.Connection) -> Tuple[int, List[sqlite3.Row]]:
+            total_count = connection.execute(
+                "SELECT COUNT(*) FROM urls WHERE owner_id = ?", (owner_id,)
+            ).fetchone()[0]
+            records = connection.execute(
+                """
+                SELECT key, original_url FROM urls WHERE owner_id = ?
+                ORDER BY created_at DESC LIMIT ? OFFSET ?
+                """,
+                (owner_id, limit, offset),
+            ).fetchall()
+            return total_count, records
+
+        try:
+            total_count, records = await self._run(fetch)
+        except Exception as e:
+            logger.error(f"An error occurred while fetching multiple URLs: {e}")
+            return 0, []
+
+        shortened_url_base = str(settings.SHORTENED_URL_BASE)
+        return total_count, [
+            {
+                "shortened_url": f"{shortened_url_base}{record['key']}",
+                "original_url": record["original_url"],
+            }
+            for record in records
+        ]
+
+    async def remove_record(self, key: str, owner_id: str) -> bool:
+        def remove(connection: sqlite3.Connection) -> bool:
+            link = connection.execute(
+                "SELECT key FROM urls WHERE key = ? AND owner_id = ?", (key, owner_id)
+            ).fetchone()
+            return _delete_links(connection, [key]) > 0 if link else False
+
+        try:
+            return await self._run(remove)
+        except Exception as e:
+            logger.error(f"An error occurred while removing a record: {e}")
+            return False
+
+    async def sweep_expired_records(self, batch_size: int) -> int:
+        def sweep(connection: sqlite3.Connection) -> int:
+            expired = connection.execute(
+                "SELECT key FROM urls WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                (datetime.now(timezone.utc).timestamp(), batch_size),
+            ).fetchall()
+            exhausted = connection.execute(
+                """
+                SELECT key FROM urls
+                WHERE max_clicks IS NOT NULL AND click_count >= max_clicks
+                LIMIT ?
+                """,
+                (batch_size,),
+            ).fetchall()
+            keys = {row["key"] for row in [*expired, *exhausted]}
+            return _delete_links(connection, list(keys))
+
+        try:
+            return await self._run(sweep)
+        except Exception as e:
+            logger.error(f"An error occurred while sweeping expired records: {e}")
+            return 0
+
+    async def set_metrics(self, key: str, **kwargs) -> None:
+        country = encode_country(kwargs.get("country")) or 0
+        region = clean_name(kwargs.get("region"))
+        city = clean_name(kwargs.get("city"))
+
+        def insert(connection: sqlite3.Connection) -> None:
+            link = connection.execute(
+                "SELECT owner_id FROM urls WHERE key = ?", (key,)
+            ).fetchone()
+            if link is None:
+                return
+
+            # Region and city names are interned, and unknown locations are stored as 0
+            region_id = _intern_name(connection, region)
+            city_id = _intern_name(connection, city)
+
+            now = datetime.now(timezone.utc)
+            connection.execute(
+                """
+                INSERT INTO metrics (key, owner_id, client_ip, response_time, country, region_id, city_id, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    link["owner_id"],
+                    kwargs.get("client_ip"),
+                    kwargs.get("response_time"),
+                    country or None,
+                    region_id or None,
+                    city_id or None,
+                    now.timestamp(),
+                ),
+            )
+            connection.execute(
+                """
+                INSERT INTO geo_daily (key, day, country, region_id, city_id, owner_id, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (key, day, country, region_id, city_id) DO UPDATE SET hits = hits + 1
+                """,
+                (key, now.date().isoformat(), country, region_id, city_id, link["owner_id"]),
+            )
+
+        try:
+            await self._run(insert)
+        except Exception as e:
+            logger.error(f"An error occurred while setting metrics: {e}")
+
+    async def count_hits(self, key: str) -> int:
+        def count(connection: sqlite3.Connection) -> int:
+            return connection.execute(
+                "SELECT COUNT(*) FROM metrics WHERE key = ?", (key,)
+            ).fetchone()[0]
+
+        try:
+            return await self._run(count)
+        except Exception as e:
+            logger.error(f"An error occurred while counting hits: {e}")
+            return 0
+
+    async def count_top_five_hits(self, owner_id: str) -> Dict[str, int]:
+        def count(connection: sqlite3.Connection) -> List[sqlite3.Row]:
+            return connection.execute(
+                """
+                SELECT key, COUNT(*) AS total_hits FROM metrics WHERE owner_id = ?
+                GROUP BY key ORDER BY total_hits DESC LIMIT 5
+                """,
+                (owner_id,),
+            ).fetchall()
+
+        try:
+            results = await self._run(count)
+            return {result["key"]: result["total_hits"] for result in results}
+        except Exception as e:
+            logger.error(f"An error occurred while counting the top five hits: {e}")
+            return {}
+
+    async def _count_unique_ips(
+        self, column: str, value: str, start: Optional[date], end: Optional[date]
+    ) -> int:
+        condition, parameters = _range_filter(start, end)
+
+        def count(connection: sqlite3.Connection) -> int:
+            return connection.execute(
+                f"SELECT COUNT(DISTINCT client_ip) FROM metrics WHERE {column} = ?{condition}",
+                (value, *parameters),
+            ).fetchone()[0]
+
+        try:
+            return await self._run(count)
+        except Exception as e:
+            logger.error(f"An error occurred while counting unique IPs: {e}")
+            return 0
+
+    async def count_unique_ips(
+        self, key: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        return await self._count_unique_ips("key", key, start, end)
+
+    async def count_unique_ips_by_owner(
+        self, owner_id: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> int:
+        return await self._count_unique_ips("owner_id", owner_id, start, end)
+
+    async def resolution_time_summary(
+        self,
+        scope: str,
+        value: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[dict]:
+        column = "key" if scope == "key" else "owner_id"
+        condition, parameters = _range_filter(start, end)
+
+        def fetch(connection: sqlite3.Connection) -> List[int]:
+            rows = connection.execute(
+                f"""
+                SELECT response_time FROM metrics
+                WHERE {column} = ? AND response_time IS NOT NULL{condition}
+                ORDER BY response_time
+                """,
+                (value, *parameters),
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        try:
+            response_times = await self._run(fetch)
+        except Exception as e:
+            logger.error(f"An error occurred while computing resolution time percentiles: {e}")
+            return None
+
+        return summarize_exact(response_times, RESOLUTION_TIME_QUANTILES)
+
+    async def geo_breakdown(
+        self,
+        scope: str,
+        value: str,
+        level: str = "country",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        column = "key" if scope == "key" else "owner_id"
+        columns = ", ".join(["country", "region_id", "city_id"][: GEO_LEVELS.index(level) + 1])
+
+        condition, parameters = "", []
+        if start:
+            condition += " AND day >= ?"
+            parameters.append(start.isoformat())
+        if end:
+            condition += " AND day <= ?"
+            parameters.append(end.isoformat())
+
+        # Names are joined for the levels that group by them; unknown locations (id 0) have none
+        region_name, city_name, joins = "NULL", "NULL", ""
+        if level != "country":
+            region_name = "regions.name"
+            joins += " LEFT JOIN geo_names AS regions ON regions.id = totals.region_id"
+        if level == "city":
+            city_name = "cities.name"
+            joins += " LEFT JOIN geo_names AS cities ON cities.id = totals.city_id"
+
+        def fetch(connection: sqlite3.Connection) -> List[sqlite3.Row]:
+            return connection.execute(
+                f"""
+                SELECT totals.country, {region_name} AS region, {city_name} AS city, totals.hits
+                FROM (
+                    SELECT {columns}, SUM(hits) AS hits FROM geo_daily
+                    WHERE {column} = ?{condition}
+                    GROUP BY {columns} ORDER BY hits DESC LIMIT ?
+                ) AS totals{joins}
+                ORDER BY totals.hits DESC
+                """,
+                (value, *parameters, limit),
+            ).fetchall()
+
+        try:
+            records = await self._run(fetch)
+        except Exception as e:
+            logger.error(f"An error occurred while computing the geo breakdown: {e}")
+            return []
+
+        return [
+            breakdown_row(
+                level,
+                decode_country(record["country"]),
+                record["region"],
+                record["city"],
+                record["hits"],
+            )
+            for record in records
+        ]
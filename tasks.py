@@ -0,0 +1,98 @@
+import asyncio
+
+from logger import logger
+from settings import settings
+from snapshot import snapshot
+from storage import storage
+
+
+async def run_expiry_sweeper() -> None:
+    """
+    Periodically delete expired links in bounded batches.
+
+    Batches are repeated while they come back full, yielding to the event loop between them,
+    then the sweeper sleeps for EXPIRY_SWEEP_INTERVAL_SECONDS.
+    """
+    while True:
+        try:
+            while True:
+                deleted = await storage.sweep_expired_records(
+                    batch_size=settings.EXPIRY_SWEEP_BATCH_SIZE
+                )
+                if deleted:
+                    logger.info(f"Swept {deleted} expired links")
+                if deleted < settings.EXPIRY_SWEEP_BATCH_SIZE:
+                    break
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"An error occurred in the expiry sweeper: {e}")
+
+        await asyncio.sleep(settings.EXPIRY_SWEEP_INTERVAL_SECONDS)
+
+
+async def run_link_purger() -> None:
+    """
+    Purge the clicks and rows of deleted links in the background.
+
+    Steps are repeated while there is work, pausing PURGE_BATCH_PAUSE_SECONDS between them so
+    the purge never competes with click inserts for long, then the purger sleeps for
+    PURGE_INTERVAL_SECONDS.
+    """
+    while True:
+        try:
+            while True:
+                purged = await storage.purge_deleted_records(
+                    batch_size=settings.PURGE_BATCH_SIZE
+                )
+                if not purged:
+                    break
+                await asyncio.sleep(settings.PURGE_BATCH_PAUSE_SECONDS)
+        except Exception as e:
+            logger.error(f"An error occurred in the link purger: {e}")
+
+        await asyncio.sleep(settings.PURGE_INTERVAL_SECONDS)
+
+
+async def run_cache_invalidator() -> None:
+    """
+    Periodically delete again the cache entries of the links removed by this worker.
+
+    Pending deletes are checked every CACHE_INVALIDATION_INTERVAL_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(settings.CACHE_INVALIDATION_INTERVAL_SECONDS)
+
+        try:
+            await storage.flush_cache_invalidations()
+        except Exception as e:
+            logger.error(f"An error occurred in the cache invalidator: {e}")
+
+
+async def run_geo_rollup_flusher() -> None:
+    """
+    Periodically add the clicks buffered by this worker to the daily geo rollup.
+
+    The buffer is flushed every GEO_ROLLUP_FLUSH_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(settings.GEO_ROLLUP_FLUSH_SECONDS)
+
+        try:
+            await storage.flush_geo_rollup()
+        except Exception as e:
+            logger.error(f"An error occurred in the geo rollup flusher: {e}")
+
+
+async def run_snapshot_reloader() -> None:
+    """
+    Periodically map the snapshot files again once they have been rebuilt.
+
+    Files are checked every SNAPSHOT_RELOAD_SECONDS; unchanged files are not remapped.
+    """
+    while True:
+        try:
+            snapshot.reload()
+        except Exception as e:
+            logger.error(f"An error occurred while reloading the snapshot: {e}")
+
+        await asyncio.sleep(settings.SNAPSHOT_RELOAD_SECONDS)
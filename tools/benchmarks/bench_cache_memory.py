@@ -0,0 +1,94 @@
+"""
+Compare Redis memory per link between the "string" and "hash" cache storage modes.
+
+Synthetic links are written through RedisClient in each mode, the growth of `used_memory` is
+divided by the number of links, and the written keys are removed again. Point it at a scratch
+Redis database: the measurement is only meaningful when nothing else writes to the server.
+
+Usage:
+    python tools/benchmarks/bench_cache_memory.py [--links 200000] [--compress-min-length 0]
+"""
+import argparse
+import asyncio
+import random
+import string
+
+import common  # noqa: F401  (configures sys.path and settings)
+from cache import RedisClient
+from settings import settings
+
+ALPHABET = string.ascii_letters + string.digits
+DOMAINS = ["www.example.com", "news.example.org", "shop.example.net", "blog.example.io"]
+
+
+def synthetic_links(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        key = "".join(rng.choices(ALPHABET, k=7))
+        path = "/".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+            for _ in range(rng.randint(1, 4))
+        )
+        query = "?utm_source=newsletter&utm_medium=email" if rng.random() < 0.4 else ""
+        yield key, f"https://{rng.choice(DOMAINS)}/{path}{query}"
+
+
+async def used_memory(client: RedisClient) -> int:
+    info = await client.redis.info("memory")
+    return int(info["used_memory"])
+
+
+async def measure(mode: str, links, compress_min_length: int) -> float:
+    client = RedisClient(
+        username=settings.CACHE_USERNAME,
+        password=settings.CACHE_PASSWORD,
+        host=settings.CACHE_HOST,
+        port=settings.CACHE_PORT,
+        db=settings.CACHE_DB,
+        storage_mode=mode,
+        # Aim for about 100 links per bucket
+        hash_buckets=max(len(links) // 100, 1),
+        compress_min_length=compress_min_length,
+    )
+    await client.connect()
+
+    try:
+        before = await used_memory(client)
+        for start in range(0, len(links), 1000):
+            async with client.redis.pipeline(transaction=False) as pipe:
+                for key, url in links[start : start + 1000]:
+                    if mode == "hash":
+                        pipe.hset(client.bucket_name(key), key, client.encode(url))
+                    else:
+                        pipe.set(key, client.encode(url))
+                await pipe.execute()
+        after = await used_memory(client)
+
+        # Remove what was written
+        names = {client.bucket_name(key) if mode == "hash" else key for key, _ in links}
+        names = list(names)
+        for start in range(0, len(names), 1000):
+            await client.redis.delete(*names[start : start + 1000])
+    finally:
+        await client.disconnect()
+
+    return (after - before) / len(links)
+
+
+async def main(count: int, compress_min_length: int) -> None:
+    links = list(synthetic_links(count))
+    average_url = sum(len(url) for _, url in links) / len(links)
+    print(f"{count} links, average URL length {average_url:.1f} bytes")
+
+    for mode in ("string", "hash"):
+        per_link = await measure(mode, links, compress_min_length)
+        print(f"{mode:<10} {per_link:10.1f} bytes/link")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--links", type=int, default=200_000)
+    parser.add_argument("--compress-min-length", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.links, args.compress_min_length))
@@ -0,0 +1,63 @@
+"""
+Compare the per-query overhead of the `databases` wrapper with the direct asyncpg pool.
+
+The same primary-key lookup is run sequentially through both layers against a live database,
+so the difference is the client-side cost (SQLAlchemy compilation, parameter conversion,
+statement preparation) rather than server time.
+
+Usage:
+    python tools/benchmarks/bench_db_layer.py [--queries 5000] [--key abc1234]
+"""
+import argparse
+import asyncio
+import time
+
+import common  # noqa: F401  (configures sys.path and settings)
+from database import database, pool
+
+
+async def run(label: str, query, count: int) -> float:
+    # Warm up connections and statement caches
+    for _ in range(50):
+        await query()
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await query()
+    per_query = (time.perf_counter() - start) / count * 1e6
+
+    print(f"{label:<40} {per_query:10.1f} us/query")
+    return per_query
+
+
+async def main(count: int, key: str) -> None:
+    await database.connect()
+    await pool.connect()
+
+    try:
+        wrapped = await run(
+            "databases + SQLAlchemy text()",
+            lambda: database.fetch_one(
+                query="SELECT original_url FROM urls WHERE key = :key",
+                values={"key": key},
+            ),
+            count,
+        )
+        direct = await run(
+            "asyncpg pool, cached prepared statement",
+            lambda: pool.fetchrow("SELECT original_url FROM urls WHERE key = $1", key),
+            count,
+        )
+        print(f"{'overhead saved per query':<40} {wrapped - direct:10.1f} us")
+    finally:
+        await pool.disconnect()
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--key", default="abc1234")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.queries, args.key))
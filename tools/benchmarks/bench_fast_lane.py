@@ -0,0 +1,107 @@
+"""
+Compare a cached redirect served by the RedirectFastLane middleware with the full FastAPI path.
+
+Both paths are driven as raw ASGI calls with the cache lookup and click recording replaced by
+in-memory stand-ins, so only the framework overhead of each path is measured.
+
+Usage:
+    python tools/benchmarks/bench_fast_lane.py [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+import common  # noqa: F401  (configures sys.path and settings)
+from fastapi import FastAPI
+
+import fast_lane
+import routes.url_resolver
+from cache import cache
+from routes.info import router as info_router
+from routes.auth import router as auth_router
+from routes.metrics import router as metrics_router
+from routes.url_shortener import router as url_shortener_router
+from routes.url_resolver import router as url_resolver_router
+
+KEY = "abc1234"
+CACHED = {KEY: b"https://www.example.com/articles/2024/07/some-long-article-slug"}
+
+
+async def get_value(key):
+    return CACHED.get(key)
+
+
+async def record_click(**kwargs):
+    return None
+
+
+# Replace the network-bound pieces with in-memory stand-ins
+cache.get_value = get_value
+routes.url_resolver.record_click = record_click
+fast_lane.record_click = record_click
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(info_router)
+    app.include_router(auth_router)
+    app.include_router(metrics_router)
+    app.include_router(url_shortener_router)
+    app.include_router(url_resolver_router)
+    return app
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": f"/{KEY}",
+    "raw_path": f"/{KEY}".encode(),
+    "query_string": b"",
+    "root_path": "",
+    "headers": [(b"host", b"localhost:8000")],
+    "client": ("127.0.0.1", 50000),
+    "server": ("localhost", 8000),
+}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def run(label: str, app, requests: int) -> float:
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    # Warm up
+    for _ in range(100):
+        await app(dict(SCOPE), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    per_request = (time.perf_counter() - start) / requests * 1e6
+
+    assert all(300 <= status < 400 for status in statuses), statuses[:5]
+    print(f"{label:<40} {per_request:10.2f} us/request")
+    return per_request
+
+
+async def main(requests: int) -> None:
+    app = build_app()
+    full = await run("FastAPI routing + resolve_url", app, requests)
+    fast = await run("RedirectFastLane", fast_lane.RedirectFastLane(app), requests)
+    print(f"{'speed-up':<40} {full / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests))
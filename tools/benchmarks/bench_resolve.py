@@ -0,0 +1,69 @@
+"""
+Compare the per-request CPU cost of the previous resolve and listing paths with the lean ones.
+
+The previous resolve path re-validated cached URLs with HttpUrl and built a RedirectResponse,
+which quotes the URL again. The previous listing path built APIReadResponse objects only to
+dump them back to dictionaries before JSON encoding.
+
+Usage:
+    python tools/benchmarks/bench_resolve.py
+"""
+import json
+
+import common  # noqa: F401  (configures sys.path and settings)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import RedirectResponse
+from pydantic import HttpUrl
+
+import orjson
+from http_cache import FastRedirectResponse
+from schemas.url import APIReadResponse
+
+CACHED_URL = b"https://www.example.com/articles/2024/07/some-long-article-slug?utm_source=newsletter&utm_medium=email"
+ROWS = [
+    {"key": f"k{i:06d}", "original_url": f"https://www.example.com/page/{i}?ref=feed"}
+    for i in range(10)
+]
+SHORTENED_URL_BASE = "http://localhost:8000/"
+
+
+def resolve_previous() -> None:
+    original_url = HttpUrl(CACHED_URL.decode("utf-8"))
+    RedirectResponse(url=original_url)
+
+
+def resolve_lean() -> None:
+    FastRedirectResponse(url=CACHED_URL.decode("utf-8"))
+
+
+def list_previous() -> None:
+    urls = [
+        APIReadResponse(
+            shortened_url=f"{SHORTENED_URL_BASE}{row['key']}",
+            original_url=row["original_url"],
+        )
+        for row in ROWS
+    ]
+    content = {"total": len(urls), "urls": [url.model_dump() for url in urls]}
+    json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+
+
+def list_lean() -> None:
+    urls = [
+        {
+            "shortened_url": f"{SHORTENED_URL_BASE}{row['key']}",
+            "original_url": row["original_url"],
+        }
+        for row in ROWS
+    ]
+    orjson.dumps({"total": len(urls), "urls": urls})
+
+
+if __name__ == "__main__":
+    previous = common.measure("resolve: HttpUrl + RedirectResponse", resolve_previous)
+    lean = common.measure("resolve: bytes + FastRedirectResponse", resolve_lean)
+    print(f"{'resolve: CPU saved per request':<50} {previous - lean:10.2f} us")
+
+    previous = common.measure("list (10 rows): pydantic + json", list_previous, 10_000)
+    lean = common.measure("list (10 rows): dicts + orjson", list_lean, 10_000)
+    print(f"{'list: CPU saved per request':<50} {previous - lean:10.2f} us")
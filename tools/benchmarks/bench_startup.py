@@ -0,0 +1,67 @@
+"""
+Measure how long a worker takes to become ready.
+
+The import time of the application (routers, settings, JWKS clients, ...) is measured in fresh
+interpreters. With --lifespan, the startup half of the lifespan (database connection, schema
+revision check, cache connection) is timed too, which needs a reachable database and cache.
+
+Usage:
+    python tools/benchmarks/bench_startup.py [--runs 10] [--lifespan]
+"""
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+import common
+
+_IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import(runs: int) -> None:
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SNIPPET.format(root=common.REPO_ROOT)],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=common.REPO_ROOT,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]) * 1000)
+
+    print(f"{'import main (median)':<40} {statistics.median(timings):10.1f} ms")
+    print(f"{'import main (max)':<40} {max(timings):10.1f} ms")
+
+
+async def measure_lifespan(runs: int) -> None:
+    import main
+
+    timings = []
+    for _ in range(runs):
+        context = main.lifespan(main.app)
+        start = time.perf_counter()
+        await context.__aenter__()
+        timings.append((time.perf_counter() - start) * 1000)
+        await context.__aexit__(None, None, None)
+
+    print(f"{'lifespan startup (median)':<40} {statistics.median(timings):10.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--lifespan", action="store_true")
+    args = parser.parse_args()
+
+    measure_import(args.runs)
+    if args.lifespan:
+        asyncio.run(measure_lifespan(args.runs))
@@ -0,0 +1,132 @@
+"""
+Compare the on-disk size of the inline and content-addressed URL layouts.
+
+A synthetic corpus mimics real traffic: a Zipf-distributed set of popular destinations,
+each shortened by many owners, most of them with campaign tracking query strings. The
+corpus is loaded into temporary tables shaped like both layouts on a live database and
+the total relation sizes (heap, TOAST and indexes) are reported.
+
+Usage:
+    python tools/benchmarks/bench_url_storage.py [--links 200000] [--destinations 20000]
+"""
+import argparse
+import asyncio
+import random
+import string
+
+import asyncpg
+
+import common  # noqa: F401  (configures sys.path and settings)
+from dal import url_digest
+from database import pool
+
+SCHEMA = """
+CREATE TEMP TABLE bench_inline (
+    key VARCHAR(7) PRIMARY KEY,
+    original_url TEXT,
+    owner_id VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE TEMP TABLE bench_destinations (
+    digest BYTEA PRIMARY KEY,
+    url TEXT NOT NULL
+);
+CREATE TEMP TABLE bench_content_addressed (
+    key VARCHAR(7) PRIMARY KEY,
+    destination_digest BYTEA,
+    owner_id VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX ON bench_content_addressed (destination_digest, owner_id);
+"""
+
+HOSTS = ["www.example.com", "shop.example.org", "news.example.net", "docs.example.io"]
+UTM_SOURCES = ["newsletter", "twitter", "facebook", "linkedin", "partner", "email"]
+
+
+def random_token(rng: random.Random, length: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+def build_destinations(rng: random.Random, count: int) -> list:
+    destinations = []
+    for _ in range(count):
+        path = "/".join(random_token(rng, rng.randint(4, 14)) for _ in range(rng.randint(2, 5)))
+        url = f"https://{rng.choice(HOSTS)}/{path}"
+        if rng.random() < 0.7:
+            url += (
+                f"?utm_source={rng.choice(UTM_SOURCES)}&utm_medium=social"
+                f"&utm_campaign={random_token(rng, 12)}&fbclid={random_token(rng, 60)}"
+            )
+        destinations.append(url)
+    return destinations
+
+
+def build_corpus(links: int, destinations: int, owners: int, seed: int) -> list:
+    rng = random.Random(seed)
+    urls = build_destinations(rng, destinations)
+
+    # Zipf-like popularity: the weight of the n-th destination is 1/n
+    weights = [1 / rank for rank in range(1, len(urls) + 1)]
+    picks = rng.choices(urls, weights=weights, k=links)
+
+    return [
+        (f"{index:07x}"[-7:], url, f"auth0|{rng.randrange(owners):08d}")
+        for index, url in enumerate(picks)
+    ]
+
+
+async def relation_size(connection: asyncpg.Connection, table: str) -> int:
+    return await connection.fetchval("SELECT pg_total_relation_size($1::regclass)", table)
+
+
+async def main(links: int, destinations: int, owners: int, seed: int) -> None:
+    corpus = build_corpus(links, destinations, owners, seed)
+    unique = {url: url_digest(url) for _, url, _ in corpus}
+    print(f"links: {len(corpus)}, distinct destinations: {len(unique)}")
+    print(f"duplicate ratio: {1 - len(unique) / len(corpus):.1%}")
+
+    connection = await asyncpg.connect(pool.dsn)
+    try:
+        await connection.execute(SCHEMA)
+
+        await connection.copy_records_to_table(
+            "bench_inline",
+            records=corpus,
+            columns=["key", "original_url", "owner_id"],
+        )
+        await connection.copy_records_to_table(
+            "bench_destinations",
+            records=[(digest, url) for url, digest in unique.items()],
+            columns=["digest", "url"],
+        )
+        await connection.copy_records_to_table(
+            "bench_content_addressed",
+            records=[(key, unique[url], owner_id) for key, url, owner_id in corpus],
+            columns=["key", "destination_digest", "owner_id"],
+        )
+        await connection.execute(
+            "VACUUM ANALYZE bench_inline, bench_destinations, bench_content_addressed"
+        )
+
+        inline = await relation_size(connection, "bench_inline")
+        content_addressed = await relation_size(
+            connection, "bench_content_addressed"
+        ) + await relation_size(connection, "bench_destinations")
+
+        print(f"{'inline layout':<40} {inline / 2**20:10.1f} MiB")
+        print(f"{'content-addressed layout':<40} {content_addressed / 2**20:10.1f} MiB")
+        print(f"{'saved':<40} {1 - content_addressed / inline:10.1%}")
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--links", type=int, default=200_000)
+    parser.add_argument("--destinations", type=int, default=20_000)
+    parser.add_argument("--owners", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.links, args.destinations, args.owners, args.seed))
@@ -0,0 +1,60 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks are run from the repository root, e.g. ``python tools/benchmarks/bench_resolve.py``.
+"""
+import os
+import sys
+import timeit
+from typing import Callable
+
+# Make the application modules importable when a benchmark is run as a script
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Placeholder configuration so settings can be loaded without a .env file
+_DEFAULT_ENV = {
+    "VERSION": "bench",
+    "BASE_URL_PATH": "/api/v1",
+    "SHORTENED_URL_BASE": "http://localhost:8000/",
+    "TOKEN_URI": "http://localhost:8000/api/v1/auth/token",
+    "LOGOUT_REDIRECT_URI": "http://localhost:8000/api/v1/info",
+    "APP_SECRET_KEY": "bench",
+    "APP_NAME": "Shorten API",
+    "ADMIN_EMAIL": "admin@example.com",
+    "DATABASE": "postgresql",
+    "PG_USERNAME": "postgres",
+    "PG_PASSWORD": "postgres",
+    "PG_DATABASE_NAME": "shortener_db",
+    "PG_HOST": "localhost",
+    "CACHE_HOST": "localhost",
+    "CACHE_USERNAME": "default",
+    "CACHE_PASSWORD": "",
+    "CACHE_DB": "0",
+    "AUTH0_DOMAIN": "example.auth0.com",
+    "AUTH0_CLIENT_ID": "bench",
+    "AUTH0_CLIENT_SECRET": "bench",
+    "AUTH0_ALGORITHMS": "RS256",
+    "AUTH0_API_AUDIENCE": "https://shortenapi.com",
+    "AUTH0_ISSUER": "https://example.auth0.com/",
+}
+for _name, _value in _DEFAULT_ENV.items():
+    os.environ.setdefault(_name, _value)
+
+
+def measure(label: str, func: Callable[[], object], number: int = 100_000) -> float:
+    """
+    Time a callable and print the mean cost per call.
+
+    Args:
+        label (str): The label printed next to the result.
+        func (Callable[[], object]): The callable to time.
+        number (int, optional): The number of calls per run. Defaults to 100000.
+
+    Returns:
+        float: The best mean time per call in microseconds.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+    print(f"{label:<50} {best:10.2f} us/op")
+    return best
@@ -0,0 +1,208 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from logger import logger
+from settings import settings
+
+
+class RequestTrace:
+    """
+    Stage timings of a single request.
+
+    Spans with the same name are added up, so a request that reads the cache twice reports
+    one "cache" stage with the total time and the number of calls.
+    """
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.status: Optional[int] = None
+        self.stack: Optional[List[str]] = None
+
+    def add(self, name: str, duration: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self) -> bytes:
+        """
+        Render the stages recorded so far as a Server-Timing header value.
+
+        Returns:
+            bytes: The header value, e.g. b"cache;dur=0.4, db;dur=2.1, total;dur=3.0".
+        """
+        metrics = [
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in self.durations.items()
+        ]
+        metrics.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(metrics).encode("latin-1")
+
+
+# Trace of the request being handled by the current task
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time a stage of the current request, such as "cache", "db", "auth" or "geo".
+
+    Outside of a traced request the stage is not recorded.
+
+    Args:
+        name (str): The stage name.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+def _snapshot_stack(trace: RequestTrace, task: asyncio.Task) -> None:
+    """
+    Capture where a request that is still running past the slow threshold is suspended.
+
+    Args:
+        trace (RequestTrace): The trace of the slow request.
+        task (asyncio.Task): The task handling the request.
+    """
+    if task.done():
+        return
+
+    # Follow the chain of awaited coroutines down to the one that is suspended
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(stack) < 50:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    trace.stack = stack
+
+
+class RequestTracing:
+    """
+    ASGI middleware recording per-request stage timings.
+
+    When SERVER_TIMING_ENABLED is set, the stages recorded before the response starts are sent
+    in a Server-Timing header. Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged as
+    structured records with their stages and the stack they were suspended at when they crossed
+    the threshold. A PROFILE_SAMPLE_RATE fraction of requests runs under cProfile, and the
+    profile is added to the record when the request turns out to be slow.
+    """
+
+    # cProfile cannot be nested, so at most one request is profiled at a time
+    profiling: bool = False
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = current_trace.set(trace)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", trace.server_timing()),
+                    ]
+            await send(message)
+
+        # Snapshot the stack if the request is still running once it becomes slow
+        snapshot = asyncio.get_running_loop().call_later(
+            settings.SLOW_REQUEST_THRESHOLD_MS / 1000,
+            _snapshot_stack,
+            trace,
+            asyncio.current_task(),
+        )
+
+        profiler = None
+        if not RequestTracing.profiling and random.random() < settings.PROFILE_SAMPLE_RATE:
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                RequestTracing.profiling = True
+            except ValueError as e:
+                # Another profiler (e.g. a debugger) is already active
+                profiler = None
+                logger.error(f"An error occurred while starting the profiler: {e}")
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            snapshot.cancel()
+            if profiler is not None:
+                profiler.disable()
+                RequestTracing.profiling = False
+            current_trace.reset(token)
+
+            duration = trace.elapsed_ms()
+            if duration >= settings.SLOW_REQUEST_THRESHOLD_MS:
+                self.log_slow_request(trace, duration, profiler)
+
+    @staticmethod
+    def log_slow_request(
+        trace: RequestTrace, duration: float, profiler: Optional[cProfile.Profile]
+    ) -> None:
+        """
+        Write a structured record of a slow request.
+
+        Args:
+            trace (RequestTrace): The trace of the request.
+            duration (float): The duration of the request in milliseconds.
+            profiler (Optional[cProfile.Profile]): The profiler the request ran under, if sampled.
+        """
+        fields = {
+            "event": "slow_request",
+            "method": trace.method,
+            "path": trace.path,
+            "status": trace.status,
+            "duration_ms": round(duration, 1),
+            "stages_ms": {
+                name: round(value * 1000, 1) for name, value in trace.durations.items()
+            },
+            "stage_calls": trace.calls,
+        }
+        if trace.stack:
+            fields["stack"] = trace.stack
+        if profiler is not None:
+            # The profile covers every task the event loop ran meanwhile, not only this request
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(25)
+            fields["profile"] = buffer.getvalue()
+
+        logger.warning(
+            f"Slow request: {trace.method} {trace.path} took {duration:.1f} ms",
+            extra={"fields": fields},
+        )
@@ -1,4 +1,6 @@
 import jwt
+from datetime import datetime
+from functools import cached_property, lru_cache
 from typing import Optional, Tuple
 
 import base62
@@ -7,7 +9,8 @@ from fastapi.security import SecurityScopes, HTTPAuthorizationCredentials, HTTPB
 from pydantic import HttpUrl
 
 from settings import get_settings
-from dal import create_record, fetch_original_url
+from storage import storage
+from tracing import span
 
 
 class UnauthorizedException(HTTPException):
@@ -24,6 +27,22 @@ class UnauthenticatedException(HTTPException):
         )
 
 
+@lru_cache()
+def get_jwks_client(jwks_url: str) -> jwt.PyJWKClient:
+    """
+    Retrieve the JWKS client for a URL, creating it on first use.
+
+    Clients are shared, so every router verifying tokens uses the same key cache.
+
+    Args:
+        jwks_url (str): The URL of the JSON Web Key Set.
+
+    Returns:
+        jwt.PyJWKClient: The JWKS client.
+    """
+    return jwt.PyJWKClient(jwks_url)
+
+
 class VerifyToken:
     """Class to verify JWT tokens using PyJWT."""
 
@@ -31,8 +50,12 @@ class VerifyToken:
         self.config = get_settings()
 
         # URL to retrieve JSON Web Key Set (JWKS) from Auth0
-        jwks_url = f"https://{self.config.AUTH0_DOMAIN}/.well-known/jwks.json"
-        self.jwks_client = jwt.PyJWKClient(jwks_url)
+        self.jwks_url = f"https://{self.config.AUTH0_DOMAIN}/.well-known/jwks.json"
+
+    @cached_property
+    def jwks_client(self) -> jwt.PyJWKClient:
+        # The client is built on the first verification rather than at import time
+        return get_jwks_client(self.jwks_url)
 
     async def verify(
         self,
@@ -56,27 +79,28 @@ class VerifyToken:
         if token is None:
             raise UnauthenticatedException()
 
-        # Get the signing key from the JWKS endpoint
-        try:
-            signing_key = self.jwks_client.get_signing_key_from_jwt(
-                token.credentials
-            ).key
-        except jwt.exceptions.PyJWKClientError as error:
-            raise UnauthorizedException(str(error))
-        except jwt.exceptions.DecodeError as error:
-            raise UnauthorizedException(str(error))
-
-        # Decode the JWT token using the signing key
-        try:
-            payload = jwt.decode(
-                token.credentials,
-                signing_key,
-                algorithms=self.config.AUTH0_ALGORITHMS,
-                audience=self.config.AUTH0_API_AUDIENCE,
-                issuer=self.config.AUTH0_ISSUER,
-            )
-        except Exception as error:
-            raise UnauthorizedException(str(error))
+        with span("auth"):
+            # Get the signing key from the JWKS endpoint
+            try:
+                signing_key = self.jwks_client.get_signing_key_from_jwt(
+                    token.credentials
+                ).key
+            except jwt.exceptions.PyJWKClientError as error:
+                raise UnauthorizedException(str(error))
+            except jwt.exceptions.DecodeError as error:
+                raise UnauthorizedException(str(error))
+
+            # Decode the JWT token using the signing key
+            try:
+                payload = jwt.decode(
+                    token.credentials,
+                    signing_key,
+                    algorithms=self.config.AUTH0_ALGORITHMS,
+                    audience=self.config.AUTH0_API_AUDIENCE,
+                    issuer=self.config.AUTH0_ISSUER,
+                )
+            except Exception as error:
+                raise UnauthorizedException(str(error))
 
         return payload
 
@@ -85,32 +109,44 @@ class URLShortener:
     """Class to shorten URLs using Key-Value pairs."""
 
     def __init__(
-        self, original_url: Optional[HttpUrl] = None, owner_id: Optional[str] = None
+        self,
+        original_url: Optional[HttpUrl] = None,
+        owner_id: Optional[str] = None,
+        expires_at: Optional[datetime] = None,
+        max_clicks: Optional[int] = None,
     ):
         self.original_url = original_url
         self.owner_id = owner_id
+        self.expires_at = expires_at
+        self.max_clicks = max_clicks
 
-    async def shorten_url(self) -> Tuple[str, bool]:
+    async def shorten_url(
+        self,
+    ) -> Optional[Tuple[str, bool, Optional[datetime], Optional[int]]]:
         """
         Generate a unique key for the URL using a hash function and store it in the database.
 
         Returns:
-            Tuple[str, bool]: The unique key and a boolean indicating whether a new record was created.
+            Optional[Tuple[str, bool, Optional[datetime], Optional[int]]]: The unique key, a boolean
+                indicating whether a new record was created, and the stored expiry time and click
+                limit, or None if the key is taken by another link.
         """
         unique_key = self._generate_key(str(self.original_url), self.owner_id)
 
         try:
-            result = await create_record(
+            result = await storage.create_record(
                 original_url=self.original_url,
                 owner_id=self.owner_id,
                 unique_key=unique_key,
+                expires_at=self.expires_at,
+                max_clicks=self.max_clicks,
             )
             return result
         except Exception as e:
             raise e
 
     @staticmethod
-    async def retrieve_original_url(key: str) -> Optional[HttpUrl]:
+    async def retrieve_original_url(key: str) -> Optional[str]:
         """
         Retrieve the original URL using the hashed key.
 
@@ -118,9 +154,9 @@ class URLShortener:
             key (str): Hashed URL string.
 
         Returns:
-            Optional[HttpUrl]: Original URL if found, otherwise None.
+            Optional[str]: Original URL if found, otherwise None.
         """
-        result = await fetch_original_url(key=key)
+        result = await storage.fetch_original_url(key=key)
         return result
 
     def _generate_key(self, original_url: str, owner_id: str) -> str: